@@ -30,7 +30,7 @@ MONTH=`date -d 'last month' "+%m"` # 2-digit month, 01-12
 echo "Running reports for ${YEAR}-${MONTH} via $0"
 
 COMMAND="/usr/local/bin/python /home/django/LBS/manage.py run_qdb_reporter"
-COMMON_ARGS="--year ${YEAR} --month ${MONTH} --email"
+COMMON_ARGS="--year ${YEAR} --month ${MONTH} --email --batch_fetch"
 
 # TESTING: use unit 21 for DIIT Software Development
 # and send email only to developers.
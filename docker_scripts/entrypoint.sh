@@ -43,6 +43,17 @@ env | sort > /home/django/full_env_for_cron.env
 # (re)created.
 python manage.py update_crontab
 
+# QDB reports requested via the web form are queued, and run by this
+# worker in the background, so web requests don't wait for them.
+# Restart it if it stops, so queued reports don't wait for the next deploy.
+(
+  while true; do
+    python manage.py run_report_worker
+    echo "run_report_worker exited with status $?; restarting in 10 seconds"
+    sleep 10
+  done
+) &
+
 if [ "$DJANGO_RUN_ENV" = "dev" ]; then
   python manage.py runserver 0.0.0.0:8000
 else
@@ -53,7 +64,8 @@ else
   # Gunicorn cmd line flags:
   # -w number of gunicorn worker processes
   # -b IPADDR:PORT binding
-  # -t timeout in seconds.  This needs to allow *total* time for reports - 5-10 minutes for all reports at once.
+  # -t timeout in seconds.  QDB reports run in the report worker, but G&E
+  #    downloads are still built within the request, so allow them plenty of time.
   # --access-logfile where to send HTTP access logs (- is stdout)
   export GUNICORN_CMD_ARGS="-w 3 -b 0.0.0.0:8000 -t 600 --access-logfile -"
   gunicorn lbs.wsgi:application
@@ -0,0 +1,127 @@
+import random
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from ge.models import BFSImport, LibraryData
+
+UNITS = ["Arts", "Biomed", "EAL", "HSSD", "LSC", "Music", "Powell", "SEL", "UL"]
+FUND_TYPES = ["Current Expenditure", "Endowment"]
+
+
+def add_sample_data(funds: int, seed: int = 1) -> None:
+    """Add funds like the real ones to LibraryData, with two BFSImport rows
+    (regental and foundation) for each. Accounts start with "B", which real
+    accounts don't, so they can't clash with existing funds.
+
+    :param funds: The number of funds
+    :param seed: Seed for the random values, so runs are repeatable
+    """
+    rand = random.Random(seed)
+    library_data = []
+    bfs_data = []
+    for index in range(funds):
+        fund = f"{index:06d}"
+        fund_type = rand.choice(FUND_TYPES)
+        library_data.append(
+            LibraryData(
+                unit=rand.choice(UNITS),
+                fund_title=f"Benchmark fund {index}",
+                fund_type=fund_type,
+                fau_account=f"B{rand.randint(0, 999999):06d}",
+                fau_cost_center=rand.choice(["LB", "OA", "AD"]),
+                fau_fund=fund,
+                fau_fund_no=fund,
+            )
+        )
+        for source in ["R", "F"]:
+            bfs_data.append(
+                BFSImport(source=source, fau_fund=fund, fund_type=fund_type.upper())
+            )
+    LibraryData.objects.bulk_create(library_data, batch_size=1000)
+    BFSImport.objects.bulk_create(bfs_data, batch_size=1000)
+
+
+def get_sample_queries(funds: int) -> dict[str, QuerySet]:
+    """Get the queries the indexes are for, as used by the G&E code.
+
+    :param funds: The number of funds from add_sample_data()
+    :return: Queries by description
+    """
+    new_funds = {f"{index:06d}" for index in range(0, funds, max(funds // 50, 1))}
+    return {
+        "Unit report (unit, fund type)": LibraryData.objects.filter(
+            unit="HSSD", fund_type="Endowment"
+        ).order_by("fau_fund_no"),
+        "New fund match (BFS fau_fund)": BFSImport.objects.filter(
+            fau_fund__in=new_funds
+        )
+        .order_by("id")
+        .only("fau_fund", "description", "fund_type", "fund_summary", "purpose"),
+    }
+
+
+def get_index_names() -> list[str]:
+    """Get the names of the indexes being measured."""
+    return [
+        index.name
+        for model in (BFSImport, LibraryData)
+        for index in model._meta.indexes
+    ]
+
+
+def analyze() -> None:
+    """Update the planner's table statistics."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("ANALYZE ge_librarydata, ge_bfsimport")
+        else:
+            cursor.execute("ANALYZE")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query plans and timings of G&E lookups with and without their "
+        "indexes, on synthetic data. Everything is rolled back afterwards, but "
+        "tables are locked until then, so don't run this while the site is in use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--funds", type=int, default=20000, help="Synthetic funds to add"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Times to run each query"
+        )
+
+    def time_query(self, queryset: QuerySet, repeat: int) -> float:
+        """Get the best time to run a query and fetch its rows, in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            list(queryset.all())
+            timings.append(perf_counter() - start)
+        return min(timings) * 1000
+
+    def report(self, heading: str, queries: dict[str, QuerySet], repeat: int):
+        self.stdout.write(f"== {heading}")
+        for description, queryset in queries.items():
+            milliseconds = self.time_query(queryset, repeat)
+            self.stdout.write(
+                f"{description}: {queryset.count()} rows, best {milliseconds:.2f} ms"
+            )
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"\t{line}")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            add_sample_data(options["funds"])
+            analyze()
+            queries = get_sample_queries(options["funds"])
+            self.report("With indexes", queries, options["repeat"])
+            with connection.cursor() as cursor:
+                for name in get_index_names():
+                    cursor.execute(f'DROP INDEX "{name}"')
+            analyze()
+            self.report("Without indexes", queries, options["repeat"])
+            transaction.set_rollback(True)
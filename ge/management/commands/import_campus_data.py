@@ -0,0 +1,328 @@
+import csv
+import logging
+import xlrd
+from datetime import date, datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Model
+from openpyxl import load_workbook
+from ge.models import BFSImport, CDWImport, MTFImport
+from ge.views_utils import add_funds, precompute_reports, update_data
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT; large batches keep round trips to a minimum.
+DEFAULT_BATCH_SIZE = 5000
+
+
+def to_text(value) -> str:
+    """Convert a cell value to text, without the ".0" Excel adds to whole numbers."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def to_code(width: int) -> Callable:
+    """Get a converter for numeric codes (departments, funds, etc.),
+    restoring leading zeros lost when Excel treats them as numbers.
+    Codes which are not all digits (like "10011O") are left as-is.
+    """
+
+    def convert(value) -> str:
+        text = to_text(value).strip()
+        return text.zfill(width) if text.isdigit() else text
+
+    return convert
+
+
+def to_float(value) -> float:
+    """Convert a cell value to a float; blanks are 0."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = to_text(value).strip().replace(",", "")
+    return float(text) if text else 0.0
+
+
+def to_int(value) -> int | None:
+    """Convert a cell value to an int; blanks are None."""
+    text = to_text(value).strip()
+    return int(float(text)) if text else None
+
+
+def to_date(value) -> date | None:
+    """Convert a cell value to a date; blanks are None."""
+    if isinstance(value, datetime):
+        return value.date()
+    text = to_text(value).strip()
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return datetime.strptime(text, "%m/%d/%Y").date()
+
+
+# For each extract: column header -> (model field, converter).
+BFS_COLUMNS = {
+    "Source": ("source", to_text),
+    "Organization": ("organization", to_text),
+    "OrgNumber": ("fau_org", to_code(4)),
+    "Department": ("department", to_text),
+    "DeptNumber": ("fau_dept", to_code(4)),
+    "FundType/Source": ("fund_type", to_text),
+    # Normally 5 chars but some data has 6...
+    "Fund": ("fau_fund", to_code(5)),
+    "FundOld": ("fund_old", to_text),
+    "Purpose": ("purpose", to_text),
+    "Description": ("description", to_text),
+    "BeginningBalance": ("beginning_balance", to_float),
+    "Contributions": ("contributions", to_float),
+    "InvestmentIncome": ("investment_income", to_float),
+    "GiftFeePayments": ("gift_fee_payments", to_float),
+    "RealGl": ("real_gl", to_float),
+    "UnrealGL": ("unreal_gl", to_float),
+    "FoundationTransfers": ("foundation_transfers", to_float),
+    "TransfersToUniv": ("transfers_to_univ", to_float),
+    "Expenditures": ("expenditures", to_float),
+    "Transfers/Adj": ("transfers_adj", to_float),
+    "EndingBalance": ("ending_balance", to_float),
+    "Available": ("available", to_float),
+    "Unavailable": ("unavailable", to_float),
+    "Principal": ("principal", to_float),
+    "MarketValue": ("market_value", to_float),
+    "ProjectedIncome": ("projected_income", to_float),
+    "SortAccount": ("sort_account", to_text),
+    "FundSummary": ("fund_summary", to_text),
+    "FundMemo": ("fund_memo", to_text),
+    "PeriodStart": ("period_start", to_date),
+    "PeriodEnd": ("period_end", to_date),
+}
+
+CDW_COLUMNS = {
+    "Ledger Year Month": ("ledger_year_month", to_code(6)),
+    "FYE Proc Indicator": ("fye_proc_indicator", to_text),
+    "Account Org Code": ("fau_org", to_code(4)),
+    "Fund Group": ("fund_group", to_text),
+    "Account Department Code": ("fau_dept", to_code(4)),
+    "Location Code": ("fau_location", to_code(1)),
+    "Account Number": ("fau_account", to_code(6)),
+    "Cost Center Code": ("fau_cost_center", to_code(2)),
+    "Fund Number": ("fau_fund", to_code(5)),
+    "Fund Title": ("fau_fund_title", to_text),
+    "Inception-to-Date Appropriation": ("inception_to_date_appropriation", to_float),
+    "Inception-to-Date Financial": ("inception_to_date_financial", to_float),
+    "Encum&ML": ("encum_ml", to_float),
+    "Operating Balance": ("operating_balance", to_float),
+}
+
+MTF_COLUMNS = {
+    "org_code": ("fau_org", to_code(4)),
+    "org_title": ("organization", to_text),
+    "division_code": ("division_code", to_code(4)),
+    "division_title": ("division_title", to_text),
+    "sub_division_code": ("sub_division_code", to_code(4)),
+    "sub_division_title": ("sub_division_title", to_text),
+    # Excel file treats this as number, so restore leading 0
+    "dept_code": ("fau_dept", to_code(4)),
+    "dept_title": ("department", to_text),
+    "fund_id": ("fund_id", to_code(5)),
+    "fund_nbr": ("fund_nbr", to_code(5)),
+    "fund_desc": ("fund_description", to_text),
+    "fiscal_yr": ("fiscal_year", to_text),
+    "last_fiscal_month_closed": ("last_fiscal_month_closed", to_int),
+    "fdn_dept": ("fdn_dept", to_code(3)),
+    "fdn_dept_desc": ("fdn_dept_description", to_text),
+    "univ_dept": ("univ_dept", to_code(4)),
+    "univ_dept_desc": ("univ_dept_description", to_text),
+    "univ_fund_nbr": ("fau_fund", to_code(5)),
+    "univ_fund_desc": ("fau_fund_title", to_text),
+    "use_code": ("use_code", to_text),
+    "use_desc": ("use_description", to_text),
+    "available_bal": ("available_balance", to_float),
+    "unavailable_bal": ("unavailable_balance", to_float),
+    "pending_transfer_bal": ("pending_transfer_balance", to_float),
+    "max_transfer_bal": ("max_transfer_balance", to_float),
+    "fund_purpose": ("fund_purpose", to_text),
+    "fund_restriction": ("fund_restriction", to_text),
+    "signature_ind": ("signature_ind", to_text),
+    "preparer_phone_num": ("preparer_phone_number", to_text),
+}
+
+
+def read_xls(filename: str) -> Iterator[list]:
+    """Yield rows of values from the first sheet of an Excel 97 (.xls) file."""
+    book = xlrd.open_workbook(filename, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for rownum in range(sheet.nrows):
+            values = []
+            for cell in sheet.row(rownum):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    values.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                else:
+                    values.append(cell.value)
+            yield values
+    finally:
+        book.release_resources()
+
+
+def read_xlsx(filename: str) -> Iterator[list]:
+    """Yield rows of values from the first sheet of an Excel (.xlsx) file."""
+    book = load_workbook(filename, read_only=True, data_only=True)
+    try:
+        for row in book.worksheets[0].iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        book.close()
+
+
+def read_csv(filename: str) -> Iterator[list]:
+    """Yield rows of values from a CSV file."""
+    with open(filename, encoding="utf-8-sig", newline="") as csvfile:
+        yield from csv.reader(csvfile, dialect="excel")
+
+
+def read_extract(filename: str) -> Iterator[list]:
+    """Yield rows of values, including the header row, from a campus extract."""
+    readers = {".xls": read_xls, ".xlsx": read_xlsx, ".csv": read_csv}
+    suffix = Path(filename).suffix.lower()
+    if suffix not in readers:
+        raise CommandError(f"Unsupported file type for {filename}")
+    return readers[suffix](filename)
+
+
+def iter_instances(filename: str, model: type[Model], columns: dict) -> Iterator:
+    """Yield unsaved model instances, one per data row of the extract.
+
+    Blank rows are skipped; rows too short to have every column raise
+    CommandError, since their values can't be placed.
+    """
+    rows = read_extract(filename)
+    header = [to_text(value).strip() for value in next(rows, [])]
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise CommandError(f"{filename} is missing columns: {', '.join(missing)}")
+    # Column position -> (field, converter), for just the columns we use.
+    positions = [
+        (header.index(name), field, converter)
+        for name, (field, converter) in columns.items()
+    ]
+    width = max(pos for pos, _, _ in positions) + 1
+    # The header is line 1.
+    for line, row in enumerate(rows, start=2):
+        # Skip fully blank rows, which Excel sometimes leaves at the end.
+        if not any(to_text(value).strip() for value in row):
+            continue
+        if len(row) < width:
+            raise CommandError(
+                f"{filename}, line {line}: expected at least {width} columns,"
+                f" found {len(row)}"
+            )
+        yield model(
+            **{field: converter(row[pos]) for pos, field, converter in positions}
+        )
+
+
+def load_extract(
+    filename: str, model: type[Model], columns: dict, batch_size: int
+) -> int:
+    """Replace the contents of an import table with the rows from an extract.
+
+    Returns the number of rows loaded.
+    """
+    count = 0
+    batch = []
+    # Delete and load together, so reports never see a half-loaded table.
+    with transaction.atomic():
+        model.objects.all().delete()
+        for instance in iter_instances(filename, model, columns):
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+class Command(BaseCommand):
+    help = "Loads BFS, CDW and MTF extracts into the G&E campus data import tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bfs", help="BFS consolidated extract (.xls, .xlsx, .csv)"
+        )
+        parser.add_argument("--cdw", help="CDW ledger extract (.xls, .xlsx, .csv)")
+        parser.add_argument("--mtf", help="MTF funds list extract (.xls, .xlsx, .csv)")
+        parser.add_argument(
+            "--batch_size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Rows per database insert (default {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="After loading, add new funds, update LibraryData"
+            " rows whose campus data changed, and rebuild stored reports",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="With --update, update all LibraryData rows",
+        )
+
+    def handle(self, *args, **options):
+        extracts = [
+            (options["bfs"], BFSImport, BFS_COLUMNS),
+            (options["cdw"], CDWImport, CDW_COLUMNS),
+            (options["mtf"], MTFImport, MTF_COLUMNS),
+        ]
+        extracts = [extract for extract in extracts if extract[0]]
+        if not extracts and not options["update"]:
+            raise CommandError("Supply at least one of --bfs, --cdw or --mtf")
+
+        start = perf_counter()
+        for filename, model, columns in extracts:
+            step_start = perf_counter()
+            count = load_extract(filename, model, columns, options["batch_size"])
+            message = (
+                f"{model.__name__}: loaded {count} rows from {filename}"
+                f" in {perf_counter() - step_start:.2f} seconds"
+            )
+            logger.info(message)
+            self.stdout.write(message)
+
+        if options["update"]:
+            step_start = perf_counter()
+            add_funds()
+            changed_funds = update_data(changed_only=not options["full"])
+            for fund in changed_funds:
+                logger.info(f"Updated fund: {fund}")
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"\tUpdated {fund}")
+            message = (
+                f"LibraryData: updated {len(changed_funds)} funds"
+                f" in {perf_counter() - step_start:.2f} seconds"
+            )
+            logger.info(message)
+            self.stdout.write(message)
+
+            # Have reports ready for download with the new data.
+            step_start = perf_counter()
+            built = precompute_reports()
+            message = (
+                f"Stored reports: built {len(built)}"
+                f" in {perf_counter() - step_start:.2f} seconds"
+            )
+            logger.info(message)
+            self.stdout.write(message)
+
+        self.stdout.write(f"Finished in {perf_counter() - start:.2f} seconds")
@@ -0,0 +1,24 @@
+import logging
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from ge.views_utils import precompute_reports
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Builds and stores G&E reports whose stored copies are missing or stale."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild all reports, even those which are current",
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        built = precompute_reports(force=options["force"])
+        message = f"Stored reports: built {len(built)} in {perf_counter() - start:.2f} seconds"
+        logger.info(message)
+        self.stdout.write(message)
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.14 on 2026-10-18 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ge', '0011_update_fund_with_staff_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampusDataHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=3)),
+                ('fund_key', models.CharField(max_length=20)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'fund_key'), name='unique_campus_data_hash')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.14 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ge", "0012_campusdatahash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredReport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("report_type", models.CharField(max_length=20, unique=True)),
+                ("data_version", models.CharField(max_length=64)),
+                ("content", models.BinaryField()),
+                ("created", models.DateTimeField()),
+            ],
+        ),
+    ]
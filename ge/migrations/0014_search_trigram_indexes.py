@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Text fields searched with icontains, which Postgres runs as
+# UPPER(field::text) LIKE UPPER('%term%'). Trigram indexes on that
+# expression let it use an index instead of reading every row.
+SEARCH_FIELDS = {
+    "ge_librarydata": [
+        "fund_manager",
+        "fund_purpose",
+        "fund_restriction",
+        "fund_summary",
+        "fund_title",
+        "lbs_notes",
+        "notes",
+        "unit",
+    ],
+    "ge_gefund": [
+        "title",
+        "manager",
+        "fund_purpose",
+        "fund_summary",
+        "fund_restriction",
+        "general_notes",
+        "lbs_notes",
+    ],
+}
+
+
+def create_trigram_indexes(apps, schema_editor) -> None:
+    """Create trigram indexes for searched fields. Postgres only; other
+    databases (like SQLite, in development) search without them.
+
+    :param apps: Django apps registry.
+    :param schema_editor: Django schema editor.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # pg_trgm is a trusted extension, so the database owner can create it.
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, fields in SEARCH_FIELDS.items():
+        for field in fields:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{field}_trgm" ON "{table}" '
+                f'USING gin (UPPER("{field}"::text) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor) -> None:
+    """Drop the indexes from create_trigram_indexes(), leaving the extension.
+
+    :param apps: Django apps registry.
+    :param schema_editor: Django schema editor.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table, fields in SEARCH_FIELDS.items():
+        for field in fields:
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_{field}_trgm"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ge", "0013_storedreport"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.14 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ge", "0014_search_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bfsimport",
+            index=models.Index(
+                fields=["fau_fund", "source"], name="bfs_fund_source_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="librarydata",
+            index=models.Index(
+                fields=["unit", "fund_type", "fau_fund_no"],
+                name="ld_unit_type_fund_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.14 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ge", "0015_fau_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryDataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 # Data imported from UCLA Business and Finance Solutions
@@ -39,6 +40,13 @@ class BFSImport(models.Model):
     period_start = models.DateField(null=True)
     period_end = models.DateField(null=True)
 
+    class Meta:
+        indexes = [
+            # add_funds() matches new funds on fau_fund; LibraryData joins
+            # on (fau_fund, source).
+            models.Index(fields=["fau_fund", "source"], name="bfs_fund_source_idx"),
+        ]
+
 
 # Data imported from UCLA Campus Data Warehouse
 class CDWImport(models.Model):
@@ -105,6 +113,24 @@ class MTFImport(models.Model):
     preparer_phone_number = models.CharField(max_length=50, null=True)
 
 
+# Content hashes of the campus data (and LibraryData rows) used by the
+# last LibraryData update, so later updates can skip unchanged funds.
+# source is BFS, CDW, MTF or LD; fund_key is the value LibraryData joins on
+# (or the LibraryData id, for LD).
+class CampusDataHash(models.Model):
+    source = models.CharField(max_length=3)
+    fund_key = models.CharField(max_length=20)
+    content_hash = models.CharField(max_length=64)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "fund_key"], name="unique_campus_data_hash"
+            )
+        ]
+
+
 # Local LBS data to be combined with campus data
 # Straight import now, to explore data.
 # Allow all fields to be blank (empty) as none are really required
@@ -149,6 +175,47 @@ class LibraryData(models.Model):
     def __str__(self):
         return f"{self.fund_title}: {self.fau_account}-{self.fau_cost_center}-{self.fau_fund}"
 
+    # Forms and admin save one row at a time; bulk writes bump the version
+    # themselves.
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        LibraryDataVersion.bump()
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        LibraryDataVersion.bump()
+        return deleted
+
+    class Meta:
+        indexes = [
+            # Unit reports select by unit and fund type, sorted by fund number.
+            models.Index(
+                fields=["unit", "fund_type", "fau_fund_no"],
+                name="ld_unit_type_fund_idx",
+            ),
+        ]
+
+
+# A counter bumped whenever LibraryData is written, so stored reports can
+# tell they're stale without reading LibraryData. There's only one record,
+# with pk = 1.
+class LibraryDataVersion(models.Model):
+    version = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls) -> None:
+        """Record that LibraryData has changed."""
+        cls.objects.get_or_create(pk=1)
+        cls.objects.filter(pk=1).update(
+            version=models.F("version") + 1, updated=timezone.now()
+        )
+
+    @classmethod
+    def current(cls) -> int:
+        """Get the current version, 0 if LibraryData has never been written."""
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
 
 class GeStaff(models.Model):
     name = models.CharField(max_length=100)
@@ -209,3 +276,16 @@ class GeRecipient(models.Model):
 
     class Meta:
         verbose_name_plural = "GE Recipients"
+
+
+# G&E report workbooks, built ahead of time so downloads don't have to wait
+# for them. data_version is from views_utils.get_data_version() when the report
+# was built; if that has changed since, the stored report is stale.
+class StoredReport(models.Model):
+    report_type = models.CharField(max_length=20, unique=True)
+    data_version = models.CharField(max_length=64)
+    content = models.BinaryField()
+    created = models.DateTimeField()
+
+    def __str__(self):
+        return self.report_type
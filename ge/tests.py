@@ -1,14 +1,44 @@
-from datetime import datetime
-from openpyxl import load_workbook
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+from unittest import mock
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
-from ge.models import LibraryData
+from ge.management.commands.import_campus_data import MTF_COLUMNS
+from ge.models import (
+    BFSImport,
+    CampusDataHash,
+    CDWImport,
+    LibraryData,
+    MTFImport,
+    StoredReport,
+)
 from ge.views_utils import (
+    ACCOUNTING_FORMAT,
     add_funds,
     create_excel_output,
+    df_to_excel,
+    download_excel_file,
+    download_zip_file,
     get_as_of_date,
+    get_bytes_from_workbook,
+    get_data_version,
+    get_import_lookups,
     get_last_col,
     get_last_row,
     get_librarydata_results,
+    get_report_bytes,
+    get_report_types,
+    iter_reports,
+    precompute_reports,
     sum_col,
     update_data,
 )
@@ -72,6 +102,46 @@ class AddFundsTestCase(TestCase):
         ).first()
         self.assertEqual(new_fund.new_fund, "N")
 
+    def test_duplicate_incoming_fund_is_added_once(self):
+        # CDW can have several rows for one FAU; only one fund should be added.
+        duplicate = CDWImport.objects.get(
+            fau_fund="48083", fau_cost_center="5T", fau_account="432975"
+        )
+        duplicate.pk = None
+        duplicate.save()
+        before = LibraryData.objects.count()
+        add_funds()
+        self.assertEqual(LibraryData.objects.count(), before + 1)
+
+    def test_no_new_funds_adds_nothing(self):
+        add_funds()
+        before = LibraryData.objects.count()
+        add_funds()
+        self.assertEqual(LibraryData.objects.count(), before)
+
+
+class FundIndexTestCase(TestCase):
+    fixtures = [
+        "sample_bfs_data.json",
+        "sample_library_data.json",
+    ]
+
+    def test_duplicate_faus_are_allowed(self):
+        # The sample data, like the real data, has funds sharing an FAU
+        fund = LibraryData.objects.filter(fau_fund="50763").first()
+        fund.pk = None
+        fund.save()
+        self.assertEqual(LibraryData.objects.filter(fau_fund="50763").count(), 3)
+
+    def test_benchmark_ge_indexes(self):
+        before = LibraryData.objects.count()
+        out = StringIO()
+        call_command("benchmark_ge_indexes", funds=100, repeat=1, stdout=out)
+        self.assertIn("With indexes", out.getvalue())
+        self.assertIn("Without indexes", out.getvalue())
+        # Sample data is rolled back
+        self.assertEqual(LibraryData.objects.count(), before)
+
 
 class UpdateDataTestCase(TestCase):
     fixtures = [
@@ -171,6 +241,225 @@ class UpdateDataTestCase(TestCase):
         self.assertEqual(after.commitments, 10000.00)
         self.assertEqual(after.operating_balance, 508627.50)
 
+    def test_total_balance_is_updated(self):
+        # qryAAA_6TotalBalance: operating_balance + max_mtf_trf_amt,
+        # using the MTF amount set earlier in the same update.
+        update_data()
+        after = LibraryData.objects.filter(ucop_fdn_no="81081E").first()
+        self.assertEqual(after.total_balance, 16159.28)
+
+    def test_import_tables_are_read_once(self):
+        # One query per campus import table, regardless of LibraryData size.
+        with self.assertNumQueries(3):
+            get_import_lookups()
+
+
+class UpdateChangedDataTestCase(TestCase):
+    fixtures = [
+        "sample_bfs_data.json",
+        "sample_cdw_data.json",
+        "sample_mtf_data.json",
+        "sample_library_data.json",
+    ]
+
+    def test_first_update_changes_all_funds(self):
+        changed = update_data(changed_only=True)
+        self.assertEqual(len(changed), LibraryData.objects.count())
+
+    def test_unchanged_data_updates_nothing(self):
+        update_data(changed_only=True)
+        self.assertEqual(update_data(changed_only=True), [])
+
+    def test_only_funds_with_changed_data_are_updated(self):
+        update_data(changed_only=True)
+        mtf = MTFImport.objects.get(fund_nbr="81081E")
+        mtf.max_transfer_balance = 100.0
+        mtf.save()
+        changed = update_data(changed_only=True)
+        self.assertEqual([ld.ucop_fdn_no for ld in changed], ["81081E"])
+        after = LibraryData.objects.get(ucop_fdn_no="81081E")
+        self.assertEqual(after.max_mtf_trf_amt, 100.0)
+
+    def test_local_edits_are_updated(self):
+        # Edited derived values are reset, as a full update would do.
+        update_data(changed_only=True)
+        ld = LibraryData.objects.get(ucop_fdn_no="81081E")
+        ld.max_mtf_trf_amt = 1.0
+        ld.save()
+        changed = update_data(changed_only=True)
+        self.assertEqual([fund.id for fund in changed], [ld.id])
+        ld.refresh_from_db()
+        self.assertEqual(ld.max_mtf_trf_amt, 16159.28)
+
+    def test_import_rows_without_fund_are_skipped(self):
+        # Campus import funds are nullable, but stored hashes need a key.
+        BFSImport.objects.create(fau_fund=None, source="R")
+        MTFImport.objects.create(fund_nbr=None)
+        CDWImport.objects.create(fau_account="123456", fau_cost_center=None)
+        update_data(changed_only=True)
+        self.assertFalse(
+            CampusDataHash.objects.filter(fund_key__contains="None").exists()
+        )
+        self.assertEqual(update_data(changed_only=True), [])
+
+
+class ImportCampusDataTestCase(TestCase):
+    def import_samples(self):
+        call_command(
+            "import_campus_data",
+            bfs="sample_files/sample_consolidated.xls",
+            cdw="sample_files/sample_ledger.xls",
+            mtf="sample_files/sample_mtf.xls",
+            stdout=StringIO(),
+        )
+
+    def test_all_rows_are_loaded(self):
+        self.import_samples()
+        self.assertEqual(BFSImport.objects.count(), 5)
+        self.assertEqual(CDWImport.objects.count(), 6)
+        self.assertEqual(MTFImport.objects.count(), 4)
+
+    def test_reload_replaces_rows(self):
+        self.import_samples()
+        self.import_samples()
+        self.assertEqual(BFSImport.objects.count(), 5)
+
+    def test_leading_zeros_are_restored(self):
+        # MTF dept_code is numeric (461) in Excel; should be "0461".
+        self.import_samples()
+        mtf = MTFImport.objects.get(fund_nbr="10160O")
+        self.assertEqual(mtf.fau_dept, "0461")
+        self.assertEqual(mtf.fund_id, "10160")
+        self.assertEqual(mtf.fau_fund, "45880")
+
+    def test_bfs_values_are_converted(self):
+        self.import_samples()
+        bfs = BFSImport.objects.filter(fau_fund="07808", source="R").first()
+        self.assertEqual(bfs.market_value, 342331.56)
+        self.assertEqual(bfs.fund_old, "")
+        self.assertEqual(bfs.period_start, date(2022, 7, 1))
+
+    def test_missing_columns_are_reported(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "import_campus_data",
+                bfs="sample_files/sample_ledger.xls",
+                stdout=StringIO(),
+            )
+
+    def write_mtf_csv(self, rows: list[list[str]]) -> str:
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        filename = os.path.join(tmpdir.name, "mtf.csv")
+        with open(filename, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(MTF_COLUMNS)
+            writer.writerows(rows)
+        return filename
+
+    def test_blank_rows_are_skipped(self):
+        row = ["1"] * len(MTF_COLUMNS)
+        filename = self.write_mtf_csv([[], row, [""] * len(MTF_COLUMNS)])
+        call_command("import_campus_data", mtf=filename, stdout=StringIO())
+        self.assertEqual(MTFImport.objects.count(), 1)
+
+    def test_short_rows_are_reported(self):
+        filename = self.write_mtf_csv([[], ["0461", "Library"]])
+        with self.assertRaisesMessage(CommandError, f"{filename}, line 3:"):
+            call_command("import_campus_data", mtf=filename, stdout=StringIO())
+
+
+class ThreadExecutor(ThreadPoolExecutor):
+    """Stands in for the process pool, since other processes can't see the
+    test database.
+    """
+
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        super().__init__(max_workers)
+
+
+# Building real workbooks is covered by ExcelOutputTestCase, so use empty ones.
+@mock.patch("ge.views_utils.create_excel_output", side_effect=lambda _: Workbook())
+class StoredReportTestCase(TestCase):
+    fixtures = [
+        "sample_library_data.json",
+    ]
+
+    def test_precompute_stores_all_reports(self, create_excel_output):
+        self.assertEqual(precompute_reports(), get_report_types())
+        self.assertEqual(StoredReport.objects.count(), len(get_report_types()))
+        # Nothing is stale, so the next run builds nothing
+        self.assertEqual(precompute_reports(), [])
+        self.assertEqual(precompute_reports(force=True), get_report_types())
+
+    def test_stored_report_is_downloaded(self, create_excel_output):
+        precompute_reports()
+        StoredReport.objects.filter(report_type="hssd").update(content=b"stored")
+        create_excel_output.reset_mock()
+        response = download_excel_file("hssd")
+        self.assertEqual(response.content, b"stored")
+        create_excel_output.assert_not_called()
+
+    def test_changed_data_makes_reports_stale(self, create_excel_output):
+        precompute_reports()
+        data_version = get_data_version()
+        fund = LibraryData.objects.get(pk=1)
+        fund.notes = "Changed"
+        fund.save()
+        self.assertNotEqual(get_data_version(), data_version)
+        create_excel_output.reset_mock()
+        get_report_bytes("hssd")
+        create_excel_output.assert_called_once_with("hssd")
+        # The new copy is stored, for the next download
+        self.assertEqual(
+            StoredReport.objects.get(report_type="hssd").data_version,
+            get_data_version(),
+        )
+
+    def test_updated_data_makes_reports_stale(self, create_excel_output):
+        data_version = get_data_version()
+        update_data()
+        self.assertNotEqual(get_data_version(), data_version)
+
+    def test_data_version_does_not_read_library_data(self, create_excel_output):
+        get_data_version()
+        with self.assertNumQueries(1):
+            get_data_version()
+
+    @mock.patch("ge.views_utils.DOWNLOAD_CHUNK_SIZE", 4)
+    def test_large_report_is_streamed(self, create_excel_output):
+        precompute_reports()
+        StoredReport.objects.filter(report_type="hssd").update(content=b"stored")
+        response = download_excel_file("hssd")
+        self.assertEqual(list(response.streaming_content), [b"stor", b"ed"])
+        self.assertEqual(response["Content-Length"], "6")
+
+    def test_zip_contains_stored_reports(self, create_excel_output):
+        precompute_reports()
+        response = download_zip_file()
+        zip_file = ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(len(zip_file.namelist()), len(get_report_types()))
+        for report in StoredReport.objects.all():
+            filename = f"{report.report_type}-Report-"
+            (name,) = [n for n in zip_file.namelist() if n.startswith(filename)]
+            self.assertEqual(zip_file.read(name), bytes(report.content))
+
+    @mock.patch("ge.views_utils.ProcessPoolExecutor", ThreadExecutor)
+    def test_stale_reports_are_built_in_parallel(self, create_excel_output):
+        precompute_reports()
+        StoredReport.objects.filter(report_type__in=["hssd", "arts", "ul"]).delete()
+        create_excel_output.reset_mock()
+        data_version = get_data_version()
+        report_types = [
+            report_type for report_type, _ in iter_reports(data_version, workers=2)
+        ]
+        self.assertEqual(report_types, get_report_types())
+        self.assertEqual(create_excel_output.call_count, 3)
+        self.assertEqual(
+            StoredReport.objects.filter(data_version=data_version).count(),
+            len(get_report_types()),
+        )
+
 
 class SearchLibraryDataTestCase(TestCase):
     fixtures = [
@@ -210,6 +499,30 @@ class SearchLibraryDataTestCase(TestCase):
         )
         self.assertEqual(len(results), 1)
 
+    def test_keyword_results_are_ranked(self):
+        notes_match = LibraryData.objects.create(notes="Zebra collection")
+        title_match = LibraryData.objects.create(fund_title="Zebra fund")
+        results = get_librarydata_results(search_type="keyword", search_term="zebra")
+        self.assertEqual(list(results), [title_match, notes_match])
+
+    def test_long_fields_are_not_loaded(self):
+        results = get_librarydata_results(search_type="unit", search_term="studies")
+        self.assertIn("fund_purpose", results[0].get_deferred_fields())
+        self.assertNotIn("fund_title", results[0].get_deferred_fields())
+
+    @mock.patch("ge.views.GE_SEARCH_PAGE_SIZE", 2)
+    def test_results_are_paginated(self):
+        self.client.force_login(User.objects.create_user("tester"))
+        search = {"search_type": "keyword", "search_term": "FY23"}
+        response = self.client.get("/ge/search/", search)
+        self.assertEqual(len(response.context["page"]), 2)
+        self.assertContains(response, "Your search found 3 records.")
+        self.assertContains(
+            response, "?search_type=keyword&amp;search_term=FY23&amp;page=2"
+        )
+        response = self.client.get("/ge/search/", {**search, "page": 2})
+        self.assertEqual(len(response.context["page"]), 1)
+
     def test_new_funds_are_found(self):
         # Per notes in AddFundsTestCase.test_correct_new_fund_is_added(),
         # only one new fund is added from our test data.
@@ -237,6 +550,32 @@ class ReportManipulationTestCase(TestCase):
         sum_col(self.gifts_ws, "L")
         self.assertEqual(self.gifts_ws["L7"].value, "=SUM(L5:L6)")
 
+    def test_df_to_excel_matches_cell_by_cell(self):
+        # Bulk writing should give the same values and types as ws.cell()
+        df = pd.DataFrame(
+            {
+                "plain": ["HSSD", "", "Arts"],
+                "mixed": ["=SUM(A1:A2)", "#N/A", None],
+                "amount": [1.5, 0.0, -2.25],
+            }
+        )
+        ws = df_to_excel(df, Workbook().active)
+        expected_ws = Workbook().active
+        for row_id, row in enumerate(df.itertuples(index=False), 5):
+            for col_id, value in enumerate(row, 1):
+                expected_ws.cell(row=row_id, column=col_id, value=value)
+        for row, expected_row in zip(ws.iter_rows(), expected_ws.iter_rows()):
+            for cell, expected_cell in zip(row, expected_row):
+                self.assertEqual(cell.value, expected_cell.value)
+                self.assertEqual(cell.data_type, expected_cell.data_type)
+        self.assertEqual(ws.max_row, 7)
+
+    def test_workbook_bytes_round_trip(self):
+        wb = Workbook()
+        wb.active["A1"] = "HSSD"
+        stream = get_bytes_from_workbook(wb)
+        self.assertEqual(load_workbook(BytesIO(stream)).active["A1"].value, "HSSD")
+
     def test_as_of_date_current_year(self):
         # In November, as-of date should be 9/30 of current year
         self.assertEqual(get_as_of_date(datetime(2023, 11, 1)), "as of 9/30/23")
@@ -304,6 +643,15 @@ class ExcelOutputTestCase(TestCase):
         self.assertEqual(result["Endowments"]["O7"].value, "=SUM(O5:O6)")
         self.assertEqual(result["Endowments"]["Q7"].value, "=SUM(Q5:Q6)")
 
+    def test_unit_report_number_formats(self):
+        result = create_excel_output("hssd")
+        # Money columns, including totals, use the Accounting format
+        self.assertEqual(result["Gifts"]["L5"].number_format, ACCOUNTING_FORMAT)
+        self.assertEqual(result["Gifts"]["O6"].number_format, ACCOUNTING_FORMAT)
+        self.assertEqual(result["Endowments"]["Q7"].number_format, ACCOUNTING_FORMAT)
+        # Other columns keep the template's format
+        self.assertEqual(result["Gifts"]["A5"].number_format, "General")
+
     def test_ul_report_worksheets(self):
         result = create_excel_output("ul")
         # two worksheets in UL report
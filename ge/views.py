@@ -1,4 +1,5 @@
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
@@ -15,6 +16,7 @@ from ge.views_utils import (
     get_librarydata_results,
     get_qdb_data,
 )
+from lbs.settings import GE_SEARCH_PAGE_SIZE
 
 
 # TODO: Clean up auth system across qdb/ge apps
@@ -57,13 +59,23 @@ def show_log(request, line_count: int = 200) -> HttpResponse:
 @login_required(login_url="/login/")
 def search(request: HttpRequest) -> HttpResponse:
     context = {}  # default, for final render
-    if request.method == "POST":
-        form = LibraryDataSearchForm(request.POST)
+    # Searches use GET, so result pages can link to each other.
+    if "search_type" in request.GET:
+        form = LibraryDataSearchForm(request.GET)
         if form.is_valid():
             search_type = form.cleaned_data["search_type"]
             search_term = form.cleaned_data["search_term"]
             results = get_librarydata_results(search_type, search_term)
-            context = {"form": form, "results": results}
+            # Only the requested page of results is fetched.
+            page = Paginator(results, GE_SEARCH_PAGE_SIZE).get_page(
+                request.GET.get("page")
+            )
+            # The search, without the page number, for page links
+            query = request.GET.copy()
+            query.pop("page", None)
+            context = {"form": form, "page": page, "query": query.urlencode()}
+        else:
+            context = {"form": form}
     else:
         form = LibraryDataSearchForm()
         context = {"form": form}
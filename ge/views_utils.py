@@ -1,27 +1,77 @@
+import django
+import hashlib
 import logging
 import zipfile
 import pandas as pd
-import pytds
 
-from django.db.models import Q
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, QuerySet, Value, When
 from datetime import datetime
-from django.http import HttpResponse
-from functools import reduce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from functools import lru_cache, reduce
+from io import BytesIO
+from multiprocessing import get_context
+from typing import Callable, Iterable, Iterator
 from openpyxl import load_workbook
+from openpyxl.cell.cell import Cell, ERROR_CODES, ILLEGAL_CHARACTERS_RE
 from openpyxl.styles.borders import Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.workbook.workbook import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 from os import path
-from tempfile import NamedTemporaryFile
 from ge.forms import ReportForm
-from ge.models import BFSImport, CDWImport, LibraryData, MTFImport
-from lbs.settings import BASE_DIR
-from qdb.scripts.settings import DB_SERVER, DB_DATABASE, DB_USER, DB_PASSWORD
+from ge.models import (
+    BFSImport,
+    CampusDataHash,
+    CDWImport,
+    LibraryData,
+    LibraryDataVersion,
+    MTFImport,
+    StoredReport,
+)
+from lbs.settings import BASE_DIR, GE_REPORT_WORKERS
+from qdb.scripts.pool import qdb_pool
 
 logger = logging.getLogger(__name__)
 
+# Excel "format code" for Accounting, 2 decimal places, $, comma separator
+ACCOUNTING_FORMAT = """_($* #,##0.00_);_($* (#,##0.00);_($* " - "??_);_(@_)"""
+
+# Report templates; UL and Master reports have extra columns
+REPORT_TEMPLATE = path.join(BASE_DIR, "ge/ge_template.xlsx")
+UL_REPORT_TEMPLATE = path.join(BASE_DIR, "ge/ge_template_ul.xlsx")
+
+# Fields for keyword search, with how much a match in each counts towards
+# ranking results: titles first, then descriptions, then names and notes.
+KEYWORD_WEIGHTS = {
+    "fund_manager": 1,
+    "fund_purpose": 2,
+    "fund_restriction": 1,
+    "fund_summary": 2,
+    "fund_title": 4,
+    "lbs_notes": 1,
+    "notes": 1,
+}
+
+# Fields shown in search results; others, like the long notes, are only
+# loaded when a fund is edited.
+SEARCH_RESULT_FIELDS = [
+    "unit",
+    "fund_manager",
+    "fau_account",
+    "fau_cost_center",
+    "fau_fund",
+    "ucop_fdn_no",
+    "fund_title",
+]
+
+# Downloads larger than this are streamed, in pieces of this size
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
 
 def add_funds() -> None:
     """Add funds from campus data not already in LibraryData
@@ -31,144 +81,231 @@ def add_funds() -> None:
     # Original Access query qryAddNew_2:
     # Add rows to LibraryData from CDWImport where
     # (fau_account, fau_cost_center, fau_fund) doesn't already exist.
-    incoming_funds = CDWImport.objects.all().values(
-        "fau_account", "fau_cost_center", "fau_fund"
+    # Compare as sets of tuples, keeping incoming order for the new funds.
+    current_funds = set(
+        LibraryData.objects.values_list("fau_account", "fau_cost_center", "fau_fund")
     )
-    current_funds = LibraryData.objects.all().values(
+    incoming_funds = CDWImport.objects.order_by("id").values_list(
         "fau_account", "fau_cost_center", "fau_fund"
     )
-    for f in incoming_funds:
-        if f not in current_funds:
-            new_fund = LibraryData(
-                fau_account=f["fau_account"],
-                fau_cost_center=f["fau_cost_center"],
-                fau_fund=f["fau_fund"],
-                new_fund="Y",
-            )
+    new_faus = [
+        fau for fau in dict.fromkeys(incoming_funds) if fau not in current_funds
+    ]
+    if not new_faus:
+        return
+
+    # Original Access query qryAddNew_3:
+    # Match on BFSImport data to set other values in the new fund.
+    # Match is only on fau_fund, which often can find multiple rows,
+    # but the relevant fields appear to be the same for any given fund.
+    # Take the "first" match - if any, since match is not guaranteed.
+    bfs_funds = first_by_key(
+        BFSImport.objects.filter(fau_fund__in={fau[2] for fau in new_faus})
+        .order_by("id")
+        .only("fau_fund", "description", "fund_type", "fund_summary", "purpose"),
+        lambda r: r.fau_fund,
+    )
+
+    new_funds = []
+    for fau_account, fau_cost_center, fau_fund in new_faus:
+        new_fund = LibraryData(
+            fau_account=fau_account,
+            fau_cost_center=fau_cost_center,
+            fau_fund=fau_fund,
+            new_fund="Y",
+        )
 
-            # Original Access query qryAddNew_3:
-            # Match on BFSImport data to set other values in the new fund.
-            # Match is only on fau_fund, which often can find multiple rows,
-            # but the relevant fields appear to be the same for any given fund.
-            # Take the "first" match - if any, since match is not guaranteed.
-            bfs_funds = BFSImport.objects.filter(fau_fund=new_fund.fau_fund)
-            if bfs_funds.exists():
-                bfs_fund = bfs_funds[0]
-                new_fund.fund_title = bfs_fund.description
-                new_fund.fund_type = bfs_fund.fund_type
-                new_fund.fund_summary = bfs_fund.fund_summary
-                new_fund.fund_purpose = bfs_fund.purpose
-
-                # Original Access query qryAddNew_4 - queryAddNew_7:
-                # Normalize reg_fdn and fund_type values.
-                # These are converted from Access and assume all data... matches assumptions.
-                # These are dependent on a matching BFSImport row being found above.
-                if "FOUNDATION" in new_fund.fund_type.upper():
-                    new_fund.reg_fdn = "F"
-                if "REGENTAL" in new_fund.fund_type.upper():
-                    new_fund.reg_fdn = "R"
-                if "ENDOWMENT" in new_fund.fund_type.upper():
-                    new_fund.fund_type = "Endowment"
-                if "EXPENDITURE" in new_fund.fund_type.upper():
-                    new_fund.fund_type = "Current Expenditure"
+        bfs_fund = bfs_funds.get(new_fund.fau_fund)
+        if bfs_fund:
+            new_fund.fund_title = bfs_fund.description
+            new_fund.fund_type = bfs_fund.fund_type
+            new_fund.fund_summary = bfs_fund.fund_summary
+            new_fund.fund_purpose = bfs_fund.purpose
+
+            # Original Access query qryAddNew_4 - queryAddNew_7:
+            # Normalize reg_fdn and fund_type values.
+            # These are converted from Access and assume all data... matches assumptions.
+            # These are dependent on a matching BFSImport row being found above.
+            if "FOUNDATION" in new_fund.fund_type.upper():
+                new_fund.reg_fdn = "F"
+            if "REGENTAL" in new_fund.fund_type.upper():
+                new_fund.reg_fdn = "R"
+            if "ENDOWMENT" in new_fund.fund_type.upper():
+                new_fund.fund_type = "Endowment"
+            if "EXPENDITURE" in new_fund.fund_type.upper():
+                new_fund.fund_type = "Current Expenditure"
 
-            else:
-                # No matching BFSImport row found, so log a message.
-                logger.warning(
-                    f"No matching BFS (consolidated) data found for {new_fund.fau_fund=}"
-                )
+        else:
+            # No matching BFSImport row found, so log a message.
+            logger.warning(
+                f"No matching BFS (consolidated) data found for {new_fund.fau_fund=}"
+            )
 
-            # Original Access query qryAddNew_8:
-            # Clear the "new_fund" flag.
-            new_fund.new_fund = "N"
+        # Original Access query qryAddNew_8:
+        # Clear the "new_fund" flag.
+        new_fund.new_fund = "N"
+        logger.info(f"Added fund: {new_fund}")
+        new_funds.append(new_fund)
+
+    # Finally, save all of the new LibraryData records.
+    LibraryData.objects.bulk_create(new_funds, batch_size=1000)
+    if new_funds:
+        LibraryDataVersion.bump()
+
+
+# LibraryData fields derived from campus data by update_data().
+RECONCILED_FIELDS = [
+    "ytd_appropriation",
+    "ytd_expenditure",
+    "commitments",
+    "operating_balance",
+    "max_mtf_trf_amt",
+    "projected_annual_income",
+    "total_fund_value",
+    "fund_restriction",
+    "total_balance",
+]
+
+# Legacy Access queries applied by update_data(), in order, for logging.
+RECONCILE_QUERIES = [
+    "qryAAA_1UpdateMTF",
+    "qryAAA_2ProjIncomFound",
+    "qryAAA_2ProjIncomReg",
+    "qryAAA_3FoundTotVal",
+    "qryAAA_3FoundTotVal_2",
+    "qryAAA_3FoundTotVal_3",
+    "qryAAA_3RegTotVal",
+    "qryAAA_3RegTotVal_2",
+    "qryAAA_3RegTotVal_3",
+    "qryAAA_3RegTotVal_4",
+    "qryAAA_5_5400",
+]
+
+ENDOWMENT_FUND_TYPES = ("ENDOWMENT REGENTAL INCOME", "ENDOWMENT FOUNDATION")
+
+
+def first_by_key(rows: Iterable, key: Callable) -> dict:
+    """Map each key to the first row which has it.
+
+    This replicates the legacy "first matching row, if any" lookups,
+    so rows should be supplied in a stable order (normally by id).
+    """
+    lookup = {}
+    for row in rows:
+        lookup.setdefault(key(row), row)
+    return lookup
 
-            # Finally, save the new LibraryData record.
-            logger.info(f"Added fund: {new_fund}")
-            new_fund.save()
 
+def get_import_lookups() -> dict:
+    """Load each campus import table once, as dictionaries keyed
+    the way update_data() needs to join them to LibraryData.
+    """
+    bfs_rows = list(
+        BFSImport.objects.order_by("id").only(
+            "source",
+            "fund_type",
+            "fau_fund",
+            "available",
+            "unavailable",
+            "market_value",
+            "projected_income",
+        )
+    )
+    mtf_rows = MTFImport.objects.order_by("id").only(
+        "fund_nbr", "fund_restriction", "max_transfer_balance"
+    )
+    cdw_rows = CDWImport.objects.order_by("id").only(
+        "fau_account",
+        "fau_cost_center",
+        "fau_fund",
+        "inception_to_date_appropriation",
+        "inception_to_date_financial",
+        "encum_ml",
+        "operating_balance",
+    )
+    return {
+        # MTFImport by fund_nbr
+        "mtf": first_by_key(mtf_rows, lambda r: r.fund_nbr),
+        # BFSImport by (fau_fund, source)
+        "bfs_source": first_by_key(bfs_rows, lambda r: (r.fau_fund, r.source)),
+        # BFSImport endowments by fau_fund
+        "bfs_endowment": first_by_key(
+            [r for r in bfs_rows if r.fund_type in ENDOWMENT_FUND_TYPES],
+            lambda r: r.fau_fund,
+        ),
+        # BFSImport regental-source foundation endowments by fau_fund
+        "bfs_r_fdn_endowment": first_by_key(
+            [
+                r
+                for r in bfs_rows
+                if r.source == "R" and r.fund_type == "ENDOWMENT FOUNDATION"
+            ],
+            lambda r: r.fau_fund,
+        ),
+        # CDWImport by (fau_account, fau_cost_center, fau_fund)
+        "cdw": first_by_key(
+            cdw_rows, lambda r: (r.fau_account, r.fau_cost_center, r.fau_fund)
+        ),
+    }
+
+
+def reconcile_fund(ld: LibraryData, lookups: dict, counts: Counter) -> None:
+    """Apply the legacy Access update queries to one LibraryData row, in memory.
 
-def update_data() -> None:
-    """Update LibraryData rows to final state before report generation."""
+    Parameters:
+    ld -- The LibraryData row to update; it is not saved
+    lookups -- Campus data, from get_import_lookups()
+    counts -- Counter of rows updated by each legacy query, updated in place
+    """
+    bfs_source = lookups["bfs_source"]
 
     # Original Access query qryAAA_0Clear:
     # Set several financial values to 0 for all rows.
-    cnt = LibraryData.objects.all().update(
-        ytd_appropriation=0,
-        ytd_expenditure=0,
-        commitments=0,
-        operating_balance=0,
-        max_mtf_trf_amt=0,
-        projected_annual_income=0,
-        total_fund_value=0,
-    )
-
-    logger.info(f"qryAAA_0Clear: {cnt} updated")
+    ld.ytd_appropriation = 0
+    ld.ytd_expenditure = 0
+    ld.commitments = 0
+    ld.operating_balance = 0
+    ld.max_mtf_trf_amt = 0
+    ld.projected_annual_income = 0
+    ld.total_fund_value = 0
 
     # Original Access query qryAAA_1UpdateMTF (and duplicate qryAAA_1UpdateMTF1):
     # Update relevant LibraryData rows from MTF data (first matching row only, if any).
-    cnt = 0
-    for ld in LibraryData.objects.all():
-        if ld.ucop_fdn_no:
-            mtf_rows = MTFImport.objects.filter(fund_nbr=ld.ucop_fdn_no)
-            if mtf_rows.exists():
-                mtf = mtf_rows[0]
-                ld.fund_restriction = mtf.fund_restriction
-                ld.max_mtf_trf_amt = mtf.max_transfer_balance
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_1UpdateMTF: {cnt} updated")
+    if ld.ucop_fdn_no:
+        mtf = lookups["mtf"].get(ld.ucop_fdn_no)
+        if mtf:
+            ld.fund_restriction = mtf.fund_restriction
+            ld.max_mtf_trf_amt = mtf.max_transfer_balance
+            counts["qryAAA_1UpdateMTF"] += 1
 
     # Original Access query qryAAA_2ProjIncomFound:
     # Update projected annual income from BFS data (Foundation funds).
-    cnt = 0
-    for ld in LibraryData.objects.all():
-        if ld.ucop_fdn_no:
-            bfs_rows = BFSImport.objects.filter(fau_fund=ld.ucop_fdn_no, source="F")
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
-                ld.projected_annual_income = bfs.projected_income
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_2ProjIncomFound: {cnt} updated")
+    if ld.ucop_fdn_no:
+        bfs = bfs_source.get((ld.ucop_fdn_no, "F"))
+        if bfs:
+            ld.projected_annual_income = bfs.projected_income
+            counts["qryAAA_2ProjIncomFound"] += 1
 
     # Original Access query qryAAA_2ProjIncomReg:
     # Update projected annual income from BFS data (Regental funds).
-    cnt = 0
-    for ld in LibraryData.objects.all():
-        if ld.fau_fund:
-            bfs_rows = BFSImport.objects.filter(fau_fund=ld.fau_fund, source="R")
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
-                ld.projected_annual_income = bfs.projected_income
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_2ProjIncomReg: {cnt} updated")
-
-    # Original Access query qryAAA_3FoundTotVal:
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="F"):
+    if ld.fau_fund:
+        bfs = bfs_source.get((ld.fau_fund, "R"))
+        if bfs:
+            ld.projected_annual_income = bfs.projected_income
+            counts["qryAAA_2ProjIncomReg"] += 1
+
+    if ld.reg_fdn == "F":
+        # Original Access query qryAAA_3FoundTotVal:
         if ld.ucop_fdn_no:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.ucop_fdn_no,
-                fund_type__in=("ENDOWMENT REGENTAL INCOME", "ENDOWMENT FOUNDATION"),
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = lookups["bfs_endowment"].get(ld.ucop_fdn_no)
+            if bfs:
                 ld.total_fund_value = bfs.market_value
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3FoundTotVal: {cnt} updated")
+                counts["qryAAA_3FoundTotVal"] += 1
 
-    # Original Access query qryAAA_3FoundTotVal_2:
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="F"):
+        # Original Access query qryAAA_3FoundTotVal_2:
         if ld.fau_fund:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.fau_fund,
-                fund_type__in=("ENDOWMENT REGENTAL INCOME", "ENDOWMENT FOUNDATION"),
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = lookups["bfs_endowment"].get(ld.fau_fund)
+            if bfs:
                 # Seems like this will always be just bfs.available,
                 # since ld.total_fund_value is set to 0 by qryAAA_0Clear,
                 # and this set doesn't intersect qryAAA_3FoundTotVal...
@@ -176,145 +313,245 @@ def update_data() -> None:
                 # Per LBS, total_fund_value is not really used...
                 # but we'll replicate legacy logic for consistency.
                 ld.total_fund_value = ld.total_fund_value + bfs.available
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3FoundTotVal_2: {cnt} updated")
-
-    # Original Access query qryAAA_3FoundTotVal_3:
-    # This currently matches no rows.
-    # Per LBS, total_fund_value is not really used...
-    # but we'll replicate legacy logic for consistency.
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="F"):
+                counts["qryAAA_3FoundTotVal_2"] += 1
+
+        # Original Access query qryAAA_3FoundTotVal_3:
+        # This currently matches no rows.
+        # Per LBS, total_fund_value is not really used...
+        # but we'll replicate legacy logic for consistency.
         if ld.fau_fund:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.fau_fund,
-                source="R",
-                fund_type="ENDOWMENT FOUNDATION",
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = lookups["bfs_r_fdn_endowment"].get(ld.fau_fund)
+            if bfs:
                 ld.total_fund_value = ld.total_fund_value - bfs.unavailable
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3FoundTotVal_3: {cnt} updated")
-
-    # Original Access query qryAAA_3RegTotVal:
-    # Regental fund math is different from Foundation math above...
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="R"):
+                counts["qryAAA_3FoundTotVal_3"] += 1
+
+    if ld.reg_fdn == "R":
+        # Regental fund math is different from Foundation math above...
+        # Original Access query qryAAA_3RegTotVal:
         if ld.fau_fund:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.fau_fund,
-                source="U",
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = bfs_source.get((ld.fau_fund, "U"))
+            if bfs:
                 ld.total_fund_value = bfs.available
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3RegTotVal: {cnt} updated")
-
-    # Original Access query qryAAA_3RegTotVal_2:
-    # Regental fund math is different from Foundation math above...
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="R"):
+                counts["qryAAA_3RegTotVal"] += 1
+
+        # Original Access query qryAAA_3RegTotVal_2:
         if ld.fau_fund:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.fau_fund,
-                source="R",
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = bfs_source.get((ld.fau_fund, "R"))
+            if bfs:
                 ld.total_fund_value = ld.total_fund_value - bfs.unavailable
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3RegTotVal_2: {cnt} updated")
-
-    # Original Access query qryAAA_3RegTotVal_3:
-    # Regental fund math is different from Foundation math above...
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="R"):
+                counts["qryAAA_3RegTotVal_2"] += 1
+
+        # Original Access query qryAAA_3RegTotVal_3:
         if ld.ucop_fdn_no:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.ucop_fdn_no,
-                source="R",
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+            bfs = bfs_source.get((ld.ucop_fdn_no, "R"))
+            if bfs:
                 ld.total_fund_value = ld.total_fund_value + bfs.market_value
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3RegTotVal_3: {cnt} updated")
-
-    # Original Access query qryAAA_3RegTotVal_4:
-    # Regental fund math is different from Foundation math above...
-    cnt = 0
-    for ld in LibraryData.objects.filter(reg_fdn="R"):
-        if ld.fau_fund_no:
-            bfs_rows = BFSImport.objects.filter(
-                fau_fund=ld.fau_fund_no,
-                fau_fund__gt="40000",
-                source="U",
-            )
-            if bfs_rows.exists():
-                bfs = bfs_rows[0]
+                counts["qryAAA_3RegTotVal_3"] += 1
+
+        # Original Access query qryAAA_3RegTotVal_4:
+        # Only BFS funds above 40000 are considered.
+        if ld.fau_fund_no and ld.fau_fund_no > "40000":
+            bfs = bfs_source.get((ld.fau_fund_no, "U"))
+            if bfs:
                 ld.total_fund_value = bfs.available
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_3RegTotVal_4: {cnt} updated")
+                counts["qryAAA_3RegTotVal_4"] += 1
 
     # Original Access query qryAAA_5_5400:
     # Update LibraryData amounts from CDW data.
-    cnt = 0
-    for ld in LibraryData.objects.all():
-        if ld.fau_fund and ld.fau_cost_center and ld.fau_account:
-            cdw_rows = CDWImport.objects.filter(
-                fau_fund=ld.fau_fund,
-                fau_cost_center=ld.fau_cost_center,
-                fau_account=ld.fau_account,
-            )
-            if cdw_rows.exists():
-                cdw = cdw_rows[0]
-                ld.ytd_appropriation = cdw.inception_to_date_appropriation
-                ld.ytd_expenditure = cdw.inception_to_date_financial
-                ld.commitments = cdw.encum_ml
-                ld.operating_balance = cdw.operating_balance
-                ld.save()
-                cnt += 1
-    logger.info(f"qryAAA_5_5400: {cnt} updated")
+    if ld.fau_fund and ld.fau_cost_center and ld.fau_account:
+        cdw = lookups["cdw"].get((ld.fau_account, ld.fau_cost_center, ld.fau_fund))
+        if cdw:
+            ld.ytd_appropriation = cdw.inception_to_date_appropriation
+            ld.ytd_expenditure = cdw.inception_to_date_financial
+            ld.commitments = cdw.encum_ml
+            ld.operating_balance = cdw.operating_balance
+            counts["qryAAA_5_5400"] += 1
 
     # Original Access query qryAAA_6TotalBalance:
     # Finally, update LibraryData total balance for all rows.
-    cnt = 0
-    for ld in LibraryData.objects.all():
-        ld.total_balance = ld.operating_balance + ld.max_mtf_trf_amt
-        ld.save()
-        cnt += 1
-    logger.info(f"qryAAA_6TotalBalance: {cnt} updated")
+    ld.total_balance = ld.operating_balance + ld.max_mtf_trf_amt
+
 
+def hash_rows(rows: Iterable[tuple]) -> dict[str, str]:
+    """Get a content hash per key, from (key, value, value...) rows.
 
-def get_librarydata_results(search_type: str, search_term: str) -> list[LibraryData]:
+    Rows with the same key are hashed together, in the order supplied,
+    since the legacy lookups use the first matching row. Rows with no key
+    are skipped, since no LibraryData row is matched to them by that key.
+    """
+    hashes = {}
+    for key, *values in rows:
+        if key is None:
+            continue
+        hashes.setdefault(key, hashlib.sha256()).update(repr(values).encode())
+    return {key: content_hash.hexdigest() for key, content_hash in hashes.items()}
+
+
+def get_cdw_key(account: str | None, cost_center: str | None, fund: str | None):
+    """Get the fund key of a CDW FAU, or None if any part of it is missing."""
+    if None in (account, cost_center, fund):
+        return None
+    return f"{account}-{cost_center}-{fund}"
+
+
+def get_import_hashes() -> dict[tuple[str, str], str]:
+    """Get content hashes of the campus import data used by reconcile_fund(),
+    keyed by (source, fund_key).
+    """
+    bfs_rows = BFSImport.objects.order_by("id").values_list(
+        "fau_fund",
+        "source",
+        "fund_type",
+        "available",
+        "unavailable",
+        "market_value",
+        "projected_income",
+    )
+    mtf_rows = MTFImport.objects.order_by("id").values_list(
+        "fund_nbr", "fund_restriction", "max_transfer_balance"
+    )
+    cdw_rows = (
+        (get_cdw_key(account, cost_center, fund), *amounts)
+        for account, cost_center, fund, *amounts in CDWImport.objects.order_by(
+            "id"
+        ).values_list(
+            "fau_account",
+            "fau_cost_center",
+            "fau_fund",
+            "inception_to_date_appropriation",
+            "inception_to_date_financial",
+            "encum_ml",
+            "operating_balance",
+        )
+    )
+    hashes = {}
+    for source, rows in (("BFS", bfs_rows), ("MTF", mtf_rows), ("CDW", cdw_rows)):
+        for fund_key, content_hash in hash_rows(rows).items():
+            hashes[(source, fund_key)] = content_hash
+    return hashes
+
+
+def get_librarydata_hash(ld: LibraryData) -> str:
+    """Get a content hash of the LibraryData fields which reconcile_fund()
+    reads or writes, so local edits are picked up like campus data changes.
+    """
+    fields = [
+        "reg_fdn",
+        "ucop_fdn_no",
+        "fau_fund_no",
+        "fau_account",
+        "fau_cost_center",
+        "fau_fund",
+    ] + RECONCILED_FIELDS
+    # Normalize values (like int 0 vs float 0.0) as they'll be when read back.
+    values = [
+        LibraryData._meta.get_field(field).to_python(getattr(ld, field))
+        for field in fields
+    ]
+    return hashlib.sha256(repr(values).encode()).hexdigest()
+
+
+def get_fund_keys(ld: LibraryData) -> list[tuple[str, str]]:
+    """Get the (source, fund_key) campus data keys which reconcile_fund()
+    can match for a LibraryData row.
+    """
+    return [
+        ("MTF", ld.ucop_fdn_no),
+        ("BFS", ld.ucop_fdn_no),
+        ("BFS", ld.fau_fund),
+        ("BFS", ld.fau_fund_no),
+        ("CDW", get_cdw_key(ld.fau_account, ld.fau_cost_center, ld.fau_fund)),
+    ]
+
+
+def update_data(changed_only: bool = False) -> list[LibraryData]:
+    """Update LibraryData rows to final state before report generation.
+
+    Each campus import table is read once, rows are updated in memory
+    via reconcile_fund(), and the results are written back together.
+
+    Parameters:
+    changed_only -- Update only rows whose campus data, or own relevant
+    values, changed since the last update
+
+    Returns a list of the LibraryData objects which were updated.
+    """
+    lookups = get_import_lookups()
+    import_hashes = get_import_hashes()
+    stored_hashes = {}
+    stored_ids = {}
+    for pk, source, fund_key, content_hash in CampusDataHash.objects.values_list(
+        "id", "source", "fund_key", "content_hash"
+    ):
+        stored_hashes[(source, fund_key)] = content_hash
+        stored_ids[(source, fund_key)] = pk
+    all_funds = list(LibraryData.objects.all())
+    current_keys = import_hashes.keys() | {("LD", str(ld.id)) for ld in all_funds}
+    removed_ids = [stored_ids[key] for key in stored_ids.keys() - current_keys]
+
+    funds = all_funds
+    if changed_only:
+        changed_keys = {
+            key
+            for key in import_hashes.keys() | stored_hashes.keys()
+            if key[0] != "LD" and import_hashes.get(key) != stored_hashes.get(key)
+        }
+        funds = [
+            ld
+            for ld in all_funds
+            if get_librarydata_hash(ld) != stored_hashes.get(("LD", str(ld.id)))
+            or changed_keys.intersection(get_fund_keys(ld))
+        ]
+
+    counts = Counter()
+    for ld in funds:
+        reconcile_fund(ld, lookups, counts)
+
+    # Hashes reflect the data as of this update, for the next one to compare.
+    current_hashes = dict(import_hashes)
+    for ld in funds:
+        current_hashes[("LD", str(ld.id))] = get_librarydata_hash(ld)
+    new_hashes = [
+        CampusDataHash(source=source, fund_key=fund_key, content_hash=content_hash)
+        for (source, fund_key), content_hash in current_hashes.items()
+        if stored_hashes.get((source, fund_key)) != content_hash
+    ]
+
+    with transaction.atomic():
+        LibraryData.objects.bulk_update(funds, RECONCILED_FIELDS, batch_size=1000)
+        if funds:
+            LibraryDataVersion.bump()
+        CampusDataHash.objects.filter(pk__in=removed_ids).delete()
+        CampusDataHash.objects.bulk_create(
+            new_hashes,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["source", "fund_key"],
+            update_fields=["content_hash", "updated"],
+        )
+
+    logger.info(f"qryAAA_0Clear: {len(funds)} updated")
+    for query in RECONCILE_QUERIES:
+        logger.info(f"{query}: {counts[query]} updated")
+    logger.info(f"qryAAA_6TotalBalance: {len(funds)} updated")
+    return funds
+
+
+def get_librarydata_results(search_type: str, search_term: str) -> QuerySet:
     """Search LibraryData fields for a search_term, based on search_type.
 
     Parameters:
     search_type -- The type of search (fund or keyword)
     search_term -- The term to search for
 
-    Returns a list of LibraryData objects matching the search.
+    Returns an unevaluated queryset of LibraryData objects matching the search,
+    with only SEARCH_RESULT_FIELDS loaded, so callers can fetch one page at a time.
+    Keyword results are ranked by KEYWORD_WEIGHTS; others are in id order.
     """
     if search_type == "fund":
         fields_to_search = ["fau_fund", "fau_fund_no", "ucop_fdn_no"]
     elif search_type == "keyword":
-        fields_to_search = [
-            "fund_manager",
-            "fund_purpose",
-            "fund_restriction",
-            "fund_summary",
-            "fund_title",
-            "lbs_notes",
-            "notes",
-        ]
+        fields_to_search = list(KEYWORD_WEIGHTS)
     elif search_type == "unit":
         fields_to_search = ["unit"]
     elif search_type == "new_funds":
@@ -339,15 +576,36 @@ def get_librarydata_results(search_type: str, search_term: str) -> list[LibraryD
         q_filter = reduce(lambda a, b: a | b, q_list)
 
     # Apply the filter to find results.
-    results = LibraryData.objects.filter(q_filter).order_by("id")
+    results = LibraryData.objects.filter(q_filter).only(*SEARCH_RESULT_FIELDS)
+    if search_type == "keyword":
+        # Best matches first; fields are only checked again for matching rows.
+        rank = reduce(
+            lambda a, b: a + b,
+            [
+                Case(
+                    When(q, then=Value(KEYWORD_WEIGHTS[field])),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+                for field, q in zip(fields_to_search, q_list)
+            ],
+        )
+        results = results.annotate(rank=rank).order_by("-rank", "id")
+    else:
+        results = results.order_by("id")
+
+    return results
 
-    # Return results as a list of objects, rather than a queryset.
-    return [item for item in results]
 
+def sum_col(
+    ws: Worksheet, col: str, col_top: int = 5, last_row: int | None = None
+) -> None:
+    """Add a total row to an Excel spreadsheet column.
 
-def sum_col(ws: Worksheet, col: str, col_top: int = 5) -> None:
-    """Add a total row to an Excel spreadsheet column."""
-    last_row = get_last_row(ws, col)
+    If last_row (the last row of data) is not given, the column is scanned for it.
+    """
+    if last_row is None:
+        last_row = get_last_row(ws, col)
     ws[f"{col}{last_row + 1}"] = f"=SUM({col}{col_top}:{col}{last_row})"
 
 
@@ -392,17 +650,75 @@ def get_as_of_date(date: datetime = datetime.now()) -> str:
     return f"as of {end_date}/{year % 100}"
 
 
-def df_to_excel(df: pd.DataFrame, ws: Worksheet) -> Worksheet:
-    """Puts dataframe into Excel worksheet, with data starting at row 5."""
-    # convert to rows for use in spreadsheet
-    rows = dataframe_to_rows(df, index=False, header=False)
-    # add rows to spreadsheet, starting at row 5
-    for r_col_id, row in enumerate(rows, 1):
-        for c_col_id, value in enumerate(row, 1):
-            ws.cell(row=r_col_id + 4, column=c_col_id, value=value)
+def get_bulk_data_type(series: pd.Series) -> str | None:
+    """Get the Excel data type for a column whose values can all be written without
+    openpyxl's per-value checks: "n" for numbers, "s" for plain text.
+
+    Returns None if the values need to be checked one by one.
+    """
+    if pd.api.types.is_float_dtype(series.dtype) or pd.api.types.is_integer_dtype(
+        series.dtype
+    ):
+        return "n"
+    if series.empty or not series.map(type).eq(str).all():
+        return None
+    # The same checks openpyxl makes for each string, once for the whole column.
+    if (
+        ILLEGAL_CHARACTERS_RE.search("".join(series)) is None
+        and not series.str.startswith("=").any()
+        and not series.isin(ERROR_CODES).any()
+        and series.str.len().max() <= 32767
+    ):
+        return "s"
+    return None
+
+
+def df_to_excel(df: pd.DataFrame, ws: Worksheet, first_row: int = 5) -> Worksheet:
+    """Puts dataframe into Excel worksheet, with data starting at row 5.
+
+    Data is written a column at a time. Cells which already exist in the template
+    keep their styles, and values are checked per column rather than per cell.
+    """
+    cells = ws._cells
+    for col_id, (_, series) in enumerate(df.items(), 1):
+        data_type = get_bulk_data_type(series)
+        for row_id, value in enumerate(series.tolist(), first_row):
+            cell = cells.get((row_id, col_id))
+            if cell is None:
+                # As in ws.append(), which skips ws.cell()'s checks
+                cell = cells[(row_id, col_id)] = Cell(ws, row=row_id, column=col_id)
+            if data_type:
+                cell._value = value
+                cell.data_type = data_type
+            else:
+                cell.value = value
+    # ws.cell() would have moved this along, for later calls to ws.append()
+    ws._current_row = max(ws._current_row, first_row + len(df) - 1)
     return ws
 
 
+def format_money_cols(ws: Worksheet, cols: Iterable[str], first_row: int = 5) -> None:
+    """Apply the Accounting number format to columns, from first_row
+    to the bottom of the sheet.
+    """
+    last_row = ws.max_row
+    cells = ws._cells
+    for col in cols:
+        col_id = column_index_from_string(col)
+        # Let openpyxl register the format once, then copy its id to the other cells.
+        top_cell = ws.cell(row=first_row, column=col_id)
+        top_cell.number_format = ACCOUNTING_FORMAT
+        number_format_id = top_cell._style.numFmtId
+        for row_id in range(first_row + 1, last_row + 1):
+            cell = cells.get((row_id, col_id))
+            if cell is None:
+                cell = ws.cell(row=row_id, column=col_id)
+            # New cells have no style until one is set, as in openpyxl itself.
+            if not cell._style:
+                cell._style = StyleArray()
+            cell._style.numFmtId = number_format_id
+
+
 def create_excel_output(rpt_type: str) -> Workbook:
     """Create Excel output for a report.
 
@@ -411,9 +727,9 @@ def create_excel_output(rpt_type: str) -> Workbook:
 
     # UL and Master reports have extra columns, so use a different template
     if rpt_type in ("master", "ul"):
-        template_file = path.join(BASE_DIR, "ge/ge_template_ul.xlsx")
+        template_file = UL_REPORT_TEMPLATE
     else:
-        template_file = path.join(BASE_DIR, "ge/ge_template.xlsx")
+        template_file = REPORT_TEMPLATE
     wb = load_workbook(template_file)
 
     if rpt_type == "master":
@@ -460,12 +776,7 @@ def create_excel_output(rpt_type: str) -> Workbook:
         ws = df_to_excel(df, ws)
 
         # add correct cell formatting
-        for col in ("L", "M", "N", "O", "P", "Q", "S"):
-            for row in range(5, len(ws[col]) + 1):
-                # Excel "format code" for Accounting, 2 decimal places, $, comma separator
-                ws[f"{col}{row}"].number_format = (
-                    """_($* #,##0.00_);_($* (#,##0.00);_($* " - "??_);_(@_)"""
-                )
+        format_money_cols(ws, ["L", "M", "N", "O", "P", "Q", "S"])
         # add filters on all cols
         filters = ws.auto_filter
         last_col = get_column_letter(get_last_col(ws, 5))
@@ -644,21 +955,14 @@ def create_excel_output(rpt_type: str) -> Workbook:
             gifts_money_cols.extend(["P", "Q"])
             endowments_money_cols.extend(["P", "S"])
 
+        # data ends at row 4 + number of rows, so totals don't need to scan the sheet
         for col in gifts_money_cols:
-            sum_col(gifts_ws, col)
-            for row in range(5, len(gifts_ws[col]) + 1):
-                # Excel "format code" for Accounting, 2 decimal places, $, comma separator
-                gifts_ws[f"{col}{row}"].number_format = (
-                    """_($* #,##0.00_);_($* (#,##0.00);_($* " - "??_);_(@_)"""
-                )
+            sum_col(gifts_ws, col, last_row=4 + len(gifts_df))
+        format_money_cols(gifts_ws, gifts_money_cols)
 
         for col in endowments_money_cols:
-            sum_col(endowments_ws, col)
-            for row in range(5, len(endowments_ws[col]) + 1):
-                # Excel "format code" for Accounting, 2 decimal places, $, comma separator
-                endowments_ws[f"{col}{row}"].number_format = (
-                    """_($* #,##0.00_);_($* (#,##0.00);_($* " - "??_);_(@_)"""
-                )
+            sum_col(endowments_ws, col, last_row=4 + len(endowments_df))
+        format_money_cols(endowments_ws, endowments_money_cols)
 
         # set filters on all columns with data
         endowments_filters = endowments_ws.auto_filter
@@ -693,24 +997,146 @@ def create_excel_output(rpt_type: str) -> Workbook:
 
 
 def get_bytes_from_workbook(workbook: Workbook) -> bytes:
-    """Convert openpyxl workbook into bytes for serving via HTTP."""
-    with NamedTemporaryFile() as tmp:
-        workbook.save(tmp.name)
-        tmp.seek(0)
-        stream = tmp.read()
+    """Convert openpyxl workbook into bytes for serving via HTTP.
+
+    The workbook is saved to memory, not a temporary file; getvalue() hands
+    over the buffer without copying it.
+    """
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def iter_chunks(stream: bytes, chunk_size: int) -> Iterator[memoryview]:
+    """Split bytes into pieces for a streaming response, without copying them."""
+    view = memoryview(stream)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+def get_report_types() -> list[str]:
+    """Get the list of report types from ReportForm."""
+    return [choice[0] for choice in ReportForm().fields["report_type"].choices]
+
+
+@lru_cache
+@lru_cache(maxsize=1)
+def get_template_hash() -> str:
+    """Get a content hash of the report templates, which only change on deploy,
+    so they're read once per process.
+    """
+    content_hash = hashlib.sha256()
+    for template_file in (REPORT_TEMPLATE, UL_REPORT_TEMPLATE):
+        with open(template_file, "rb") as f:
+            content_hash.update(f.read())
+    return content_hash.hexdigest()
+
+
+def get_data_version() -> str:
+    """Get a stamp for everything G&E reports are built from: the LibraryData
+    version, the as-of date shown in reports, and the templates.
+
+    The LibraryData version is bumped whenever LibraryData is written by the
+    application (forms, admin, add_funds() and update_data()); changes made
+    directly in the database aren't noticed until the next of those.
+    """
+    content_hash = hashlib.sha256(get_as_of_date().encode())
+    content_hash.update(get_template_hash().encode())
+    content_hash.update(str(LibraryDataVersion.current()).encode())
+    return content_hash.hexdigest()
+
+
+def build_report_bytes(report_type: str) -> bytes:
+    """Build a report, returning it as bytes.
+
+    Also run in worker processes by iter_reports(), so must only need Django set up.
+    """
+    return get_bytes_from_workbook(create_excel_output(report_type))
+
+
+def save_report(report_type: str, data_version: str, stream: bytes) -> None:
+    """Store a report built from data_version, replacing any older copy."""
+    StoredReport.objects.update_or_create(
+        report_type=report_type,
+        defaults={
+            "data_version": data_version,
+            "content": stream,
+            "created": timezone.now(),
+        },
+    )
+
+
+def store_report(report_type: str, data_version: str) -> bytes:
+    """Build a report and store it, replacing any older copy.
+
+    Returns the report as bytes.
+    """
+    stream = build_report_bytes(report_type)
+    save_report(report_type, data_version, stream)
     return stream
 
 
-def download_excel_file(rpt_type: str) -> HttpResponse:
-    """Get Excel file via HTTP response."""
-    workbook = create_excel_output(rpt_type)
+def precompute_reports(force: bool = False) -> list[str]:
+    """Build and store every report type whose stored copy is missing or stale.
 
-    stream = get_bytes_from_workbook(workbook)
+    Parameters:
+    force -- Rebuild all reports, even if current
 
-    response = HttpResponse(
-        content=stream,
-        content_type="application/ms-excel",
+    Returns the report types which were built.
+    """
+    data_version = get_data_version()
+    current_reports = set(
+        StoredReport.objects.filter(data_version=data_version).values_list(
+            "report_type", flat=True
+        )
+    )
+    built = []
+    for report_type in get_report_types():
+        if force or report_type not in current_reports:
+            store_report(report_type, data_version)
+            built.append(report_type)
+    return built
+
+
+def get_report_bytes(report_type: str, data_version: str | None = None) -> bytes:
+    """Get a report as bytes: the stored copy if it's current, otherwise
+    built now (and stored for next time).
+
+    Parameters:
+    report_type -- The type of report, from ReportForm
+    data_version -- From get_data_version(), if already known
+    """
+    if data_version is None:
+        data_version = get_data_version()
+    stream = (
+        StoredReport.objects.filter(report_type=report_type, data_version=data_version)
+        .values_list("content", flat=True)
+        .first()
     )
+    if stream is not None:
+        return bytes(stream)
+    logger.info(f"No current stored {report_type} report; building it now")
+    return store_report(report_type, data_version)
+
+
+def download_excel_file(rpt_type: str) -> HttpResponse | StreamingHttpResponse:
+    """Get Excel file via HTTP response.
+
+    Files larger than DOWNLOAD_CHUNK_SIZE are streamed in pieces of that size.
+    """
+    stream = get_report_bytes(rpt_type)
+
+    if len(stream) > DOWNLOAD_CHUNK_SIZE:
+        response = StreamingHttpResponse(
+            iter_chunks(stream, DOWNLOAD_CHUNK_SIZE),
+            content_type="application/ms-excel",
+        )
+        response["Content-Length"] = len(stream)
+    else:
+        response = HttpResponse(
+            content=stream,
+            content_type="application/ms-excel",
+        )
     response["Content-Disposition"] = (
         f'attachment; filename={rpt_type}-Report-{datetime.now().strftime("%Y%m%d%H%M")}.xlsx'
     )
@@ -718,26 +1144,109 @@ def download_excel_file(rpt_type: str) -> HttpResponse:
     return response
 
 
-def download_zip_file() -> HttpResponse:
-    """Get zip file containing all Excel reports, via HTTP response."""
+def iter_reports(
+    data_version: str, workers: int = GE_REPORT_WORKERS
+) -> Iterator[tuple[str, bytes]]:
+    """Get every report as bytes, in ReportForm order.
+
+    Current stored reports are read one at a time. Stale reports are built
+    (and stored) in up to workers processes at once, only as far ahead as there
+    are processes, so no more than workers + 1 reports are in memory at a time.
+
+    Parameters:
+    data_version -- From get_data_version()
+    workers -- Processes for building stale reports; 1 builds them in this process
+
+    Yields (report type, report as bytes) tuples.
+    """
+    report_types = get_report_types()
+    current_reports = set(
+        StoredReport.objects.filter(data_version=data_version).values_list(
+            "report_type", flat=True
+        )
+    )
+    stale_reports = [
+        report_type
+        for report_type in report_types
+        if report_type not in current_reports
+    ]
+    if workers <= 1 or len(stale_reports) <= 1:
+        for report_type in report_types:
+            yield report_type, get_report_bytes(report_type, data_version)
+        return
+
+    # spawn, not fork: forked processes would share this one's database connection.
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(stale_reports)),
+        mp_context=get_context("spawn"),
+        initializer=django.setup,
+    ) as processes:
+        reports_to_build = iter(stale_reports)
+        futures = {}
+
+        def build_next_report():
+            report_type = next(reports_to_build, None)
+            if report_type is not None:
+                futures[report_type] = processes.submit(build_report_bytes, report_type)
+
+        for _ in range(workers):
+            build_next_report()
+        for report_type in report_types:
+            if report_type in futures:
+                stream = futures.pop(report_type).result()
+                build_next_report()
+                save_report(report_type, data_version, stream)
+            else:
+                stream = get_report_bytes(report_type, data_version)
+            yield report_type, stream
+
+
+class ZipStream:
+    """Write-only file for ZipFile which keeps what's written until collected,
+    so a zip file can be sent while it's still being built.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
 
+    def flush(self) -> None:
+        pass
+
+    def collect(self) -> bytes:
+        """Get everything written since the last call."""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip_file(timestamp: str, workers: int = GE_REPORT_WORKERS) -> Iterator[bytes]:
+    """Build a zip file of all reports, yielding it in pieces as each report
+    is added.
+    """
+    stream = ZipStream()
+    # ZipFile can't seek in the stream, so it writes each file's sizes after its data.
+    with zipfile.ZipFile(stream, mode="w") as zip_file:
+        for report_type, report in iter_reports(get_data_version(), workers):
+            zip_file.writestr(f"{report_type}-Report-{timestamp}.xlsx", report)
+            yield stream.collect()
+    yield stream.collect()
+
+
+def download_zip_file() -> StreamingHttpResponse:
+    """Get zip file containing all Excel reports, via HTTP response.
+
+    The zip file is streamed as it's built, rather than held in memory.
+    """
     # Use the same timestamp for all reports and for zip file.
     timestamp = datetime.now().strftime("%Y%m%d%H%M")
-    response = HttpResponse(content_type="application/zip")
+    response = StreamingHttpResponse(
+        iter_zip_file(timestamp), content_type="application/zip"
+    )
     zip_filename = f"ge_reports-{timestamp}.zip"
-    # This works, because Django's HttpResponse is a file-like object.
-    zip_file = zipfile.ZipFile(response, mode="w")  # type: ignore
-
-    # Get list of reports from ReportForm.
-    report_types = [choice[0] for choice in ReportForm().fields["report_type"].choices]
-    # Get Excel workbook for each, convert to bytes, and add to zip file.
-    for report_type in report_types:
-        workbook = create_excel_output(report_type)
-        excel_filename = f"{report_type}-Report-{timestamp}.xlsx"
-        stream = get_bytes_from_workbook(workbook)
-        zip_file.writestr(excel_filename, stream)
-
-    # Attach it to the response and return it.
     response["Content-Disposition"] = f"attachment; filename={zip_filename}"
     return response
 
@@ -811,16 +1320,11 @@ def get_qdb_query(report_type: str) -> str:
 
 
 def get_qdb_data(report_type) -> list:
-    conn = pytds.connect(DB_SERVER, DB_DATABASE, DB_USER, DB_PASSWORD)
-    # Connection and cursor are closed automatically via 'with'
-    with conn:
-        conn.as_dict = True
-        cursor = conn.cursor()
-        # TODO: Query will be built based on parameters passed to this method.
-        # For now, just use static query.
-        qdb_query = get_qdb_query(report_type)
-        # Run query with the other, real, parameters
-        # cursor.execute(qdb_final_query % (yyyymm, account_number))
-        cursor.execute(qdb_query)
-        rows = cursor.fetchall()
-        return rows
+    # TODO: Query will be built based on parameters passed to this method.
+    # For now, just use static query.
+    qdb_query = get_qdb_query(report_type)
+    # Run query with the other, real, parameters
+    # cursor.execute(qdb_final_query % (yyyymm, account_number))
+    rows = qdb_pool.fetchall(qdb_query)
+    logger.debug(f"QDB connection pool: {qdb_pool.stats}")
+    return rows
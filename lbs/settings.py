@@ -180,6 +180,13 @@ MESSAGE_TAGS = {
 # But this will be helpful if/when that code is updated to use Django.
 EMAIL_BACKEND = os.getenv("DJANGO_EMAIL_BACKEND")
 
+# G&E reports
+# Processes which build stale reports for the zip download; 1 builds them
+# in the web process. Each needs its own memory, so keep this small.
+GE_REPORT_WORKERS = int(os.getenv("GE_REPORT_WORKERS", "2"))
+# Funds shown per page of G&E search results
+GE_SEARCH_PAGE_SIZE = int(os.getenv("GE_SEARCH_PAGE_SIZE", "100"))
+
 # Logging
 LOGGING = {
     "version": 1,
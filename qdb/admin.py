@@ -1,6 +1,8 @@
 from django.utils.html import mark_safe
 from django.contrib import admin
-from .models import Account, Recipient, Staff, Unit
+from .models import (
+    Account, OutboxMessage, Recipient, ReportJob, ReportRun, Staff, Unit, UnitCheckpoint
+)
 
 
 # create page to display units
@@ -61,6 +63,40 @@ class RecipientAdmin(admin.ModelAdmin):
         return recipient.unit.name
 
 
+# create page to display report jobs queued from the form
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'unit', 'year', 'month', 'status', 'created', 'finished')
+    list_filter = ('status',)
+    ordering = ('-id',)
+
+
+# create page to display report emails waiting to be sent, or already sent
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'unit', 'yyyymm', 'status', 'attempts', 'next_attempt', 'sent')
+    list_filter = ('status',)
+    ordering = ('-id',)
+    exclude = ('attachment',)
+
+
+# show each unit's progress on the run's page
+class UnitCheckpointInline(admin.TabularInline):
+    model = UnitCheckpoint
+    fields = ('unit', 'stage', 'updated')
+    readonly_fields = ('unit', 'stage', 'updated')
+    can_delete = False
+    extra = 0
+
+
+# create page to display checkpointed report runs
+@admin.register(ReportRun)
+class ReportRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'yyyymm', 'send_email', 'created', 'finished')
+    ordering = ('-id',)
+    inlines = (UnitCheckpointInline,)
+
+
 # given unit, add aul, head and assoc recipients as links to edit the recipient
 def get_recipient_link(obj, role):
     # if the current unit has a passed-in value which matches either aul, head, or assoc
@@ -0,0 +1,139 @@
+import os
+import random
+from copy import copy
+from decimal import Decimal
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from openpyxl import load_workbook
+from qdb.scripts import formatter
+from qdb.scripts.parser import Parser
+from qdb.scripts.settings import SUBCODES
+
+# Compared for every cell of both workbooks
+CELL_ATTRIBUTES = ["value", "font", "border", "fill", "alignment", "number_format"]
+
+
+def get_sample_data(accounts: int, funds: int, seed: int = 1) -> dict:
+    """Build report data like the parser's, with random amounts. Every other
+    account is Library Materials, and the first fund of each account is 19900,
+    so reports include every kind of sheet.
+
+    :param accounts: The number of accounts
+    :param funds: The number of funds per account
+    :param seed: Seed for the random amounts, so runs are repeatable
+    :return: Report data, as from Parser.data
+    """
+    rand = random.Random(seed)
+    parser = Parser("202301", "Benchmark unit")
+    for account_index in range(accounts):
+        account = f"{606000 + account_index}"
+        cc_list = ["LM"] if account_index % 2 == 0 else ["AD", "LB"]
+        rows = []
+        for fund_index in range(funds):
+            fund_number = "19900" if fund_index == 0 else f"{30000 + fund_index}"
+            for sub_code in sorted(rand.sample(list(SUBCODES), rand.randint(2, 8))):
+                rows.append(
+                    {
+                        "account_number": account,
+                        "cost_center_code": cc_list[0],
+                        "fund_number": fund_number,
+                        "account_title": f"Account {account}",
+                        "fund_title": f"Fund {fund_number}",
+                        "sub_code": sub_code,
+                        "ytd_approp": Decimal(rand.randint(-100, 50000)),
+                        "ytd_expense": Decimal(rand.randint(0, 50000)),
+                        "encumbrance": Decimal(rand.randint(0, 500)),
+                        "memo_lien": Decimal(rand.randint(0, 50)),
+                        "operating_bal_am": Decimal(rand.randint(-100, 5000)),
+                    }
+                )
+        parser.add_account(1, account, cc_list, rows)
+    return parser.data
+
+
+def compare_workbooks(filename_a: str, filename_b: str) -> list[str]:
+    """Compare the contents and appearance of two workbooks.
+
+    :param filename_a: The first workbook
+    :param filename_b: The second workbook
+    :return: A list of differences; empty if the workbooks look the same
+    """
+    wb_a = load_workbook(filename_a)
+    wb_b = load_workbook(filename_b)
+    if wb_a.sheetnames != wb_b.sheetnames:
+        return [f"Sheets: {wb_a.sheetnames} != {wb_b.sheetnames}"]
+    differences = []
+    for ws_a, ws_b in zip(wb_a.worksheets, wb_b.worksheets):
+        title = ws_a.title
+        if set(map(str, ws_a.merged_cells)) != set(map(str, ws_b.merged_cells)):
+            differences.append(f"{title}: merged cells differ")
+        for column in formatter.COLUMNS:
+            width_a = ws_a.column_dimensions[column].width
+            width_b = ws_b.column_dimensions[column].width
+            if width_a != width_b:
+                differences.append(f"{title}!{column}: width {width_a} != {width_b}")
+        for setting in ["orientation", "paperSize", "fitToHeight"]:
+            setting_a = getattr(ws_a.page_setup, setting)
+            setting_b = getattr(ws_b.page_setup, setting)
+            if setting_a != setting_b:
+                differences.append(f"{title}: {setting} {setting_a} != {setting_b}")
+        last_row = max(ws_a.max_row, ws_b.max_row)
+        last_column = max(ws_a.max_column, ws_b.max_column)
+        for row in range(1, last_row + 1):
+            height_a = ws_a.row_dimensions[row].height
+            height_b = ws_b.row_dimensions[row].height
+            if height_a != height_b:
+                differences.append(f"{title}!{row}: height {height_a} != {height_b}")
+            for column in range(1, last_column + 1):
+                cell_a = ws_a.cell(row, column)
+                cell_b = ws_b.cell(row, column)
+                for attribute in CELL_ATTRIBUTES:
+                    # Styles are proxies, which only compare equal once copied.
+                    value_a = copy(getattr(cell_a, attribute))
+                    value_b = copy(getattr(cell_b, attribute))
+                    if value_a != value_b:
+                        differences.append(
+                            f"{title}!{cell_a.coordinate}: {attribute} differs"
+                        )
+    return differences
+
+
+class Command(BaseCommand):
+    help = "Compare the speed and output of the QDB report formatter's Excel backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--accounts", type=int, default=6, help="Accounts (sheets) per report"
+        )
+        parser.add_argument("--funds", type=int, default=100, help="Funds per account")
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Times to build each report"
+        )
+
+    def handle(self, *args, **options):
+        data = get_sample_data(options["accounts"], options["funds"])
+        with TemporaryDirectory() as tmpdir:
+            filenames = {}
+            for write_only in [False, True]:
+                backend = "write-only" if write_only else "normal"
+                filename = os.path.join(tmpdir, f"{backend}.xlsx")
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = perf_counter()
+                    formatter.generate_report(data, filename, write_only=write_only)
+                    timings.append(perf_counter() - start)
+                filenames[backend] = filename
+                self.stdout.write(
+                    f"{backend}: best {min(timings):.2f} seconds"
+                    f" of {options['repeat']}, {os.path.getsize(filename)} bytes"
+                )
+            differences = compare_workbooks(
+                filenames["normal"], filenames["write-only"]
+            )
+        if differences:
+            self.stdout.write(f"Reports differ in {len(differences)} places:")
+            for difference in differences[:20]:
+                self.stdout.write(f"\t{difference}")
+        else:
+            self.stdout.write("Reports are identical")
@@ -0,0 +1,130 @@
+from collections import Counter
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.pool import qdb_pool
+from qdb.scripts.standin import StandinQDB
+
+
+class Command(BaseCommand):
+    help = (
+        "Time run_qdb_reporter against a local stand-in for QDB,"
+        " with made-up data. Reports are built in a temporary directory and not"
+        " emailed; cached QDB data is ignored, and nothing is saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--month", default="202401", help="Report month, in YYYYMM format"
+        )
+        parser.add_argument(
+            "-u",
+            "--unit",
+            type=int,
+            default=None,
+            help="Unit ID number; if omitted all units are run",
+        )
+        parser.add_argument(
+            "--funds",
+            type=int,
+            default=10,
+            help="Funds for each account and cost center",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Seconds for each query"
+        )
+        parser.add_argument(
+            "--failure_rate",
+            type=float,
+            default=0,
+            help="Chance (0 to 1) that each query loses its connection",
+        )
+        parser.add_argument(
+            "-b",
+            "--batch_fetch",
+            action="store_true",
+            help="Fetch QDB data for all units at once, instead of per account",
+        )
+        parser.add_argument(
+            "-p",
+            "--pipeline",
+            action="store_true",
+            help="Overlap fetching, parsing, building and sending reports,"
+            " instead of running several units at a time",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of units to run at the same time (default 1)",
+        )
+        parser.add_argument(
+            "--write_only",
+            action="store_true",
+            help="Build reports with the faster write-only Excel backend",
+        )
+
+    def handle(self, *args, **options):
+        yyyymm = options["month"]
+        with TemporaryDirectory() as tmpdir:
+            orchestrator = Orchestrator(tmpdir, [])
+            units = orchestrator.get_units(options["unit"])
+            accounts = [
+                account
+                for unit in units
+                for account in orchestrator.get_accounts_for_unit(unit.id)
+            ]
+            start = perf_counter()
+            standin = StandinQDB(
+                accounts,
+                [yyyymm],
+                funds=options["funds"],
+                latency=options["latency"],
+                failure_rate=options["failure_rate"],
+            )
+            self.stdout.write(
+                f"Stand-in QDB for {len(accounts)} accounts"
+                f" ready in {perf_counter() - start:.1f} seconds"
+            )
+            outcomes = Counter()
+            # Use the stand-in instead of QDB, starting without connections.
+            qdb_pool.close_all()
+            connect = qdb_pool.connect
+            qdb_pool.connect = standin.connect
+            start = perf_counter()
+            try:
+                # Rolled back, so the ledger cache is left as it was.
+                with transaction.atomic():
+                    orchestrator.run(
+                        yyyymm,
+                        units,
+                        override_recipients=[],
+                        batch_fetch=options["batch_fetch"],
+                        workers=options["workers"],
+                        pipeline=options["pipeline"],
+                        refresh=True,
+                        write_only=options["write_only"],
+                        on_unit_done=lambda unit, outcome: outcomes.update([outcome]),
+                    )
+                    transaction.set_rollback(True)
+            except Exception as e:
+                self.stdout.write(f"Run failed: {e}")
+            finally:
+                seconds = perf_counter() - start
+                qdb_pool.close_all()
+                qdb_pool.connect = connect
+                standin.close()
+        self.stdout.write(
+            f"{len(units)} units in {seconds:.1f} seconds"
+            f" ({len(units) / seconds:.1f} units per second):"
+            f" {outcomes['generated']} generated, {outcomes['empty']} empty,"
+            f" {outcomes['failed']} failed"
+        )
+        self.stdout.write(
+            f"{standin.stats['queries']} queries,"
+            f" {standin.stats['failures']} connection failures;"
+            f" connection pool {qdb_pool.stats}"
+        )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.settings import REPORTS_DIR, DEFAULT_RECIPIENTS
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a unit's QDB balances over several months, ending with the given month"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("-y", "--year", type=int, help="Year of the last month")
+        parser.add_argument(
+            "-m", "--month", type=int, help="Month number of the last month"
+        )
+        parser.add_argument(
+            "-u", "--unit", type=int, required=True, help="Unit ID number"
+        )
+        parser.add_argument(
+            "-n",
+            "--months",
+            type=int,
+            default=12,
+            help="Number of months to compare: 3 for a quarter, 12 (the default)"
+            " ending in June for a fiscal year",
+        )
+        parser.add_argument(
+            "--save_snapshot",
+            help="Also save the QDB data to this file, as a compressed .npz snapshot",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["months"] < 2:
+                raise ValueError("ERROR: months must be at least 2")
+            orchestrator = Orchestrator(REPORTS_DIR, DEFAULT_RECIPIENTS)
+            yyyymm = orchestrator.validate_date(
+                options["year"], options["month"], yyyymm=True
+            )
+            units = orchestrator.get_units(options["unit"])
+            if options["save_snapshot"] and len(units) > 1:
+                raise ValueError("ERROR: --save_snapshot needs a single unit")
+            for unit in units:
+                filename = orchestrator.run_comparison(
+                    yyyymm,
+                    options["months"],
+                    unit,
+                    save_snapshot=options["save_snapshot"],
+                )
+                if filename:
+                    self.stdout.write(filename)
+        except ValueError as e:
+            exit(str(e))
@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand
+from qdb.scripts import checkpoints, outbox
 from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.sender import MailSession
 from qdb.scripts.settings import REPORTS_DIR, DEFAULT_RECIPIENTS
+from qdb.scripts.snapshot import Snapshot
 
 
 class Command(BaseCommand):
@@ -47,6 +50,60 @@ class Command(BaseCommand):
             action="store_true",
             help="Perform a dry run of the report",
         )
+        parser.add_argument(
+            "-b",
+            "--batch_fetch",
+            action="store_true",
+            help="Fetch QDB data for all units at once, instead of per account",
+        )
+        parser.add_argument(
+            "-p",
+            "--pipeline",
+            action="store_true",
+            help="Overlap fetching, parsing, building and sending reports,"
+            " instead of running several units at a time",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of units to run at the same time (default 1)",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Ignore cached QDB data and fetch it all again",
+        )
+        parser.add_argument(
+            "--write_only",
+            action="store_true",
+            help="Build reports with the faster write-only Excel backend",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Only send the month's report emails which haven't been sent,"
+            " including failed ones, without running the reports again",
+        )
+        parser.add_argument(
+            "--snapshot",
+            help="Read QDB data from this snapshot file, saved by snapshot_qdb,"
+            " instead of from QDB",
+        )
+        parser.add_argument(
+            "-c",
+            "--checkpoint",
+            action="store_true",
+            help="Record the run's progress, and continue the month's last run"
+            " with the same options if it didn't finish",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="With --checkpoint, start a new run even if the last one"
+            " didn't finish",
+        )
 
     def handle(self, *args, **options):
         list_units = options["list_units"]
@@ -57,6 +114,12 @@ class Command(BaseCommand):
         list_recipients = options["list_recipients"]
         override_recipients = options["override_recipients"]
         dry_run = options["dry_run"]
+        batch_fetch = options["batch_fetch"]
+        workers = options["workers"]
+        pipeline = options["pipeline"]
+        refresh = options["refresh"]
+        write_only = options["write_only"]
+        snapshot_file = options["snapshot"]
         # using code from __main__ of orchestrator
         try:
             orchestrator = Orchestrator(REPORTS_DIR, DEFAULT_RECIPIENTS)
@@ -67,6 +130,23 @@ class Command(BaseCommand):
                 year, month = yyyymm
                 yyyymm = f"{year}{month:02}"
             units = orchestrator.get_units(unit)
+            if options["resume"]:
+                with MailSession() as session:
+                    sent = outbox.deliver_due(
+                        session, resume=True, yyyymm=yyyymm, units=units
+                    )
+                print(f"{sent['sent']} sent, {sent['not sent']} not sent")
+                return
+            snapshot = Snapshot.load(snapshot_file) if snapshot_file else None
+            report_run = None
+            if options["checkpoint"] and not dry_run:
+                report_run = checkpoints.start_run(
+                    yyyymm,
+                    units,
+                    send_email=email,
+                    override_recipients=override_recipients,
+                    restart=options["restart"],
+                )
             orchestrator.run(
                 yyyymm,
                 units,
@@ -74,6 +154,13 @@ class Command(BaseCommand):
                 list_recipients=list_recipients,
                 override_recipients=override_recipients,
                 dry_run=dry_run,
+                batch_fetch=batch_fetch,
+                workers=workers,
+                refresh=refresh,
+                write_only=write_only,
+                snapshot=snapshot,
+                pipeline=pipeline,
+                report_run=report_run,
             )
             return
         except ValueError as e:
@@ -0,0 +1,63 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from qdb.scripts import outbox
+from qdb.scripts.jobs import claim_next_job, fail_stale_jobs, run_job
+from qdb.scripts.sender import MailSession
+from qdb.scripts.settings import REPORT_JOB_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run QDB report jobs queued from the web form, and send report emails"
+        " waiting in the outbox"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run all queued jobs and send all due emails, then exit instead"
+            " of waiting for more",
+        )
+        parser.add_argument(
+            "--poll_interval",
+            type=float,
+            default=REPORT_JOB_POLL_INTERVAL,
+            help=f"Seconds between checks for new jobs (default {REPORT_JOB_POLL_INTERVAL})",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of units to run at the same time, per job (default 1)",
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Report worker started")
+        while True:
+            # This process runs for a long time, so don't rely on
+            # connections which the database may have closed.
+            close_old_connections()
+            stale_jobs = fail_stale_jobs()
+            if stale_jobs:
+                logger.warning(f"Marked {stale_jobs} stale report jobs as failed")
+            stale_messages = outbox.fail_stale_messages()
+            if stale_messages:
+                logger.warning(f"Marked {stale_messages} stale emails as failed")
+            # Connects only if any emails are due.
+            with MailSession() as session:
+                outbox.deliver_due(session)
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+            logger.info(f"Running report job {job.id}: {job}")
+            run_job(job, workers=options["workers"])
+            logger.info(f"Finished report job {job.id}: {job}")
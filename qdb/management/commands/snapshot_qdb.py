@@ -0,0 +1,54 @@
+import logging
+import os
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from qdb.scripts import fetcher
+from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.settings import REPORTS_DIR, DEFAULT_RECIPIENTS
+from qdb.scripts.snapshot import get_snapshot_filename
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Save a month of QDB data for all library accounts to a local snapshot,"
+        " for use by run_qdb_reporter --snapshot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--month",
+            help="Year and month in YYYYMM format; if omitted, last month",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            help="File to save the snapshot to (default qdb_YYYYMM.npz"
+            " in the snapshot directory)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            month = options["month"]
+            if month is None:
+                year = None
+            elif len(month) == 6 and month.isdigit():
+                year, month = int(month[:4]), int(month[4:])
+            else:
+                raise ValueError("ERROR: month must be in YYYYMM format")
+            orchestrator = Orchestrator(REPORTS_DIR, DEFAULT_RECIPIENTS)
+            yyyymm = orchestrator.validate_date(year, month, yyyymm=True)
+        except ValueError as e:
+            exit(str(e))
+
+        filename = options["output"] or get_snapshot_filename(yyyymm)
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        start = perf_counter()
+        snapshot = fetcher.get_qdb_snapshot([yyyymm])
+        snapshot.save(filename)
+        logger.info(
+            f"Saved {len(snapshot)} QDB rows for {yyyymm} to {filename}"
+            f" in {perf_counter() - start:.1f} seconds"
+        )
+        self.stdout.write(filename)
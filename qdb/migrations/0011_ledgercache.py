@@ -0,0 +1,49 @@
+# Generated by Django 5.2.14 on 2026-10-18 20:19
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qdb", "0010_cronjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("yyyymm", models.CharField(max_length=6)),
+                ("account", models.CharField(max_length=6)),
+                ("cc_list", models.CharField(max_length=100)),
+                ("is_fye", models.BooleanField(default=False)),
+                (
+                    "rows",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+                ("last_used", models.DateTimeField()),
+                ("hits", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("yyyymm", "account", "cc_list", "is_fye"),
+                        name="unique_ledger_cache",
+                    )
+                ],
+            },
+        ),
+    ]
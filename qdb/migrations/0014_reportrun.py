@@ -0,0 +1,122 @@
+# Generated by Django 5.2.14 on 2026-10-18 21:20
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qdb", "0013_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("yyyymm", models.CharField(max_length=6)),
+                ("send_email", models.BooleanField(default=False)),
+                ("override_recipients", models.JSONField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AccountCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("account", models.CharField(max_length=6)),
+                ("cc_list", models.CharField(max_length=100)),
+                (
+                    "rows",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="account_checkpoints",
+                        to="qdb.reportrun",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("run", "account", "cc_list"),
+                        name="unique_account_checkpoint",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UnitCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("fetched", "Fetched"),
+                            ("rendered", "Rendered"),
+                            ("sent", "Sent"),
+                            ("queued", "Queued to send"),
+                            ("empty", "Empty"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="unit_checkpoints",
+                        to="qdb.reportrun",
+                    ),
+                ),
+                (
+                    "unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="qdb.unit"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("run", "unit"), name="unique_unit_checkpoint"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.14 on 2026-10-18 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qdb", "0014_reportrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportrun",
+            name="unit_ids",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -83,3 +84,176 @@ class CronJob(models.Model):
             kwargs.pop("force_insert", None)
         self.id = self.permanent_id
         super().save(*args, **kwargs)
+
+
+class LedgerCache(models.Model):
+    # QDB rows from fetcher.get_qdb_data(), for one account and its cost centers,
+    # so reports for closed months can be rerun without querying QDB again.
+    # See scripts/cache.py.
+    yyyymm = models.CharField(max_length=6)
+    account = models.CharField(max_length=6)
+    # Comma-separated, in the order requested
+    cc_list = models.CharField(max_length=100)
+    is_fye = models.BooleanField(default=False)
+    # DjangoJSONEncoder stores Decimal amounts as strings.
+    rows = models.JSONField(encoder=DjangoJSONEncoder)
+    created = models.DateTimeField()
+    last_used = models.DateTimeField()
+    hits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["yyyymm", "account", "cc_list", "is_fye"],
+                name="unique_ledger_cache",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.yyyymm} {self.account} {self.cc_list}"
+
+
+class ReportJob(models.Model):
+    # A report requested from the web form, run by the run_report_worker command
+    # so the request itself returns right away. See scripts/jobs.py.
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    status_choices = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+    status = models.CharField(max_length=10, choices=status_choices, default=QUEUED)
+    # May be the "All units" unit
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    send_email = models.BooleanField(default=False)
+    # List of addresses, or null to use each unit's recipients
+    override_recipients = models.JSONField(null=True, blank=True)
+    total_units = models.PositiveIntegerField(default=0)
+    # Outcome of each unit finished so far, by unit name:
+    # "sent", "generated", "empty" or "failed"
+    progress = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.unit.name} {self.year}-{self.month:02} ({self.status})"
+
+
+class OutboxMessage(models.Model):
+    # A report email, kept until it's sent, so sending can be retried without
+    # running the report again. See scripts/outbox.py.
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    status_choices = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+    status = models.CharField(max_length=10, choices=status_choices, default=PENDING)
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE)
+    yyyymm = models.CharField(max_length=6)
+    # List of addresses
+    recipients = models.JSONField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    attachment_name = models.CharField(max_length=200)
+    # The report workbook; emptied once sent
+    attachment = models.BinaryField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField()
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt"], name="outbox_due_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.unit.name} {self.yyyymm} ({self.status})"
+
+
+class ReportRun(models.Model):
+    # A checkpointed run of the reports for a month, so a run which stopped
+    # part way through can be continued without redoing finished units.
+    # See scripts/checkpoints.py.
+    yyyymm = models.CharField(max_length=6)
+    send_email = models.BooleanField(default=False)
+    # Sorted list of addresses, or null to use each unit's recipients
+    override_recipients = models.JSONField(null=True, blank=True)
+    # Sorted IDs of the units the run covers
+    unit_ids = models.JSONField(default=list)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        status = "finished" if self.finished else "unfinished"
+        return f"{self.yyyymm} ({status})"
+
+
+class UnitCheckpoint(models.Model):
+    # How far a unit got in a ReportRun.
+    FETCHED = "fetched"
+    RENDERED = "rendered"
+    SENT = "sent"
+    QUEUED = "queued"
+    EMPTY = "empty"
+    stage_choices = [
+        (FETCHED, "Fetched"),
+        (RENDERED, "Rendered"),
+        (SENT, "Sent"),
+        (QUEUED, "Queued to send"),
+        (EMPTY, "Empty"),
+    ]
+    run = models.ForeignKey(
+        ReportRun, on_delete=models.CASCADE, related_name="unit_checkpoints"
+    )
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE)
+    # Last stage finished; blank if none
+    stage = models.CharField(max_length=10, choices=stage_choices, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["run", "unit"], name="unique_unit_checkpoint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.run} {self.unit.name}: {self.stage}"
+
+
+class AccountCheckpoint(models.Model):
+    # QDB rows fetched for one account and its cost centers in a ReportRun,
+    # kept until the run finishes so they aren't fetched again.
+    run = models.ForeignKey(
+        ReportRun, on_delete=models.CASCADE, related_name="account_checkpoints"
+    )
+    account = models.CharField(max_length=6)
+    # Comma-separated, in the order requested
+    cc_list = models.CharField(max_length=100)
+    # DjangoJSONEncoder stores Decimal amounts as strings.
+    rows = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["run", "account", "cc_list"], name="unique_account_checkpoint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.run} {self.account} {self.cc_list}"
@@ -0,0 +1,110 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+import arrow
+from django.db.models import F
+from django.utils import timezone
+from qdb.models import LedgerCache
+from .settings import AMOUNT_FIELDS, QDB_CACHE_MAX_ENTRIES, QDB_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def is_cacheable(yyyymm: str) -> bool:
+    """Whether results for a month can be cached. The current month
+    is still open, so its data changes daily and is never cached.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :return: True if the month can be cached
+    """
+    return yyyymm < arrow.now().format("YYYYMM")
+
+
+def restore_amounts(rows: list[dict]) -> list[dict]:
+    """Convert cached amounts, stored as strings in JSON, back to Decimal,
+    as returned by QDB.
+
+    :param rows: Rows from the cache
+    :return: The same rows, with Decimal amounts
+    """
+    for row in rows:
+        for field in AMOUNT_FIELDS:
+            if row.get(field) is not None:
+                row[field] = Decimal(row[field])
+    return rows
+
+
+def get_cached_rows(
+    yyyymm: str, accounts: list[tuple[str, list[str]]]
+) -> dict[tuple[str, tuple[str, ...]], list]:
+    """Get cached QDB rows for the given accounts, where available.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :param accounts: (account, list of cost centers) tuples
+    :return: A dictionary of rows, keyed by (account, tuple of cost centers),
+    for only the accounts found in the cache
+    """
+    if not is_cacheable(yyyymm):
+        return {}
+    now = timezone.now()
+    wanted = {(account, ",".join(cc_list)) for account, cc_list in accounts}
+    entries = LedgerCache.objects.filter(
+        yyyymm=yyyymm,
+        is_fye=yyyymm.endswith("06"),
+        account__in={account for account, _ in accounts},
+        created__gte=now - timedelta(seconds=QDB_CACHE_TTL),
+    )
+    cached_rows = {}
+    hit_ids = []
+    for entry in entries:
+        if (entry.account, entry.cc_list) in wanted:
+            key = (entry.account, tuple(entry.cc_list.split(",")))
+            cached_rows[key] = restore_amounts(entry.rows)
+            hit_ids.append(entry.id)
+    LedgerCache.objects.filter(id__in=hit_ids).update(hits=F("hits") + 1, last_used=now)
+    return cached_rows
+
+
+def store_rows(yyyymm: str, rows_by_account: dict[tuple[str, tuple[str, ...]], list]):
+    """Cache QDB rows, replacing any already cached for the same accounts,
+    then remove expired entries and, if there are too many, the least recently
+    used ones.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :param rows_by_account: A dictionary of rows, keyed by
+    (account, tuple of cost centers)
+    """
+    if not is_cacheable(yyyymm) or not rows_by_account:
+        return
+    now = timezone.now()
+    entries = [
+        LedgerCache(
+            yyyymm=yyyymm,
+            account=account,
+            cc_list=",".join(cc_list),
+            is_fye=yyyymm.endswith("06"),
+            rows=rows,
+            created=now,
+            last_used=now,
+        )
+        for (account, cc_list), rows in rows_by_account.items()
+    ]
+    LedgerCache.objects.bulk_create(
+        entries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["yyyymm", "account", "cc_list", "is_fye"],
+        update_fields=["rows", "created", "last_used"],
+    )
+
+    expired, _ = LedgerCache.objects.filter(
+        created__lt=now - timedelta(seconds=QDB_CACHE_TTL)
+    ).delete()
+    excess_ids = list(
+        LedgerCache.objects.order_by("-last_used", "-id").values_list("id", flat=True)[
+            QDB_CACHE_MAX_ENTRIES:
+        ]
+    )
+    excess, _ = LedgerCache.objects.filter(id__in=excess_ids).delete()
+    if expired or excess:
+        logger.info(f"QDB cache: removed {expired} expired, {excess} excess entries")
@@ -0,0 +1,142 @@
+import os
+from django.utils import timezone
+from qdb.models import AccountCheckpoint, ReportRun, Unit, UnitCheckpoint
+from .cache import restore_amounts
+
+# Stages after which a unit has nothing left to do
+DONE_STAGES = [UnitCheckpoint.SENT, UnitCheckpoint.QUEUED, UnitCheckpoint.EMPTY]
+
+
+def start_run(
+    yyyymm: str,
+    units: list[Unit],
+    send_email: bool = False,
+    override_recipients: list[str] | None = None,
+    restart: bool = False,
+) -> ReportRun:
+    """Get the month's last unfinished run of the same units with the same
+    options, to continue it, or start a new run. A run of some of the units
+    never continues (or finishes) a run of more of them.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :param units: The units to run the reports for
+    :param send_email: Whether the reports are sent by email
+    :param override_recipients: The recipients to override the default recipients
+    :param restart: Whether to start a new run even if there's an unfinished one
+    :return: The run
+    """
+    if override_recipients is not None:
+        override_recipients = sorted(override_recipients)
+    unit_ids = sorted(unit.id for unit in units)
+    runs = ReportRun.objects.filter(
+        yyyymm=yyyymm, send_email=send_email, finished__isnull=True
+    )
+    if restart:
+        runs.update(finished=timezone.now())
+    else:
+        # Compared in Python, since JSON null and SQL NULL are hard to
+        # compare the same way on every database.
+        for run in runs.order_by("-id"):
+            if (
+                run.override_recipients == override_recipients
+                and run.unit_ids == unit_ids
+            ):
+                return run
+    return ReportRun.objects.create(
+        yyyymm=yyyymm,
+        send_email=send_email,
+        override_recipients=override_recipients,
+        unit_ids=unit_ids,
+    )
+
+
+def get_fetched_rows(
+    run: ReportRun, accounts: list[tuple[str, list[str]]]
+) -> dict[tuple[str, tuple[str, ...]], list]:
+    """Get the QDB rows already fetched in a run, for the given accounts.
+
+    :param run: The run
+    :param accounts: (account, list of cost centers) tuples
+    :return: A dictionary of rows, keyed by (account, tuple of cost centers),
+    for only the accounts already fetched
+    """
+    wanted = {(account, ",".join(cc_list)) for account, cc_list in accounts}
+    fetched_rows = {}
+    for checkpoint in run.account_checkpoints.filter(
+        account__in={account for account, _ in accounts}
+    ):
+        if (checkpoint.account, checkpoint.cc_list) in wanted:
+            key = (checkpoint.account, tuple(checkpoint.cc_list.split(",")))
+            fetched_rows[key] = restore_amounts(checkpoint.rows)
+    return fetched_rows
+
+
+def get_finished_unit_ids(run: ReportRun, filenames: dict[int, str]) -> set[int]:
+    """Get the units which have nothing left to do in a run. Reports which
+    aren't emailed are only finished if their files are still there.
+
+    :param run: The run
+    :param filenames: Each unit's report filename, by unit ID
+    :return: The IDs of the finished units
+    """
+    finished = set()
+    for unit_id, stage in run.unit_checkpoints.values_list("unit_id", "stage"):
+        if stage in DONE_STAGES or (
+            stage == UnitCheckpoint.RENDERED
+            and not run.send_email
+            and os.path.exists(filenames.get(unit_id, ""))
+        ):
+            finished.add(unit_id)
+    return finished
+
+
+def save_unit(
+    run: ReportRun,
+    unit: Unit,
+    outcome: str,
+    accounts: list[tuple[str, list[str]]],
+    rows_by_account: dict[tuple[str, tuple[str, ...]], list],
+):
+    """Record how far a unit got, and the QDB rows fetched for its accounts,
+    even if it failed.
+
+    :param run: The run
+    :param unit: The unit
+    :param outcome: The unit's outcome: "sent", "queued", "generated", "empty"
+    or "failed"
+    :param accounts: The unit's accounts, as from get_accounts_for_unit()
+    :param rows_by_account: QDB rows fetched so far, keyed by
+    (account, tuple of cost centers)
+    """
+    keys = [(account, tuple(cc_list)) for account, cc_list in accounts]
+    AccountCheckpoint.objects.bulk_create(
+        [
+            AccountCheckpoint(
+                run=run, account=account, cc_list=",".join(cc_list), rows=rows
+            )
+            for (account, cc_list), rows in (
+                (key, rows_by_account[key]) for key in keys if key in rows_by_account
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    if outcome == "failed":
+        fetched = all(key in rows_by_account for key in keys)
+        stage = UnitCheckpoint.FETCHED if fetched else ""
+    elif outcome == "generated":
+        stage = UnitCheckpoint.RENDERED
+    else:
+        stage = outcome
+    UnitCheckpoint.objects.update_or_create(
+        run=run, unit=unit, defaults={"stage": stage}
+    )
+
+
+def finish_run(run: ReportRun):
+    """Mark a run as finished, discarding its fetched QDB rows.
+
+    :param run: The run
+    """
+    run.account_checkpoints.all().delete()
+    run.finished = timezone.now()
+    run.save(update_fields=["finished"])
@@ -1,6 +1,10 @@
-import pytds
-from .settings import DB_SERVER, DB_DATABASE, DB_USER, DB_PASSWORD
+from itertools import groupby
+from .pool import qdb_pool
+from .snapshot import Snapshot
 
+# Maximum account / cost center pairs per batched query;
+# SQL Server allows at most 2100 parameters per query.
+BATCH_SIZE = 500
 
 QDB_QUERY_SELECT_CLAUSE = """
 SELECT
@@ -27,18 +31,45 @@ INNER JOIN qdb.dbo.fund fun
     AND glb.fund_number = fun.fund_number
 """
 
-QDB_QUERY_WHERE_CLAUSE = """
+QDB_QUERY_LIBRARY_FILTERS = """
 -- Hard-coded filters first
 WHERE glb.location_code = '4'
 AND (glb.dept_code_account LIKE '54%%' OR glb.dept_code_account = '0461')
 AND fun.fund_closed_flag <> 'Y'
--- Variable filters provided by caller
+"""
+
+QDB_QUERY_WHERE_CLAUSE = (
+    QDB_QUERY_LIBRARY_FILTERS + """-- Variable filters provided by caller
 AND glb.ledger_year_month = %s
 AND glb.account_number = %s
 -- No nulls in glb, but '' is a legal value and must be requested
 -- Caller must replace CC_PLACEHOLDERS
 AND glb.cost_center_code IN (CC_PLACEHOLDERS)
 """
+)
+
+QDB_QUERY_BATCH_JOIN_CLAUSE = """
+-- Account / cost center pairs requested by caller
+-- Caller must replace the pair placeholders below
+INNER JOIN (VALUES PAIR_PLACEHOLDERS) AS req (account_number, cost_center_code)
+    ON glb.account_number = req.account_number
+    AND glb.cost_center_code = req.cost_center_code
+"""
+
+QDB_QUERY_BATCH_WHERE_CLAUSE = (
+    QDB_QUERY_LIBRARY_FILTERS + """-- Variable filters provided by caller
+AND glb.ledger_year_month = %s
+"""
+)
+
+QDB_QUERY_MONTHS_WHERE_CLAUSE = (
+    QDB_QUERY_LIBRARY_FILTERS + """-- Variable filters provided by caller
+-- Caller must replace the month placeholders below
+AND glb.ledger_year_month IN (MONTH_PLACEHOLDERS)
+-- For fiscal year end (June), also limit to "preliminary" closeout
+AND (RIGHT(glb.ledger_year_month, 2) <> '06' OR glb.fye_proc_ind = 'P')
+"""
+)
 
 QDB_QUERY_FYE_FILTER = """
 -- For fiscal year end, also limit to "preliminary" closeout
@@ -57,6 +88,24 @@ ORDER BY fau, glb.sub_code
 ;
 """
 
+# Multi-month queries also return, group and order by the month.
+QDB_QUERY_MONTHS_SELECT_CLAUSE = QDB_QUERY_SELECT_CLAUSE.replace(
+    "SELECT\n", "SELECT\n    glb.ledger_year_month\n,", 1
+)
+
+QDB_QUERY_MONTHS_GROUP_ORDER_CLAUSE = """
+GROUP BY
+    glb.ledger_year_month
+,	glb.account_number
+,	glb.cost_center_code
+,	glb.fund_number
+,	glb.sub_code
+,	acc.account_title
+,	fun.fund_title
+ORDER BY glb.ledger_year_month, fau, glb.sub_code
+;
+"""
+
 
 def get_qdb_query(is_fye: bool = False) -> str:
     """Get the QDB query string, with or without fiscal year end (fye) filter.
@@ -70,6 +119,64 @@ def get_qdb_query(is_fye: bool = False) -> str:
     return query + QDB_QUERY_GROUP_ORDER_CLAUSE
 
 
+def get_qdb_batch_query(pair_count: int, is_fye: bool = False) -> str:
+    """Get the QDB query string for several account / cost center pairs at once.
+
+    :param pair_count: The number of (account, cost center) pairs requested
+    :param is_fye: Whether to include the fiscal year end (fye) filter
+    :return: The complete QDB query string, with %s placeholders for
+    each account and cost center, followed by the year and month
+    """
+    pair_placeholders = ", ".join(["(%s, %s)"] * pair_count)
+    query = (
+        QDB_QUERY_SELECT_CLAUSE
+        + QDB_QUERY_BATCH_JOIN_CLAUSE.replace("PAIR_PLACEHOLDERS", pair_placeholders)
+        + QDB_QUERY_BATCH_WHERE_CLAUSE
+    )
+    if is_fye:
+        query += QDB_QUERY_FYE_FILTER
+    return query + QDB_QUERY_GROUP_ORDER_CLAUSE
+
+
+def get_qdb_months_query(pair_count: int, month_count: int) -> str:
+    """Get the QDB query string for several account / cost center pairs,
+    over several months at once. June rows are limited to fiscal year end
+    closeout, as in the single-month queries.
+
+    :param pair_count: The number of (account, cost center) pairs requested
+    :param month_count: The number of months requested
+    :return: The complete QDB query string, with %s placeholders for
+    each account and cost center, followed by each month
+    """
+    pair_placeholders = ", ".join(["(%s, %s)"] * pair_count)
+    month_placeholders = ", ".join(["%s"] * month_count)
+    return (
+        QDB_QUERY_MONTHS_SELECT_CLAUSE
+        + QDB_QUERY_BATCH_JOIN_CLAUSE.replace("PAIR_PLACEHOLDERS", pair_placeholders)
+        + QDB_QUERY_MONTHS_WHERE_CLAUSE.replace(
+            "MONTH_PLACEHOLDERS", month_placeholders
+        )
+        + QDB_QUERY_MONTHS_GROUP_ORDER_CLAUSE
+    )
+
+
+def get_qdb_snapshot_query(month_count: int) -> str:
+    """Get the QDB query string for all library accounts over one or
+    more months, as used for snapshots.
+
+    :param month_count: The number of months requested
+    :return: The complete QDB query string, with %s placeholders for each month
+    """
+    month_placeholders = ", ".join(["%s"] * month_count)
+    return (
+        QDB_QUERY_MONTHS_SELECT_CLAUSE
+        + QDB_QUERY_MONTHS_WHERE_CLAUSE.replace(
+            "MONTH_PLACEHOLDERS", month_placeholders
+        )
+        + QDB_QUERY_MONTHS_GROUP_ORDER_CLAUSE
+    )
+
+
 def get_qdb_data(yyyymm: str, account_number: str, cc_codes: list[str]) -> list:
     """Get the QDB data for a given account and cost center codes.
 
@@ -81,22 +188,134 @@ def get_qdb_data(yyyymm: str, account_number: str, cc_codes: list[str]) -> list:
     # determine if this is a Fiscal Year End (June) report
     is_fye = yyyymm.endswith("06")
 
-    conn = pytds.connect(DB_SERVER, DB_DATABASE, DB_USER, DB_PASSWORD)
-    # Connection and cursor are closed automatically via 'with'
-    with conn:
-        conn.as_dict = True
-        cursor = conn.cursor()
-        # Build the variable-length placeholders for cc_codes
-        # Then update QDB_QUERY to use this value.
-        # cc_placeholders = ', '.join(['%s'] * len(cc_codes))
-
-        # Convert list to single-quoted string suitable for SQL
-        cc_values = str(cc_codes)[1:-1]
-
-        # In-place replace does not work... have to use a local variable
-        qdb_query = get_qdb_query(is_fye)
-        qdb_final_query = qdb_query.replace("CC_PLACEHOLDERS", cc_values)
-        # Run query with the other, real, parameters
-        cursor.execute(qdb_final_query % (yyyymm, account_number))
-        rows = cursor.fetchall()
-        return rows
+    # Build the variable-length placeholders for cc_codes
+    # Then update QDB_QUERY to use this value.
+    # cc_placeholders = ', '.join(['%s'] * len(cc_codes))
+
+    # Convert list to single-quoted string suitable for SQL
+    cc_values = str(cc_codes)[1:-1]
+
+    # In-place replace does not work... have to use a local variable
+    qdb_query = get_qdb_query(is_fye)
+    qdb_final_query = qdb_query.replace("CC_PLACEHOLDERS", cc_values)
+    # Run query with the other, real, parameters
+    return qdb_pool.fetchall(qdb_final_query % (yyyymm, account_number))
+
+
+def partition_qdb_rows(
+    rows: list, accounts: list[tuple[str, list[str]]]
+) -> dict[tuple[str, tuple[str, ...]], list]:
+    """Split batched QDB rows into the rows for each requested account.
+
+    :param rows: QDB rows for many accounts, in QDB query order
+    :param accounts: (account, list of cost centers) tuples, as from
+    Orchestrator.get_accounts_for_unit()
+    :return: A dictionary of rows, keyed by (account, tuple of cost centers),
+    with rows in the same order get_qdb_data() would return them
+    """
+    partitions = {(account, tuple(cc_list)): [] for account, cc_list in accounts}
+    # The same account / cost center can be requested as part of several accounts.
+    keys_by_pair = {}
+    for key in partitions:
+        account, cc_list = key
+        for cc in cc_list:
+            keys_by_pair.setdefault((account, cc), []).append(key)
+    for row in rows:
+        pair = (row["account_number"], row["cost_center_code"])
+        for key in keys_by_pair.get(pair, []):
+            partitions[key].append(row)
+    return partitions
+
+
+def get_pair_batches(
+    accounts: list[tuple[str, list[str]]],
+) -> list[list[tuple[str, str]]]:
+    """Split the account / cost center pairs of many accounts into batches
+    of at most BATCH_SIZE pairs, for batched queries.
+
+    Each pair is requested once, even if several accounts include it.
+    All pairs for an account number are kept in the same batch, so each account's
+    rows come back in QDB's own ORDER BY, exactly as from get_qdb_data().
+
+    :param accounts: (account, list of cost centers) tuples
+    :return: A list of batches, each a list of (account, cost center) tuples
+    """
+    pairs = sorted({(account, cc) for account, cc_list in accounts for cc in cc_list})
+    batches = []
+    for _, group in groupby(pairs, lambda pair: pair[0]):
+        group = list(group)
+        if not batches or len(batches[-1]) + len(group) > BATCH_SIZE:
+            batches.append([])
+        batches[-1].extend(group)
+    return batches
+
+
+def get_qdb_data_batch(
+    yyyymm: str, accounts: list[tuple[str, list[str]]]
+) -> dict[tuple[str, tuple[str, ...]], list]:
+    """Get the QDB data for many accounts and cost center codes, using
+    one query per BATCH_SIZE account / cost center pairs.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :param accounts: (account, list of cost centers) tuples
+    :return: A dictionary of rows, keyed by (account, tuple of cost centers)
+    """
+    # determine if this is a Fiscal Year End (June) report
+    is_fye = yyyymm.endswith("06")
+
+    partitions = {(account, tuple(cc_list)): [] for account, cc_list in accounts}
+    for batch in get_pair_batches(accounts):
+        params = [value for pair in batch for value in pair] + [yyyymm]
+        rows = qdb_pool.fetchall(get_qdb_batch_query(len(batch), is_fye), params)
+        for key, account_rows in partition_qdb_rows(rows, accounts).items():
+            partitions[key].extend(account_rows)
+    return partitions
+
+
+def get_qdb_data_months(
+    months: list[str], accounts: list[tuple[str, list[str]]]
+) -> Snapshot:
+    """Get the QDB data for many accounts over several months, using one
+    query per BATCH_SIZE account / cost center pairs for all the months.
+
+    :param months: The years and months in YYYYMM format
+    :param accounts: (account, list of cost centers) tuples
+    :return: A snapshot of the rows for all months
+    """
+    rows = []
+    for batch in get_pair_batches(accounts):
+        params = [value for pair in batch for value in pair] + months
+        rows.extend(
+            qdb_pool.fetchall(get_qdb_months_query(len(batch), len(months)), params)
+        )
+    return Snapshot.from_rows(rows)
+
+
+def get_qdb_snapshot(months: list[str]) -> Snapshot:
+    """Get the QDB data for all library accounts over one or more months,
+    with the same library filters as the report queries.
+
+    :param months: The years and months in YYYYMM format
+    :return: A snapshot of the rows for all months
+    """
+    return Snapshot.from_rows(
+        qdb_pool.fetchall(get_qdb_snapshot_query(len(months)), months)
+    )
+
+
+def get_qdb_data_snapshot(
+    snapshot: Snapshot, yyyymm: str, accounts: list[tuple[str, list[str]]]
+) -> dict[tuple[str, tuple[str, ...]], list]:
+    """Get the QDB data for many accounts and cost center codes from a
+    snapshot, instead of from QDB.
+
+    :param snapshot: A snapshot including the month
+    :param yyyymm: The year and month in YYYYMM format
+    :param accounts: (account, list of cost centers) tuples
+    :return: A dictionary of rows, keyed by (account, tuple of cost centers),
+    as from get_qdb_data_batch()
+    :raises ValueError: If the snapshot doesn't include the month
+    """
+    if yyyymm not in snapshot.months:
+        raise ValueError(f"ERROR: snapshot has no data for {yyyymm}")
+    return partition_qdb_rows(snapshot.get_rows(yyyymm), accounts)
@@ -1,7 +1,14 @@
 import arrow
+from copy import copy
+from functools import lru_cache
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Border, Side, Font, Alignment, PatternFill
 from openpyxl import Workbook
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
 from openpyxl.worksheet.worksheet import Worksheet
+from .parser import Fund, get_fau_amounts
 from .settings import SUBCODES
 
 COLUMNS = "ABCDEFGHIJ"
@@ -26,6 +33,172 @@ BLUE_HIGHLIGHT = PatternFill(fgColor="0099CCFF", fill_type="solid")
 CENTER = Alignment(horizontal="center")
 RIGHT = Alignment(horizontal="right")
 
+WHITE_SIDE = Side(color=WHITE, border_style="medium")
+WHITE_BORDER = Border(
+    top=WHITE_SIDE, bottom=WHITE_SIDE, left=WHITE_SIDE, right=WHITE_SIDE
+)
+# The border of a cell which has none set
+DEFAULT_BORDER = Border()
+
+
+@lru_cache(maxsize=None)
+def parse_coordinate(coordinate: str) -> tuple[int, int]:
+    """Convert a coordinate like "B7" to (row, column); the same few thousand
+    coordinates are used in every report.
+    """
+    return coordinate_to_tuple(coordinate)
+
+
+class ReportCell:
+    """The value and styles of one cell of a ReportSheet."""
+
+    __slots__ = ("value", "font", "border", "fill", "alignment", "number_format")
+
+    def __init__(self):
+        self.value = None
+        self.font = None
+        self.border = None
+        self.fill = None
+        self.alignment = None
+        self.number_format = None
+
+
+class ReportSheet:
+    """Stand-in for an openpyxl Worksheet, used to build reports with
+    openpyxl's write-only mode, which is much faster for large reports.
+
+    Cells are recorded by the functions in this module just as on a normal
+    worksheet, then all written at once, in order, by write(). Only the parts of
+    the Worksheet API used in this module are supported. Each style combination
+    is registered with the workbook once, instead of once per cell.
+    """
+
+    def __init__(self, ws: WriteOnlyWorksheet):
+        """Initialize the ReportSheet.
+
+        :param ws: The write-only worksheet to write to
+        """
+        self.ws = ws
+        self.cells: dict[tuple[int, int], ReportCell] = {}
+        # Written when the first row is written, so can be set directly.
+        self.column_dimensions = ws.column_dimensions
+        self.row_dimensions = ws.row_dimensions
+        self.sheet_properties = ws.sheet_properties
+        self.page_setup = ws.page_setup
+        # Style objects are shared (see WHITE_BORDER, get_underline_border()),
+        # so cache by object id; keep the objects so their ids stay unique.
+        self._styles = {}
+        self._borders = {}
+
+    def _cell(self, row: int, column: int) -> ReportCell:
+        cell = self.cells.get((row, column))
+        if cell is None:
+            cell = self.cells[(row, column)] = ReportCell()
+        return cell
+
+    def __getitem__(self, coordinate: str) -> ReportCell:
+        return self._cell(*parse_coordinate(coordinate))
+
+    def __setitem__(self, coordinate: str, value):
+        self[coordinate].value = value
+
+    def _add_border(self, cell: ReportCell, border: Border):
+        """Add a border to a cell's border, as openpyxl's "cell.border += border"."""
+        current = cell.border or DEFAULT_BORDER
+        key = (id(current), id(border))
+        if key not in self._borders:
+            self._borders[key] = (current, border, current + border)
+        cell.border = self._borders[key][2]
+
+    def merge_cells(self, range_string: str):
+        """Merge cells, updating cells in the range just as Worksheet.merge_cells()
+        does: the top left cell gets the bottom right cell's right and bottom
+        borders; other cells are cleared; then cells on each edge of the range get
+        that edge's border from the top left cell.
+
+        :param range_string: The range to merge, like "A1:F1"
+        """
+        cr = CellRange(range_string)
+        self.ws.merged_cells.add(cr)
+        start = self._cell(cr.min_row, cr.min_col)
+        end = self.cells.get((cr.max_row, cr.max_col))
+        if end is not None:
+            end_border = end.border or DEFAULT_BORDER
+            self._add_border(
+                start, Border(right=end_border.right, bottom=end_border.bottom)
+            )
+        for row, column in cr.cells:
+            if (row, column) != (cr.min_row, cr.min_col):
+                self.cells[(row, column)] = ReportCell()
+        start_border = start.border or DEFAULT_BORDER
+        for name in ["top", "left", "right", "bottom"]:
+            side = getattr(start_border, name)
+            if side and side.style is None:
+                continue
+            border = Border(**{name: side})
+            for row, column in getattr(cr, name):
+                self._add_border(self._cell(row, column), border)
+
+    def _style(self, cell: ReportCell):
+        """Get the openpyxl style array for a cell's combination of styles."""
+        styles = (
+            cell.font,
+            cell.border,
+            cell.fill,
+            cell.alignment,
+            cell.number_format,
+        )
+        key = tuple(id(style) for style in styles)
+        if key not in self._styles:
+            styled = WriteOnlyCell(self.ws)
+            for name, style in zip(ReportCell.__slots__[1:], styles):
+                if style is not None:
+                    setattr(styled, name, style)
+            self._styles[key] = (styles, styled._style)
+        return self._styles[key][1]
+
+    def write(self):
+        """Write all rows to the write-only worksheet."""
+        last_row = max(
+            [row for row, _ in self.cells] + list(self.row_dimensions.keys()),
+            default=0,
+        )
+        rows = {}
+        for (row, column), cell in self.cells.items():
+            rows.setdefault(row, {})[column] = cell
+        for row in range(1, last_row + 1):
+            row_cells = rows.get(row, {})
+            values = [None] * max(row_cells.keys(), default=0)
+            for column, cell in row_cells.items():
+                written = WriteOnlyCell(self.ws, cell.value)
+                written._style = copy(self._style(cell))
+                values[column - 1] = written
+            self.ws.append(values)
+
+
+def create_sheet(wb: Workbook, title: str, index: int) -> Worksheet | ReportSheet:
+    """Create a worksheet, or a ReportSheet if the workbook is write-only.
+
+    :param wb: The workbook to add the worksheet to
+    :param title: The title of the worksheet
+    :param index: The position of the worksheet
+    :return: The new worksheet
+    """
+    ws = wb.create_sheet(title, index)
+    if wb.write_only:
+        return ReportSheet(ws)
+    return ws
+
+
+def finish_sheet(ws: Worksheet | ReportSheet):
+    """Finish a worksheet after it has been built.
+
+    :param ws: The worksheet to finish
+    """
+    Worksheet.set_printer_settings(ws, paper_size=1, orientation="landscape")
+    if isinstance(ws, ReportSheet):
+        ws.write()
+
 
 def adjust_column_widths(ws: Worksheet):
     """Adjust the column widths for the worksheet.
@@ -55,12 +228,24 @@ def clear_borders(ws: Worksheet, lastrow: int):
     :param ws: The worksheet to clear
     :param lastrow: The last row to clear
     """
-    s = Side(color=WHITE, border_style="medium")
     for c, r in [(col, row) for row in range(1, lastrow) for col in COLUMNS]:
-        ws[f"{c}{r}"].border = Border(top=s, bottom=s, left=s, right=s)
+        ws[f"{c}{r}"].border = WHITE_BORDER
         ws[f"{c}{r}"].font = DEFAULT_FONT
 
 
+@lru_cache
+def get_underline_border(color: str, style: str) -> Border:
+    """Get the border for underlined cells; the same object for the same color
+    and style.
+
+    :param color: The color of the underline
+    :param style: The style of the underline
+    :return: The border
+    """
+    u = Side(color=color, border_style=style)
+    return Border(top=WHITE_SIDE, left=WHITE_SIDE, right=WHITE_SIDE, bottom=u)
+
+
 def underline_row(
     ws: Worksheet, row: int, color: str, style: str = "thick", columns: str = COLUMNS
 ):
@@ -72,10 +257,9 @@ def underline_row(
     :param style: The style of the underline
     :param columns: The columns to underline
     """
-    w = Side(color=WHITE, border_style="medium")
-    u = Side(color=color, border_style=style)
+    border = get_underline_border(color, style)
     for c in columns:
-        ws[f"{c}{row}"].border = Border(top=w, left=w, right=w, bottom=u)
+        ws[f"{c}{row}"].border = border
 
 
 def get_total_rows(account: dict, is_lib_materials: bool) -> int:
@@ -86,10 +270,8 @@ def get_total_rows(account: dict, is_lib_materials: bool) -> int:
     :return: The total number of rows
     """
     total = 7  # start with main report header
-    total += (
-        len(account["faus"].keys()) * 3
-    )  # add lines for FAU header, spacer, and totals
-    total += sum([len(fau["subs"].keys()) for fau in account["faus"].values()])
+    total += len(account["funds"]) * 3  # add lines for FAU header, spacer, and totals
+    total += sum([len(fund.sub_codes) for fund in account["funds"]])
     if not is_lib_materials:
         total += 15  # add subcode legend
     return total
@@ -187,48 +369,35 @@ def build_table_header(ws: Worksheet, row: int):
     return row + 1
 
 
-def build_table(ws: Worksheet, fau: str, data: dict, row: int):
+def build_table(ws: Worksheet, fund: Fund, row: int):
     """Build the table for the worksheet.
 
     :param ws: The worksheet to build the table for
-    :param fau: The FAU to build the table for
-    :param data: The data to build the table for
+    :param fund: The FAU to build the table for
     :param row: The row to build the table for
     """
     # FAU data
     ws.merge_cells(f"A{row}:J{row}")
-    ws[f"A{row}"] = f"{fau} {data['fund_title']}"
+    ws[f"A{row}"] = f"{fund.fau} {fund.fund_title}"
     ws[f"A{row}"].font = H2
     row += 1
-    # iterate through subs
-    for sub, subdata in data["subs"].items():
+    # iterate through subs; amounts are in cents
+    for sub, amounts, percent in zip(
+        fund.sub_codes, (fund.amounts / 100).tolist(), fund.percents.tolist()
+    ):
         ws[f"C{row}"] = sub
-        ws[f"D{row}"] = subdata["name"]
-        ws[f"E{row}"] = subdata["Appropriation"]
-        ws[f"E{row}"].number_format = NUMBER_FORMAT
-        ws[f"F{row}"] = subdata["Expense"]
-        ws[f"F{row}"].number_format = NUMBER_FORMAT
-        ws[f"G{row}"] = subdata["Encumbrance"]
-        ws[f"G{row}"].number_format = NUMBER_FORMAT
-        ws[f"H{row}"] = subdata["Memo Lien"]
-        ws[f"H{row}"].number_format = NUMBER_FORMAT
-        ws[f"I{row}"] = subdata["Amount"]
-        ws[f"I{row}"].number_format = NUMBER_FORMAT
-        ws[f"J{row}"] = subdata["Percent"]
+        ws[f"D{row}"] = SUBCODES[sub]["title"]
+        for column, amount in zip("EFGHI", amounts):
+            ws[f"{column}{row}"] = amount
+            ws[f"{column}{row}"].number_format = NUMBER_FORMAT
+        ws[f"J{row}"] = percent
         ws[f"J{row}"].number_format = PERCENT_FORMAT
         row += 1
     underline_row(ws, row - 1, RED, style="medium", columns="EFGHIJ")
     # totals
-    ws[f"E{row}"] = data["totals"]["Appropriation"]
-    ws[f"E{row}"].number_format = NUMBER_FORMAT
-    ws[f"F{row}"] = data["totals"]["Expense"]
-    ws[f"F{row}"].number_format = NUMBER_FORMAT
-    ws[f"G{row}"] = data["totals"]["Encumbrance"]
-    ws[f"G{row}"].number_format = NUMBER_FORMAT
-    ws[f"H{row}"] = data["totals"]["Memo Lien"]
-    ws[f"H{row}"].number_format = NUMBER_FORMAT
-    ws[f"I{row}"] = data["totals"]["Amount"]
-    ws[f"I{row}"].number_format = NUMBER_FORMAT
+    for column, amount in zip("EFGHI", (fund.totals / 100).tolist()):
+        ws[f"{column}{row}"] = amount
+        ws[f"{column}{row}"].number_format = NUMBER_FORMAT
     return row + 2
 
 
@@ -286,8 +455,7 @@ def add_sub02_tab(wb: Workbook, data: dict, tab_index: int):
     """
     # create sub02 tab
     sheetname = "Sub02 Report"
-    ws = wb.create_sheet(sheetname, tab_index)
-    ws.title = sheetname
+    ws = create_sheet(wb, sheetname, tab_index)
     # add headers
     last_row = 7 + (4 * len(data["sub02s"]))
     clear_borders(ws, last_row)
@@ -296,57 +464,130 @@ def add_sub02_tab(wb: Workbook, data: dict, tab_index: int):
     # add lines for each account
     for fund in data["sub02s"]:
         ws.merge_cells(f"A{row}:J{row}")
-        ws[f"A{row}"] = f"{fund['fau']} {fund['fund_title']}"
+        ws[f"A{row}"] = f"{fund.fau} {fund.fund_title}"
         ws[f"A{row}"].font = H2
         row += 1
-        # sub02 data
+        # sub02 data; amounts are in cents
+        index = fund.sub_codes.index("02")
+        approp, expense, _, _, amount = (fund.amounts[index] / 100).tolist()
         ws[f"C{row}"] = "02"
-        ws[f"D{row}"] = fund["row_dict"]["name"]
-        ws[f"E{row}"] = fund["row_dict"]["Appropriation"]
+        ws[f"D{row}"] = SUBCODES["02"]["title"]
+        ws[f"E{row}"] = approp
         ws[f"E{row}"].number_format = NUMBER_FORMAT
-        ws[f"F{row}"] = fund["row_dict"]["Expense"]
+        ws[f"F{row}"] = expense
         ws[f"F{row}"].number_format = NUMBER_FORMAT
-        ws[f"I{row}"] = fund["row_dict"]["Amount"]
+        ws[f"I{row}"] = amount
         ws[f"I{row}"].number_format = NUMBER_FORMAT
-        ws[f"J{row}"] = fund["row_dict"]["Percent"]
+        ws[f"J{row}"] = fund.percents[index].item()
         ws[f"J{row}"].number_format = PERCENT_FORMAT
         row += 3
     # cleanup formatting
     adjust_column_widths(ws)
     adjust_row_heights(ws, row)
-    Worksheet.set_printer_settings(ws, paper_size=1, orientation="landscape")
+    finish_sheet(ws)
     return row
 
 
-def generate_report(data: dict, filename: str):
+def generate_report(data: dict, filename: str, write_only: bool = False):
     """Generate the report for the workbook.
 
     :param data: The data to generate the report for
     :param filename: The filename to generate the report for
+    :param write_only: Whether to use openpyxl's faster write-only mode;
+    the report looks the same either way
     """
     # setup
-    wb = Workbook()
+    wb = Workbook(write_only=write_only)
     for tab_index, account in enumerate(data["accounts"]):
         is_lib_materials = "LM" in account["cc_list"]
         sheetname = generate_sheet_name(account, is_lib_materials)
-        ws = wb.create_sheet(sheetname, tab_index)
-        ws.title = sheetname
+        ws = create_sheet(wb, sheetname, tab_index)
         last_row = get_total_rows(account, is_lib_materials)
         clear_borders(ws, last_row)
         build_report_header(ws, data["month"], data["month_name"], unit=data["unit"])
         # add tabluar data
         row = build_table_header(ws, row=5)
-        for fau, fau_data in account["faus"].items():
-            row = build_table(ws, fau, fau_data, row)
+        for fund in account["funds"]:
+            row = build_table(ws, fund, row)
         if not is_lib_materials:
             row = build_subcode_legend(ws, row)
         # cleanup and save
         adjust_column_widths(ws)
         adjust_row_heights(ws, row)
-        Worksheet.set_printer_settings(ws, paper_size=1, orientation="landscape")
+        finish_sheet(ws)
     if len(data["sub02s"]) > 0:
         # The sub02 data needs to go in a sheet (tab) after the accounts data.
         row = add_sub02_tab(wb, data, tab_index=len(data["accounts"]))
-    del wb["Sheet"]
+    if not write_only:
+        del wb["Sheet"]
+    wb.save(filename)
+    return filename
+
+
+def generate_comparison_report(
+    months: list[dict], changes: list[dict], filename: str
+) -> str:
+    """Generate a report of a unit's operating balances over several months,
+    with the change from each month to the next.
+
+    :param months: The data of a Parser for each month, oldest first
+    :param changes: From Parser.get_changes() for each month after the first,
+    compared with the month before
+    :param filename: The filename to save the report as
+    :return: The filename
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Comparison"
+    first, last = months[0], months[-1]
+    ws["A1"] = f"Report for: {last['unit']}"
+    ws["A1"].font = H1_RED
+    ws["A2"] = (
+        f"Operating Balance by month: {first['month_name']} {first['year']}"
+        f" to {last['month_name']} {last['year']}"
+    )
+    ws["A2"].font = H2_RED
+
+    headers = ["FAU", "Fund title", "Sub"]
+    for index, data in enumerate(months):
+        headers.append(f"{data['month_name'][:3]} {data['year']}")
+        if index > 0:
+            headers.append("Change")
+    for column, header in enumerate(headers, 1):
+        cell = ws.cell(4, column, header)
+        cell.font = H2
+        cell.alignment = CENTER
+    for column in range(1, len(headers) + 1):
+        width = [20, 40, 6][column - 1] if column <= 3 else 15
+        ws.column_dimensions[get_column_letter(column)].width = width
+
+    amounts = [get_fau_amounts(data) for data in months]
+    titles = {
+        fund.fau: fund.fund_title
+        for data in months
+        for account in data["accounts"]
+        for fund in account["funds"]
+    }
+    row = 5
+    for fau, title in titles.items():
+        subs = sorted({sub for month in amounts for sub in month.get(fau, {})})
+        subs.remove("totals")
+        for sub in subs + ["totals"]:
+            values = [fau, title, "Total" if sub == "totals" else sub]
+            for index, month in enumerate(amounts):
+                values.append(month.get(fau, {}).get(sub, {}).get("Amount"))
+                if index > 0:
+                    # Blank if in neither month; changes only cover FAUs and
+                    # subcodes in one or both of the months compared.
+                    change = changes[index - 1].get(fau, {}).get(sub, {})
+                    values.append(change.get("Amount"))
+            for column, value in enumerate(values, 1):
+                cell = ws.cell(row, column, value)
+                if column > 3:
+                    cell.number_format = NUMBER_FORMAT
+                if sub == "totals":
+                    cell.font = H3
+            row += 1
+    Worksheet.set_printer_settings(ws, paper_size=1, orientation="landscape")
     wb.save(filename)
     return filename
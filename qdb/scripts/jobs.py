@@ -0,0 +1,116 @@
+import logging
+from datetime import timedelta
+from django.utils import timezone
+from qdb.models import ReportJob, Unit
+from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.settings import DEFAULT_RECIPIENTS, REPORT_JOB_TIMEOUT, REPORTS_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(
+    unit: Unit,
+    year: int,
+    month: int,
+    send_email: bool = False,
+    override_recipients: list[str] | None = None,
+) -> ReportJob:
+    """Queue a report run for the worker.
+
+    :param unit: The unit to run the report for; may be the "All units" unit
+    :param year: Year of the report
+    :param month: Month number of the report
+    :param send_email: Whether to send the reports by email
+    :param override_recipients: Addresses to send every report to, instead of
+    each unit's recipients
+    :return: The new job
+    """
+    return ReportJob.objects.create(
+        unit=unit,
+        year=year,
+        month=month,
+        send_email=send_email,
+        override_recipients=override_recipients,
+    )
+
+
+def claim_next_job() -> ReportJob | None:
+    """Take the oldest queued job, marking it as running.
+
+    The job is claimed with a conditional update, so if more than one worker
+    is running, each job still runs only once.
+
+    :return: The job, or None if no jobs are queued
+    """
+    while True:
+        job = ReportJob.objects.filter(status=ReportJob.QUEUED).order_by("id").first()
+        if job is None:
+            return None
+        claimed = ReportJob.objects.filter(id=job.id, status=ReportJob.QUEUED).update(
+            status=ReportJob.RUNNING, started=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def fail_stale_jobs() -> int:
+    """Mark jobs which have been running too long as failed, so they don't
+    show as running forever if the worker stopped part way through.
+
+    :return: The number of jobs marked as failed
+    """
+    cutoff = timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT)
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started__lt=cutoff
+    ).update(
+        status=ReportJob.FAILED,
+        error="Report job did not finish in time",
+        finished=timezone.now(),
+    )
+
+
+def run_job(job: ReportJob, workers: int = 1) -> None:
+    """Run a claimed job, recording progress after each unit and the outcome
+    at the end. Errors are recorded on the job, not raised.
+
+    :param job: The job to run
+    :param workers: The number of units to run at the same time
+    """
+    orchestrator = Orchestrator(REPORTS_DIR, DEFAULT_RECIPIENTS)
+
+    def on_unit_done(unit: Unit, outcome: str):
+        job.progress[unit.name] = outcome
+        job.save(update_fields=["progress"])
+
+    try:
+        yyyymm = orchestrator.validate_date(job.year, job.month, yyyymm=True)
+        units = orchestrator.get_units(job.unit_id)
+        job.total_units = len(units)
+        job.save(update_fields=["total_units"])
+        orchestrator.run(
+            yyyymm,
+            units,
+            send_email=job.send_email,
+            override_recipients=job.override_recipients,
+            workers=workers,
+            on_unit_done=on_unit_done,
+        )
+    except Exception as e:
+        # Show the entire error stack for diagnosis.
+        logger.exception(e)
+        status = ReportJob.FAILED
+        error = str(e)
+    else:
+        status = ReportJob.SUCCEEDED
+        error = job.error
+    # Only if still running, so a job fail_stale_jobs() has given up on
+    # stays failed, as it was shown.
+    finished = ReportJob.objects.filter(id=job.id, status=ReportJob.RUNNING).update(
+        status=status, error=error, finished=timezone.now()
+    )
+    if not finished:
+        logger.warning(
+            f"Report job {job.id} finished as {status}, but was no longer running"
+        )
+    job.refresh_from_db()
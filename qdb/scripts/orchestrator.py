@@ -1,11 +1,23 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from itertools import groupby
 from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+from time import perf_counter
+from typing import Callable
 import arrow
 import logging
 import os
-from qdb.models import Account, Recipient, Unit
-from qdb.scripts import fetcher, formatter, sender
+import queue
+import threading
+from qdb.models import Account, Recipient, ReportRun, Unit
+from qdb.scripts import cache, checkpoints, fetcher, formatter, outbox, sender
 from qdb.scripts.parser import Parser
+from qdb.scripts.pool import qdb_pool
+from qdb.scripts.settings import PIPELINE_QUEUE_SIZE
+from qdb.scripts.snapshot import Snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -185,6 +197,91 @@ class Orchestrator:
         name = f"{unit_name.replace(' ', '_')}_{yyyymm[:4]}_{yyyymm[4:]}.xlsx"
         return os.path.join(self.reports_dir, name)
 
+    def run_unit(
+        self,
+        yyyymm: str,
+        unit: Unit,
+        recipients: list[str] | set[str],
+        accounts: list[tuple[str, list[str]]],
+        unit_log: "UnitLog",
+        rows_by_account: dict | None = None,
+        build_report: Callable[[dict, str], None] = formatter.generate_report,
+        reports: dict | None = None,
+    ) -> str:
+        """Fetch, parse and build the report for one unit. Reports are sent
+        afterwards, by send_unit_report().
+
+        Does not use the Django ORM, so it can run in any thread.
+
+        :param yyyymm: The year and month in YYYYMM format
+        :param unit: The unit to run the report for
+        :param recipients: The recipients to send the report to
+        :param accounts: The unit's accounts, from get_accounts_for_unit()
+        :param unit_log: Where to log messages for this unit
+        :param rows_by_account: QDB rows already fetched, keyed by
+        (account, tuple of cost centers); rows fetched here are added to it
+        :param build_report: The function which saves the report as a workbook
+        :param reports: The report data is added to this, by unit ID
+        :return: "generated" or "empty"
+        """
+        parser = Parser(yyyymm, unit.name)
+        for account, cc_list in accounts:
+            unit_log.info(
+                f"Running {yyyymm} report of {account}{cc_list} for unit {unit.name}"
+            )
+            key = (account, tuple(cc_list))
+            if rows_by_account is not None and key in rows_by_account:
+                rows = rows_by_account[key]
+            else:
+                rows = fetcher.get_qdb_data(yyyymm, account, cc_list)
+                if rows_by_account is not None:
+                    rows_by_account[key] = rows
+            if len(rows) == 0:  # pragma: no cover
+                unit_log.warning(f"No data from QDB for {account}{cc_list}")
+                continue
+            result = parser.add_account(unit.id, account, cc_list, rows)
+            if result is False:  # pragma: no cover
+                unit_log.warning(f"Account {account} is empty. Exclude from report")
+        if len(parser.data["accounts"]) == 0:  # pragma: no cover
+            unit_log.warning(f"All accounts empty. No report generated for {unit}")
+            return "empty"
+        filename = self.generate_filename(unit.name, yyyymm)
+
+        build_report(parser.data, filename)
+        if reports is not None:
+            reports[unit.id] = parser.data
+        unit_log.info(f"Generated report at {filename}")
+        return "generated"
+
+    def send_unit_report(
+        self,
+        yyyymm: str,
+        unit: Unit,
+        recipients: list[str] | set[str],
+        data: dict,
+        mail_session: sender.MailSession | None = None,
+    ) -> str:
+        """Put a unit's report in the outbox, and try to send it right away.
+        If it can't be sent now, it's retried later by the report worker,
+        or by run_qdb_reporter --resume.
+
+        :param yyyymm: The year and month in YYYYMM format
+        :param unit: The unit
+        :param recipients: The recipients to send the report to
+        :param data: The report data, as from Parser.data
+        :param mail_session: The session to send the report with; if None,
+        one is opened just for this report
+        :return: "sent", or "queued" if not sent yet
+        """
+        filename = self.generate_filename(unit.name, yyyymm)
+        message = outbox.enqueue_report(unit, yyyymm, data, filename, recipients)
+        if mail_session is None:
+            with sender.MailSession() as mail_session:
+                sent = outbox.deliver(message, mail_session)
+        else:
+            sent = outbox.deliver(message, mail_session)
+        return "sent" if sent else "queued"
+
     def run(
         self,
         yyyymm: str,
@@ -193,6 +290,14 @@ class Orchestrator:
         override_recipients: list[str] | None = None,
         list_recipients: bool = False,
         dry_run: bool = False,
+        batch_fetch: bool = False,
+        workers: int = 1,
+        refresh: bool = False,
+        write_only: bool = False,
+        on_unit_done: Callable[[Unit, str], None] | None = None,
+        snapshot: Snapshot | None = None,
+        pipeline: bool = False,
+        report_run: ReportRun | None = None,
     ):
         """Run the orchestrator.
 
@@ -202,11 +307,39 @@ class Orchestrator:
         :param override_recipients: The recipients to override the default recipients
         :param list_recipients: Whether to list the recipients
         :param dry_run: Whether to perform a dry run of the report
+        :param batch_fetch: Whether to fetch QDB data for all units up front,
+        in as few queries as possible, instead of once per account
+        :param workers: The number of units to run at the same time
+        :param refresh: Whether to ignore cached QDB data, fetching (and caching)
+        all data again
+        :param write_only: Whether to build workbooks with the formatter's faster
+        write-only backend
+        :param on_unit_done: Called with each unit and its outcome ("sent",
+        "generated", "empty" or "failed") as soon as the unit is finished
+        :param snapshot: A snapshot of library QDB data including the month,
+        to use instead of QDB and the cache
+        :param pipeline: Whether to fetch, parse, build and send in separate
+        stages which overlap, instead of running several units at a time
+        :param report_run: A run to record checkpoints in, as from
+        checkpoints.start_run(). Units it has already finished are skipped,
+        and QDB data it has already fetched is used instead of fetching again.
+        :raises ValueError: If the snapshot doesn't include the month, or the
+        checkpointed run is for other units
+        :raises Exception: The first error from any unit, after all other
+        units have run, when running more than one unit at a time or pipelined
         """
+        if report_run is not None and report_run.unit_ids != sorted(
+            unit.id for unit in units
+        ):
+            raise ValueError(f"ERROR: run {report_run.id} is for other units")
+
         if dry_run:
             print("---RUNNING REPORT ORCHESTRATOR IN DRY RUN MODE---")
             logger.info("---RUNNING REPORT ORCHESTRATOR IN DRY RUN MODE---")
 
+        # Everything which needs the database is done here, up front,
+        # so the units themselves can run in other threads.
+        unit_plans = []
         for unit in units:
             unit_id = unit.id
             unit_name = unit.name
@@ -222,40 +355,550 @@ class Orchestrator:
                     print(f"-- {r}")
                     continue
             print("See logs for other output.")
-            parser = Parser(yyyymm, unit_name)
-            for account, cc_list in self.get_accounts_for_unit(unit_id):
-                if dry_run:
+            accounts = self.get_accounts_for_unit(unit_id)
+            if dry_run:
+                for account, cc_list in accounts:
                     logger.info(
                         f"Dry run: would have run {yyyymm} report "
                         f"of {account}{cc_list} for unit {unit_name}"
                     )
-                    continue
-                logger.info(
-                    f"Running {yyyymm} report of {account}{cc_list} for unit {unit_name}"
-                )
-                rows = fetcher.get_qdb_data(yyyymm, account, cc_list)
-                if len(rows) == 0:  # pragma: no cover
-                    logger.warning(f"No data from QDB for {account}{cc_list}")
-                    continue
-                result = parser.add_account(unit_id, account, cc_list, rows)
-                if result is False:  # pragma: no cover
-                    logger.warning(f"Account {account} is empty. Exclude from report")
-            if len(parser.data["accounts"]) == 0 and not dry_run:  # pragma: no cover
-                logger.warning(f"All accounts empty. No report generated for {unit}")
-                continue
-            filename = self.generate_filename(unit_name, yyyymm)
-            if dry_run:
+                filename = self.generate_filename(unit_name, yyyymm)
                 logger.info(
                     f"Dry run: would have sent report {filename} to {recipients}"
                 )
                 logger.info("---DRY RUN COMPLETE---")
                 return
+            unit_plans.append((unit, recipients, accounts))
+
+        if report_run is not None:
+            finished_ids = checkpoints.get_finished_unit_ids(
+                report_run,
+                {
+                    unit.id: self.generate_filename(unit.name, yyyymm)
+                    for unit, _, _ in unit_plans
+                },
+            )
+            if finished_ids:
+                logger.info(
+                    f"Continuing run {report_run.id}: skipping {len(finished_ids)}"
+                    " units already finished"
+                )
+            unit_plans = [plan for plan in unit_plans if plan[0].id not in finished_ids]
+
+        start = perf_counter()
+        all_accounts = [
+            account for _, _, accounts in unit_plans for account in accounts
+        ]
+        if snapshot is not None:
+            # Snapshots include every library account, so nothing is fetched.
+            logger.info(f"Using snapshot of {len(snapshot)} QDB rows")
+            cached_rows = fetcher.get_qdb_data_snapshot(snapshot, yyyymm, all_accounts)
+        elif refresh:
+            cached_rows = {}
+        else:
+            cached_rows = cache.get_cached_rows(yyyymm, all_accounts)
+        # Shared by all units; units add the rows they fetch.
+        rows_by_account = dict(cached_rows)
+        if report_run is not None:
+            if snapshot is None:
+                # Fetched earlier in the run, but not necessarily cached
+                for key, rows in checkpoints.get_fetched_rows(
+                    report_run, all_accounts
+                ).items():
+                    rows_by_account.setdefault(key, rows)
+            accounts_by_unit = {unit.id: accounts for unit, _, accounts in unit_plans}
+
+            # Checkpoints are saved from this thread, as each unit finishes.
+            def save_checkpoint(unit: Unit, outcome: str, on_unit_done=on_unit_done):
+                checkpoints.save_unit(
+                    report_run,
+                    unit,
+                    outcome,
+                    accounts_by_unit[unit.id],
+                    rows_by_account,
+                )
+                if on_unit_done is not None:
+                    on_unit_done(unit, outcome)
+
+            on_unit_done = save_checkpoint
+        if batch_fetch and snapshot is None:
+            missing_accounts = [
+                (account, cc_list)
+                for account, cc_list in all_accounts
+                if (account, tuple(cc_list)) not in rows_by_account
+            ]
+            if missing_accounts:
+                logger.info(
+                    f"Fetching {yyyymm} data for {len(missing_accounts)} accounts"
+                )
+                rows_by_account.update(
+                    fetcher.get_qdb_data_batch(yyyymm, missing_accounts)
+                )
 
-            formatter.generate_report(parser.data, filename)
-
-            if send_email is True:
-                sender.send_report(parser.data, filename, recipients)
-                os.remove(filename)
-                logger.info(f"Sent report {filename} to {recipients}")
+        outcomes = Counter()
+        failures = []
+        # One SMTP connection for all units' email, opened when first needed.
+        # Reports are sent from this thread, as each unit finishes.
+        with sender.MailSession() as mail_session:
+            if pipeline:
+                failures = self.run_pipeline(
+                    yyyymm,
+                    unit_plans,
+                    send_email,
+                    rows_by_account,
+                    outcomes,
+                    write_only=write_only,
+                    on_unit_done=on_unit_done,
+                    mail_session=mail_session,
+                )
+            elif workers <= 1:
+                reports = {}
+                for unit, recipients, accounts in unit_plans:
+                    unit_log = UnitLog()
+                    try:
+                        outcome = self.run_unit(
+                            yyyymm,
+                            unit,
+                            recipients,
+                            accounts,
+                            unit_log,
+                            rows_by_account=rows_by_account,
+                            build_report=partial(
+                                formatter.generate_report, write_only=write_only
+                            ),
+                            reports=reports,
+                        )
+                        unit_log.flush()
+                        if send_email and outcome == "generated":
+                            outcome = self.send_unit_report(
+                                yyyymm,
+                                unit,
+                                recipients,
+                                reports.pop(unit.id),
+                                mail_session,
+                            )
+                    except Exception:
+                        if on_unit_done is not None:
+                            on_unit_done(unit, "failed")
+                        raise
+                    finally:
+                        unit_log.flush()
+                    outcomes[outcome] += 1
+                    if on_unit_done is not None:
+                        on_unit_done(unit, outcome)
             else:
-                logger.info(f"Generated report at {filename}")
+                failures = self.run_parallel(
+                    yyyymm,
+                    unit_plans,
+                    send_email,
+                    rows_by_account,
+                    workers,
+                    outcomes,
+                    write_only,
+                    on_unit_done,
+                    mail_session,
+                )
+
+        cache.store_rows(
+            yyyymm,
+            {
+                key: rows
+                for key, rows in rows_by_account.items()
+                if key not in cached_rows
+            },
+        )
+        requested = len(
+            {(account, tuple(cc_list)) for account, cc_list in all_accounts}
+        )
+        if requested and not refresh and snapshot is None:
+            logger.info(
+                f"QDB cache: {len(cached_rows)} hits, {requested - len(cached_rows)}"
+                f" misses ({len(cached_rows) / requested:.0%} hit rate)"
+            )
+
+        logger.info(
+            f"Finished {len(unit_plans)} units in {perf_counter() - start:.1f} seconds:"
+            f" {outcomes['sent']} sent, {outcomes['queued']} queued to send,"
+            f" {outcomes['generated']} generated,"
+            f" {outcomes['empty']} empty, {outcomes['failed']} failed"
+        )
+        logger.info(f"QDB connection pool: {qdb_pool.stats}")
+        # Runs are far apart, so don't hold connections open until the next one.
+        qdb_pool.close_all()
+        if failures:
+            raise failures[0]
+        if report_run is not None:
+            checkpoints.finish_run(report_run)
+
+    def get_comparison_months(self, yyyymm: str, month_count: int) -> list[str]:
+        """Get the months of a comparison report ending in the given month.
+
+        :param yyyymm: The last month, in YYYYMM format
+        :param month_count: The number of months
+        :return: The months in YYYYMM format, oldest first
+        """
+        last_month = arrow.get(yyyymm, "YYYYMM")
+        return [
+            last_month.shift(months=offset).format("YYYYMM")
+            for offset in range(1 - month_count, 1)
+        ]
+
+    def run_comparison(
+        self,
+        yyyymm: str,
+        month_count: int,
+        unit: Unit,
+        save_snapshot: str | None = None,
+    ) -> str | None:
+        """Build a report comparing a unit's balances over several months,
+        fetching all the months from QDB together.
+
+        :param yyyymm: The last month of the report, in YYYYMM format
+        :param month_count: The number of months to compare
+        :param unit: The unit to run the report for
+        :param save_snapshot: A file to save the fetched QDB data to, if any
+        :return: The report's filename, or None if the unit had no data
+        """
+        months = self.get_comparison_months(yyyymm, month_count)
+        accounts = self.get_accounts_for_unit(unit.id)
+        start = perf_counter()
+        snapshot = fetcher.get_qdb_data_months(months, accounts)
+        logger.info(
+            f"Fetched {len(snapshot)} rows for {len(accounts)} accounts"
+            f" of {unit.name}, {months[0]} to {months[-1]},"
+            f" in {perf_counter() - start:.1f} seconds"
+        )
+        if save_snapshot:
+            snapshot.save(save_snapshot)
+
+        parsers = []
+        for month in months:
+            parser = Parser(month, unit.name)
+            rows_by_account = fetcher.partition_qdb_rows(
+                snapshot.get_rows(month), accounts
+            )
+            for account, cc_list in accounts:
+                rows = rows_by_account[(account, tuple(cc_list))]
+                if rows:
+                    parser.add_account(unit.id, account, cc_list, rows)
+            parsers.append(parser)
+        if not any(parser.data["accounts"] for parser in parsers):
+            logger.warning(f"All accounts empty. No comparison generated for {unit}")
+            return None
+
+        changes = [
+            parser.get_changes(earlier.data)
+            for earlier, parser in zip(parsers, parsers[1:])
+        ]
+        filename = self.generate_filename(unit.name, yyyymm).replace(
+            ".xlsx", f"_{month_count}_month_comparison.xlsx"
+        )
+        formatter.generate_comparison_report(
+            [parser.data for parser in parsers], changes, filename
+        )
+        logger.info(f"Generated comparison report at {filename}")
+        return filename
+
+    def run_parallel(
+        self,
+        yyyymm: str,
+        unit_plans: list[tuple[Unit, list[str] | set[str], list]],
+        send_email: bool,
+        rows_by_account: dict,
+        workers: int,
+        outcomes: Counter,
+        write_only: bool = False,
+        on_unit_done: Callable[[Unit, str], None] | None = None,
+        mail_session: sender.MailSession | None = None,
+    ) -> list[Exception]:
+        """Run several units at a time. QDB queries run in threads; workbooks
+        are built in separate processes, since openpyxl is CPU-bound. Reports
+        are sent from the calling thread, in unit order, while later units run.
+        Each unit's messages are logged together, in unit order.
+
+        :param yyyymm: The year and month in YYYYMM format
+        :param unit_plans: (unit, recipients, accounts) for each unit
+        :param send_email: Whether to send the reports by email
+        :param rows_by_account: QDB rows already fetched, keyed by
+        (account, tuple of cost centers); rows fetched by units are added to it
+        :param workers: The number of units to run at the same time
+        :param outcomes: Counter updated with the outcome of each unit
+        :param write_only: Whether to build workbooks with the formatter's faster
+        write-only backend
+        :param on_unit_done: Called with each unit and its outcome, in unit order
+        :param mail_session: The session to send reports with, shared by all
+        units; if None, each report opens its own
+        :return: Errors from units which failed; other units still run
+        """
+        # Make sure each thread can get its own QDB connection, during this
+        # run only; the pool is shared by the whole process.
+        max_size = qdb_pool.max_size
+        qdb_pool.max_size = max(max_size, workers)
+        failures = []
+        try:
+            # spawn, not fork: forking a process which is running threads is unsafe.
+            with (
+                ThreadPoolExecutor(max_workers=workers) as threads,
+                ProcessPoolExecutor(
+                    max_workers=workers, mp_context=get_context("spawn")
+                ) as processes,
+            ):
+
+                def build_report(data: dict, filename: str):
+                    processes.submit(
+                        formatter.generate_report, data, filename, write_only
+                    ).result()
+
+                futures = []
+                reports = {}
+                for unit, recipients, accounts in unit_plans:
+                    unit_log = UnitLog()
+                    future = threads.submit(
+                        self.run_unit,
+                        yyyymm,
+                        unit,
+                        recipients,
+                        accounts,
+                        unit_log,
+                        rows_by_account=rows_by_account,
+                        build_report=build_report,
+                        reports=reports,
+                    )
+                    futures.append((unit, recipients, unit_log, future))
+
+                # Reports are sent from this thread, while other units run.
+                for unit, recipients, unit_log, future in futures:
+                    try:
+                        outcome = future.result()
+                        unit_log.flush()
+                        if send_email and outcome == "generated":
+                            outcome = self.send_unit_report(
+                                yyyymm,
+                                unit,
+                                recipients,
+                                reports.pop(unit.id),
+                                mail_session,
+                            )
+                    except Exception as e:
+                        unit_log.flush()
+                        logger.error(f"Report failed for unit {unit.name}", exc_info=e)
+                        outcomes["failed"] += 1
+                        failures.append(e)
+                        if on_unit_done is not None:
+                            on_unit_done(unit, "failed")
+                        continue
+                    unit_log.flush()
+                    outcomes[outcome] += 1
+                    if on_unit_done is not None:
+                        on_unit_done(unit, outcome)
+        finally:
+            qdb_pool.max_size = max_size
+        return failures
+
+    def run_pipeline(
+        self,
+        yyyymm: str,
+        unit_plans: list[tuple[Unit, list[str] | set[str], list]],
+        send_email: bool,
+        rows_by_account: dict,
+        outcomes: Counter,
+        write_only: bool = False,
+        on_unit_done: Callable[[Unit, str], None] | None = None,
+        build_report: Callable[[dict, str], None] | None = None,
+        mail_session: sender.MailSession | None = None,
+    ) -> list[Exception]:
+        """Run units as a pipeline: one thread each fetches accounts, parses
+        them and builds workbooks, passing work on through queues of at most
+        PIPELINE_QUEUE_SIZE items, and the calling thread sends the reports,
+        with at most PIPELINE_QUEUE_SIZE waiting. So the next account is fetched
+        while the last is parsed, and the next unit while the last is sent,
+        and a slow stage holds up the ones before it instead of work piling up.
+        Each unit's messages are logged together, in unit order.
+
+        :param yyyymm: The year and month in YYYYMM format
+        :param unit_plans: (unit, recipients, accounts) for each unit
+        :param send_email: Whether to send the reports by email
+        :param rows_by_account: QDB rows already fetched, keyed by
+        (account, tuple of cost centers); rows fetched here are added to it
+        :param outcomes: Counter updated with the outcome of each unit
+        :param write_only: Whether to build workbooks with the formatter's faster
+        write-only backend
+        :param on_unit_done: Called with each unit and its outcome, in unit order
+        :param build_report: The function which saves the report as a workbook;
+        by default, the formatter, run in a separate process since openpyxl
+        is CPU-bound
+        :param mail_session: The session to send reports with; if None, each
+        report opens its own
+        :return: Errors from units which failed; other units still run
+        """
+        tasks = [PipelineTask(*plan) for plan in unit_plans]
+        parse_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        build_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        unsent = threading.Semaphore(PIPELINE_QUEUE_SIZE)
+
+        def fetch():
+            for task in tasks:
+                for account, cc_list in task.accounts:
+                    task.unit_log.info(
+                        f"Running {yyyymm} report of {account}{cc_list}"
+                        f" for unit {task.unit.name}"
+                    )
+                    key = (account, tuple(cc_list))
+                    try:
+                        if key not in rows_by_account:
+                            rows_by_account[key] = fetcher.get_qdb_data(
+                                yyyymm, account, cc_list
+                            )
+                    except Exception as e:
+                        task.fail(e)
+                        break
+                    parse_queue.put((task, account, cc_list, rows_by_account[key]))
+                parse_queue.put((task, None, None, None))
+            parse_queue.put(None)
+
+        def parse():
+            parsers = {}
+            while (item := parse_queue.get()) is not None:
+                task, account, cc_list, rows = item
+                if task.done.is_set():
+                    # Failed while fetching or parsing an earlier account
+                    parsers.pop(task, None)
+                    continue
+                if task not in parsers:
+                    parsers[task] = Parser(yyyymm, task.unit.name)
+                parser = parsers[task]
+                try:
+                    if account is None:
+                        # All of the unit's accounts are parsed.
+                        del parsers[task]
+                        if len(parser.data["accounts"]) == 0:  # pragma: no cover
+                            task.unit_log.warning(
+                                f"All accounts empty. No report generated for {task.unit}"
+                            )
+                            task.finish("empty")
+                        else:
+                            task.data = parser.data
+                            build_queue.put(task)
+                    elif len(rows) == 0:  # pragma: no cover
+                        task.unit_log.warning(
+                            f"No data from QDB for {account}{cc_list}"
+                        )
+                    elif (
+                        parser.add_account(task.unit.id, account, cc_list, rows)
+                        is False
+                    ):  # pragma: no cover
+                        task.unit_log.warning(
+                            f"Account {account} is empty. Exclude from report"
+                        )
+                except Exception as e:
+                    parsers.pop(task, None)
+                    task.fail(e)
+            build_queue.put(None)
+
+        def build():
+            while (task := build_queue.get()) is not None:
+                task.filename = self.generate_filename(task.unit.name, yyyymm)
+                try:
+                    build_report(task.data, task.filename)
+                except Exception as e:
+                    task.fail(e)
+                    continue
+                if send_email:
+                    # Wait while too many reports are waiting to be sent.
+                    unsent.acquire()
+                task.unit_log.info(f"Generated report at {task.filename}")
+                task.finish("generated")
+
+        failures = []
+        with ExitStack() as stack:
+            if build_report is None:
+                # spawn, not fork: forking a process which is running threads
+                # is unsafe.
+                processes = stack.enter_context(
+                    ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"))
+                )
+
+                def build_report(data: dict, filename: str):
+                    processes.submit(
+                        formatter.generate_report, data, filename, write_only
+                    ).result()
+
+            stages = [threading.Thread(target=stage) for stage in [fetch, parse, build]]
+            for stage in stages:
+                stage.start()
+            for task in tasks:
+                task.done.wait()
+                task.unit_log.flush()
+                if send_email and task.outcome == "generated":
+                    try:
+                        task.outcome = self.send_unit_report(
+                            yyyymm, task.unit, task.recipients, task.data, mail_session
+                        )
+                    except Exception as e:
+                        task.fail(e)
+                    finally:
+                        unsent.release()
+                if task.error is not None:
+                    logger.error(
+                        f"Report failed for unit {task.unit.name}", exc_info=task.error
+                    )
+                    failures.append(task.error)
+                outcomes[task.outcome] += 1
+                if on_unit_done is not None:
+                    on_unit_done(task.unit, task.outcome)
+            for stage in stages:
+                stage.join()
+        return failures
+
+
+class PipelineTask:
+    """A unit's report as it passes through the stages of
+    Orchestrator.run_pipeline().
+    """
+
+    def __init__(
+        self,
+        unit: Unit,
+        recipients: list[str] | set[str],
+        accounts: list[tuple[str, list[str]]],
+    ):
+        self.unit = unit
+        self.recipients = recipients
+        self.accounts = accounts
+        self.unit_log = UnitLog()
+        self.data = None
+        self.filename = None
+        self.outcome = None
+        self.error = None
+        # Set when the unit is finished, whether it succeeded or failed.
+        self.done = threading.Event()
+
+    def finish(self, outcome: str):
+        self.outcome = outcome
+        self.done.set()
+
+    def fail(self, error: Exception):
+        """Finish the unit as failed; later stages skip it."""
+        self.error = error
+        self.finish("failed")
+
+
+class UnitLog:
+    """Collects the log messages for one unit, so units which run at the same
+    time can still be logged in order.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def info(self, message: str):
+        self.records.append((logging.INFO, message))
+
+    def warning(self, message: str):
+        self.records.append((logging.WARNING, message))
+
+    def flush(self):
+        """Log all collected messages."""
+        for level, message in self.records:
+            logger.log(level, message)
+        self.records = []
@@ -0,0 +1,169 @@
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+from django.utils import timezone
+from qdb.models import OutboxMessage, Unit
+from .sender import MailSession, get_message, get_message_body, get_message_subject
+from .settings import OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_SEND_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_report(
+    unit: Unit,
+    yyyymm: str,
+    data: dict,
+    filename: str,
+    recipients: list[str] | set[str],
+) -> OutboxMessage:
+    """Put a report email in the outbox. The report is stored with the
+    message, and its file deleted. Replaces any of the unit's unsent
+    messages for the same month and recipients, so a rerun doesn't send the
+    report twice; messages to other recipients, such as the production
+    email while previewing with override recipients, are kept.
+
+    :param unit: The unit the report is for
+    :param yyyymm: The year and month in YYYYMM format
+    :param data: The report data, as from Parser.data
+    :param filename: The filename of the report
+    :param recipients: The emails of recipients to send the report to
+    :return: The new message, ready to send
+    """
+    accts = [d["account"] for d in data["accounts"]]
+    recipients = sorted(recipients)
+    with open(filename, "rb") as attachment:
+        contents = attachment.read()
+    OutboxMessage.objects.filter(
+        unit=unit,
+        yyyymm=yyyymm,
+        recipients=recipients,
+        status__in=[OutboxMessage.PENDING, OutboxMessage.FAILED],
+    ).delete()
+    message = OutboxMessage.objects.create(
+        unit=unit,
+        yyyymm=yyyymm,
+        recipients=recipients,
+        subject=get_message_subject(data["month_name"], data["year"], data["unit"]),
+        body=get_message_body(data["month_name"], data["year"], data["unit"], accts),
+        attachment_name=os.path.split(filename)[1],
+        attachment=contents,
+        next_attempt=timezone.now(),
+    )
+    os.remove(filename)
+    return message
+
+
+def claim_message(message: OutboxMessage) -> bool:
+    """Mark a pending message as being sent.
+
+    The message is claimed with a conditional update, so if more than one
+    process is delivering, each message is still sent only once.
+
+    :param message: The message
+    :return: True if claimed; False if it was already claimed, or isn't pending
+    """
+    # While sending, next_attempt is when sending started.
+    claimed = OutboxMessage.objects.filter(
+        id=message.id, status=OutboxMessage.PENDING
+    ).update(
+        status=OutboxMessage.SENDING,
+        attempts=message.attempts + 1,
+        next_attempt=timezone.now(),
+    )
+    if claimed:
+        message.refresh_from_db()
+    return bool(claimed)
+
+
+def deliver(message: OutboxMessage, session: MailSession) -> bool:
+    """Send a pending message. If sending fails, the message is tried again
+    later, after a delay which doubles each time, until OUTBOX_MAX_ATTEMPTS;
+    then it's marked as failed.
+
+    :param message: The message
+    :param session: The session to send with
+    :return: True if the message was sent by this call
+    """
+    if not claim_message(message):
+        return False
+    try:
+        session.send(
+            get_message(
+                message.subject,
+                message.body,
+                message.recipients,
+                message.attachment_name,
+                bytes(message.attachment),
+            ),
+            message.recipients,
+        )
+    except Exception as e:
+        message.error = str(e)
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxMessage.FAILED
+            logger.error(f"Giving up sending {message} after {message.attempts} tries")
+        else:
+            message.status = OutboxMessage.PENDING
+            delay = OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1)
+            message.next_attempt = timezone.now() + timedelta(seconds=delay)
+            logger.warning(f"Could not send {message}, will retry in {delay} seconds")
+        message.save(update_fields=["status", "error", "next_attempt"])
+        return False
+    message.status = OutboxMessage.SENT
+    message.sent = timezone.now()
+    message.error = ""
+    # The report is no longer needed.
+    message.attachment = b""
+    message.save(update_fields=["status", "sent", "error", "attachment"])
+    logger.info(f"Sent report {message.attachment_name} to {message.recipients}")
+    return True
+
+
+def deliver_due(
+    session: MailSession,
+    resume: bool = False,
+    yyyymm: str | None = None,
+    units: list[Unit] | None = None,
+) -> Counter:
+    """Send messages which are due to be sent, oldest first.
+
+    :param session: The session to send with
+    :param resume: Whether to also send failed messages, and pending
+    messages waiting to be retried, right away
+    :param yyyymm: Only send messages for this month, in YYYYMM format
+    :param units: Only send messages for these units
+    :return: Counts of messages "sent" and "not sent"
+    """
+    messages = OutboxMessage.objects.all()
+    if yyyymm is not None:
+        messages = messages.filter(yyyymm=yyyymm)
+    if units is not None:
+        messages = messages.filter(unit__in=units)
+    if resume:
+        messages.filter(status=OutboxMessage.FAILED).update(
+            status=OutboxMessage.PENDING, attempts=0
+        )
+    else:
+        messages = messages.filter(next_attempt__lte=timezone.now())
+    outcomes = Counter()
+    for message in messages.filter(status=OutboxMessage.PENDING).order_by("id"):
+        outcomes["sent" if deliver(message, session) else "not sent"] += 1
+    return outcomes
+
+
+def fail_stale_messages() -> int:
+    """Mark messages which have been sending too long as failed, so they
+    aren't left sending forever if the process stopped part way through.
+    They may have been sent, so they're only sent again by deliver_due()
+    with resume=True.
+
+    :return: The number of messages marked as failed
+    """
+    cutoff = timezone.now() - timedelta(seconds=OUTBOX_SEND_TIMEOUT)
+    return OutboxMessage.objects.filter(
+        status=OutboxMessage.SENDING, next_attempt__lt=cutoff
+    ).update(
+        status=OutboxMessage.FAILED,
+        error="Sending did not finish in time; the email may have been sent",
+    )
@@ -1,9 +1,92 @@
 import arrow
+import numpy as np
 from decimal import Decimal
-from .settings import SUBCODES
+from operator import itemgetter
+from .settings import AMOUNT_FIELDS
 
 LOCALE = arrow.locales.EnglishLocale()
 
+# Amounts kept for each subcode and in each FAU's totals, from AMOUNT_FIELDS
+AMOUNT_NAMES = ["Appropriation", "Expense", "Encumbrance", "Memo Lien", "Amount"]
+APPROPRIATION = AMOUNT_NAMES.index("Appropriation")
+AMOUNT = AMOUNT_NAMES.index("Amount")
+
+
+class Fund:
+    """One FAU's part of a report. Amounts are whole cents, in an array with
+    a row for each subcode and a column for each of AMOUNT_NAMES.
+    """
+
+    __slots__ = ("fau", "fund_title", "sub_codes", "amounts", "totals", "percents")
+
+    def __init__(
+        self,
+        fau: str,
+        fund_title: str,
+        sub_codes: list[str],
+        amounts: np.ndarray,
+        totals: np.ndarray,
+        percents: np.ndarray,
+    ):
+        """Initialize the Fund.
+
+        :param fau: The FAU, as "account-cost center-fund"
+        :param fund_title: The title of the fund
+        :param sub_codes: The subcodes, in report order
+        :param amounts: The amounts for each subcode, in cents
+        :param totals: The total of each amount, in cents
+        :param percents: The fraction of each subcode's appropriation left
+        """
+        self.fau = fau
+        self.fund_title = fund_title
+        self.sub_codes = sub_codes
+        self.amounts = amounts
+        self.totals = totals
+        self.percents = percents
+
+    def get_amounts(self) -> dict:
+        """Get the amounts as Decimals, keyed by subcode or "totals", then by
+        name (AMOUNT_NAMES).
+        """
+        amounts = dict(zip(self.sub_codes, self.amounts.tolist()))
+        amounts["totals"] = self.totals.tolist()
+        return {
+            key: {
+                name: Decimal(cents).scaleb(-2)
+                for name, cents in zip(AMOUNT_NAMES, values)
+            }
+            for key, values in amounts.items()
+        }
+
+
+def get_cents(rows: list[dict]) -> np.ndarray:
+    """Get the amounts (AMOUNT_FIELDS) of QDB rows in whole cents. QDB amounts
+    have two decimal places, and are far too small to lose any to rounding.
+
+    :param rows: Rows from QDB
+    :return: An array with a row for each QDB row and a column for each amount
+    """
+    get_amounts = itemgetter(*AMOUNT_FIELDS)
+    values = np.fromiter(
+        (float(amount) for row in rows for amount in get_amounts(row)),
+        dtype=np.float64,
+        count=len(rows) * len(AMOUNT_FIELDS),
+    )
+    return np.rint(values.reshape(-1, len(AMOUNT_FIELDS)) * 100).astype(np.int64)
+
+
+def get_fau_amounts(data: dict) -> dict:
+    """Get the amounts for each FAU in a Parser's data, across all accounts.
+
+    :param data: The data of a Parser
+    :return: Amounts keyed by FAU, then by subcode or "totals"
+    """
+    return {
+        fund.fau: fund.get_amounts()
+        for account in data["accounts"]
+        for fund in account["funds"]
+    }
+
 
 class Parser:
     def __init__(self, yyyymm: str, unit_name: str):
@@ -32,19 +115,27 @@ class Parser:
             return Decimal(max(0.00, amount / approp))
         return Decimal(0.00)
 
-    def calculate_totals(self, subs: dict) -> dict:
-        """Calculate totals for a given set of subcodes.
+    def calculate_percents_left(self, amounts: np.ndarray) -> np.ndarray:
+        """Calculate the percentage left of the appropriation of each row of
+        amounts at once, as calculate_percent_left() does for one.
 
-        :param subs: The subcodes
-        :return: The totals
+        :param amounts: Amounts, one row for each subcode, as in Fund.amounts
+        :return: The percentage left for each row
         """
-        return {
-            "Appropriation": sum([s["Appropriation"] for s in subs.values()]),
-            "Expense": sum([s["Expense"] for s in subs.values()]),
-            "Encumbrance": sum([s["Encumbrance"] for s in subs.values()]),
-            "Memo Lien": sum([s["Memo Lien"] for s in subs.values()]),
-            "Amount": sum([s["Amount"] for s in subs.values()]),
-        }
+        approp = amounts[:, APPROPRIATION]
+        percents = np.zeros(len(amounts))
+        np.divide(amounts[:, AMOUNT], approp, out=percents, where=approp > 0)
+        return np.maximum(percents, 0)
+
+    def calculate_totals(self, amounts: np.ndarray, sizes: list[int]) -> np.ndarray:
+        """Calculate totals for consecutive sets of subcodes, such as each FAU's.
+
+        :param amounts: Amounts, one row for each subcode, as in Fund.amounts
+        :param sizes: The number of subcodes in each set
+        :return: The totals, one row for each set
+        """
+        starts = np.cumsum([0] + sizes[:-1])
+        return np.add.reduceat(amounts, starts, axis=0)
 
     def exclude(self, row: dict) -> bool:
         """Exclude rows with zero values for specified fields
@@ -104,13 +195,9 @@ class Parser:
         :param rows: The rows to check
         :return: True if the account was added, False otherwise
         """
-        acct_dict = {
-            "title": rows[0]["account_title"].strip(),
-            "account": account,
-            "cc_list": cc_list,
-            "faus": {},
-        }
-        for row in rows:
+        # Positions of the rows to keep, by FAU then subcode
+        faus = {}
+        for index, row in enumerate(rows):
             if self.exclude(row):
                 continue
             # Handle FTVA AUL fund reporting differently, per SYS-1659
@@ -120,27 +207,65 @@ class Parser:
                     continue
 
             fau = f"{row['account_number']}-{row['cost_center_code']}-{row['fund_number']}"
-            if fau not in acct_dict["faus"].keys():
-                acct_dict["faus"][fau] = {"fund_title": row["fund_title"], "subs": {}}
-            row_dict = {
-                "name": SUBCODES[row["sub_code"]]["title"],
-                "Appropriation": row["ytd_approp"],
-                "Expense": row["ytd_expense"],
-                "Encumbrance": row["encumbrance"],
-                "Memo Lien": row["memo_lien"],
-                "Amount": row["operating_bal_am"],
-                "Percent": self.calculate_percent_left(
-                    row["ytd_approp"], row["operating_bal_am"]
-                ),
+            # A later row for the same subcode replaces the earlier one.
+            faus.setdefault(fau, {})[row["sub_code"]] = index
+        if len(faus) == 0:
+            return False
+        # All FAUs' amounts in one array, each FAU's rows together, in report
+        # order; each Fund gets its part.
+        amounts = get_cents(
+            [rows[index] for subs in faus.values() for index in subs.values()]
+        )
+        sizes = [len(subs) for subs in faus.values()]
+        totals = self.calculate_totals(amounts, sizes)
+        percents = self.calculate_percents_left(amounts)
+        funds = []
+        start = 0
+        for (fau, subs), size, fund_totals in zip(faus.items(), sizes, totals):
+            end = start + size
+            fund = Fund(
+                fau,
+                rows[next(iter(subs.values()))]["fund_title"],
+                list(subs),
+                amounts[start:end],
+                fund_totals,
+                percents[start:end],
+            )
+            funds.append(fund)
+            if fau.endswith("-19900") and "02" in subs:
+                self.data["sub02s"].append(fund)
+            start = end
+        self.data["accounts"].append(
+            {
+                "title": rows[0]["account_title"].strip(),
+                "account": account,
+                "cc_list": cc_list,
+                "funds": funds,
+            }
+        )
+        return True
+
+    def get_changes(self, earlier: dict) -> dict:
+        """Compare this month's data with an earlier month's, for the same unit.
+
+        :param earlier: The data of a Parser for the earlier month
+        :return: The change in each amount since the earlier month, keyed by FAU,
+        then by subcode or "totals". FAUs and subcodes missing from
+        one month count as zero for that month.
+        """
+        zero = dict.fromkeys(AMOUNT_NAMES, Decimal(0))
+        current_faus = get_fau_amounts(self.data)
+        earlier_faus = get_fau_amounts(earlier)
+        changes = {}
+        # FAUs in this month's order, then any only in the earlier month
+        for fau in {**current_faus, **earlier_faus}:
+            current = current_faus.get(fau, {})
+            previous = earlier_faus.get(fau, {})
+            changes[fau] = {
+                key: {
+                    name: current.get(key, zero)[name] - previous.get(key, zero)[name]
+                    for name in AMOUNT_NAMES
+                }
+                for key in {**current, **previous}
             }
-            acct_dict["faus"][fau]["subs"][row["sub_code"]] = row_dict
-            if row["fund_number"] == "19900" and row["sub_code"] == "02":
-                self.data["sub02s"].append(
-                    {"fau": fau, "fund_title": row["fund_title"], "row_dict": row_dict}
-                )
-        if len(acct_dict["faus"]) > 0:
-            for key, fau in acct_dict["faus"].items():
-                fau["totals"] = self.calculate_totals(fau["subs"])
-            self.data["accounts"].append(acct_dict)
-            return True
-        return False
+        return changes
@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+import pytds
+from .settings import (
+    DB_SERVER,
+    DB_DATABASE,
+    DB_USER,
+    DB_PASSWORD,
+    QDB_POOL_MAX_SIZE,
+    QDB_POOL_IDLE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Errors which mean the connection itself is unusable (dropped by the server,
+# network problem, etc.), as opposed to a problem with the query.
+CONNECTION_ERRORS = (pytds.OperationalError, pytds.InterfaceError, OSError)
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes available in time."""
+
+
+class ConnectionPool:
+    """A small thread-safe pool of database connections.
+
+    Idle connections are reused, most recently used first. Connections idle
+    longer than idle_timeout are closed instead of reused, and connections idle
+    longer than check_after are checked with a trivial query before reuse.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 4,
+        idle_timeout: float = 300,
+        check_after: float = 30,
+        wait_timeout: float = 60,
+    ):
+        """Initialize the pool; no connections are opened until needed.
+
+        :param connect: Function which returns a new DB-API connection
+        :param max_size: The maximum number of open connections
+        :param idle_timeout: Seconds after which an idle connection is closed
+        :param check_after: Seconds after which an idle connection is checked
+        before reuse
+        :param wait_timeout: Seconds to wait for a connection when all are in use
+        """
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.wait_timeout = wait_timeout
+        # (connection, time it was returned to the pool)
+        self._idle: list[tuple[Any, float]] = []
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {"hits": 0, "misses": 0, "reconnects": 0, "discarded": 0}
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counts of connections reused (hits), opened (misses), reopened after
+        a failure (reconnects) and closed as stale or broken (discarded).
+        """
+        with self._condition:
+            return dict(self._stats)
+
+    def _close(self, conn: Any):
+        """Close a connection, ignoring errors since it may already be broken."""
+        with self._condition:
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn: Any) -> bool:
+        """Check that a connection still works."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _take_idle(self) -> tuple[Any, float] | None:
+        """Take the most recently used idle connection, closing any which
+        have been idle too long. Caller must hold the lock.
+        """
+        now = time.monotonic()
+        while self._idle:
+            conn, returned = self._idle.pop()
+            if now - returned <= self.idle_timeout:
+                self._in_use += 1
+                return conn, now - returned
+            self._close(conn)
+        return None
+
+    def _acquire(self) -> tuple[Any, bool]:
+        """Get a connection from the pool, opening one if needed.
+
+        :return: A tuple of the connection and whether it was reused
+        :raises PoolExhaustedError: If all connections stay in use too long
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._condition:
+                while True:
+                    idle = self._take_idle()
+                    if idle is not None or self._in_use < self.max_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"No connection available after {self.wait_timeout} seconds"
+                        )
+                    self._condition.wait(remaining)
+                if idle is None:
+                    # Reserve the slot, then connect without holding the lock.
+                    self._in_use += 1
+                    self._stats["misses"] += 1
+            if idle is None:
+                break
+            # Check outside the lock, since it needs a round trip to the server.
+            conn, idle_for = idle
+            try:
+                healthy = idle_for <= self.check_after or self._is_healthy(conn)
+            except Exception:
+                # Not a connection error, but don't lose the reserved slot.
+                self._release(conn, broken=True)
+                raise
+            if healthy:
+                with self._condition:
+                    self._stats["hits"] += 1
+                return conn, True
+            self._release(conn, broken=True)
+        try:
+            return self.connect(), False
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, conn: Any, broken: bool = False):
+        """Return a connection to the pool, or close it if broken. Other
+        connections idle too long are closed now, rather than on the next
+        acquire, which may never come.
+        """
+        with self._condition:
+            self._in_use -= 1
+            # Oldest first, since connections are appended as they're returned.
+            now = time.monotonic()
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                stale, _ = self._idle.pop(0)
+                self._close(stale)
+            if broken:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Context manager which lends out a connection.
+
+        If a connection error occurs within the block, the connection
+        is closed instead of being returned to the pool.
+        """
+        conn, _ = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def fetchall(self, query: str, params: Any = None) -> list:
+        """Run a query and return all rows.
+
+        If a reused connection turns out to be broken (for example, after
+        the QDB server's nightly maintenance), it is discarded and the query is
+        retried once on a new connection. Errors on a new connection are raised.
+
+        :param query: The query to run
+        :param params: Parameters for the query, if any
+        :return: A list representing rows of data
+        """
+        while True:
+            conn, reused = self._acquire()
+            try:
+                with conn.cursor() as cursor:
+                    if params is None:
+                        cursor.execute(query)
+                    else:
+                        cursor.execute(query, params)
+                    rows = cursor.fetchall()
+            except CONNECTION_ERRORS as e:
+                self._release(conn, broken=True)
+                if not reused:
+                    raise
+                with self._condition:
+                    self._stats["reconnects"] += 1
+                logger.warning(f"Reconnecting after database connection error: {e}")
+                continue
+            except Exception:
+                self._release(conn)
+                raise
+            self._release(conn)
+            return rows
+
+    def close_all(self):
+        """Close all idle connections."""
+        with self._condition:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+
+
+def connect_qdb() -> pytds.Connection:
+    """Open a new connection to QDB, returning rows as dictionaries."""
+    # autocommit, so idle pooled connections do not hold a transaction open.
+    return pytds.connect(
+        DB_SERVER, DB_DATABASE, DB_USER, DB_PASSWORD, as_dict=True, autocommit=True
+    )
+
+
+# Shared by everything in this process which reads QDB.
+qdb_pool = ConnectionPool(
+    connect_qdb, max_size=QDB_POOL_MAX_SIZE, idle_timeout=QDB_POOL_IDLE_TIMEOUT
+)
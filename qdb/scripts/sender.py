@@ -1,10 +1,14 @@
-import os
-from smtplib import SMTP
+import logging
+import threading
+import time
+from smtplib import (
+    SMTP,
+    SMTPException,
+    SMTPResponseException,
+    SMTPServerDisconnected,
+)
 from ssl import create_default_context
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from email.message import EmailMessage
 
 from .settings import (
     SMTP_SERVER,
@@ -14,8 +18,12 @@ from .settings import (
     PASSWORD,
     MESSAGE_CLOSER,
     ENV,
+    SMTP_RETRIES,
+    SMTP_RETRY_DELAY,
 )
 
+logger = logging.getLogger(__name__)
+
 
 def get_message_body(
     month_name: str, year: int | str, unit: str, accounts: list[str]
@@ -46,43 +54,137 @@ def get_message_subject(month_name: str, year: int | str, unit: str) -> str:
     return f"{month_name} {year} Financial Report: {unit}"
 
 
-def send_report(data: dict, filename: str, recipients: list[str] | set[str]):
-    """Send the report.
+def is_temporary_error(error: Exception) -> bool:
+    """Whether sending may succeed if tried again on a new connection:
+    the connection failed or was dropped, or the server replied with a
+    temporary (4xx) error.
 
-    :param data: The data to include in the report
-    :param filename: The filename of the report
-    :param recipients: The emails of recipients to send the report to
+    :param error: The error from sending
+    :return: True if sending should be retried
+    """
+    if isinstance(error, SMTPServerDisconnected):
+        return True
+    if isinstance(error, SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # Other SMTP errors (e.g., all recipients refused) are also OSErrors.
+    if isinstance(error, SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class MailSession:
+    """An SMTP connection, opened when first needed and reused for every
+    message until closed, so a run of many reports connects (and, in dev,
+    logs in) once. Messages which fail with temporary errors are retried on
+    a new connection, after a delay which doubles each time.
+
+    Can be used by several threads; messages are sent one at a time.
     """
-    accts = [d["account"] for d in data["accounts"]]
-    body = get_message_body(data["month_name"], data["year"], data["unit"], accts)
 
-    message = MIMEMultipart()
+    def __init__(
+        self, retries: int = SMTP_RETRIES, retry_delay: float = SMTP_RETRY_DELAY
+    ):
+        """Initialize the session; no connection is opened until needed.
+
+        :param retries: Times to retry a message after a temporary error
+        :param retry_delay: Seconds to wait before the first retry
+        """
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.server = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def connect(self) -> SMTP:
+        """Open a new connection to the SMTP server."""
+        server = SMTP(SMTP_SERVER, int(PORT), APP_IP)
+        try:
+            # Local devs use gmail which requires smtp auth and tls.
+            # Central test/prod environment uses ucla smtp: no auth/tls, ip-restricted.
+            if ENV == "dev":
+                server.ehlo()
+                server.starttls(context=create_default_context())
+                server.ehlo()
+                server.login(FROM_ADDRESS, PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def disconnect(self):
+        """Close the connection, if open, ignoring errors since it may
+        already be broken.
+        """
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                self.server.close()
+            self.server = None
+
+    def close(self):
+        """Close the session's connection."""
+        with self._lock:
+            self.disconnect()
+
+    def send(self, message: EmailMessage, recipients: list[str] | set[str]):
+        """Send a message, retrying after temporary errors.
+
+        :param message: The message to send
+        :param recipients: The emails of recipients to send the message to
+        :raises Exception: The last error, if the message could not be sent
+        """
+        with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    if self.server is None:
+                        self.server = self.connect()
+                    # Written straight to the connection as bytes.
+                    self.server.send_message(message, FROM_ADDRESS, list(recipients))
+                    return
+                except Exception as e:
+                    self.disconnect()
+                    if attempt >= self.retries or not is_temporary_error(e):
+                        raise
+                    delay = self.retry_delay * 2**attempt
+                    attempt += 1
+                    logger.warning(
+                        f"Retrying email in {delay} seconds after error: {e}"
+                    )
+                    time.sleep(delay)
+
+
+def get_message(
+    subject: str,
+    body: str,
+    recipients: list[str] | set[str],
+    attachment_name: str,
+    attachment: bytes,
+) -> EmailMessage:
+    """Get an email message with a report attached.
+
+    :param subject: The message subject
+    :param body: The message body
+    :param recipients: The emails of recipients to send the message to
+    :param attachment_name: The filename of the attached report
+    :param attachment: The contents of the report
+    :return: The message
+    """
+    message = EmailMessage()
     message["From"] = FROM_ADDRESS
     message["To"] = ", ".join(recipients)
-    message["Subject"] = get_message_subject(
-        data["month_name"], data["year"], data["unit"]
+    message["Subject"] = subject
+    message.set_content(body)
+    message.add_attachment(
+        attachment,
+        maintype="application",
+        subtype="octet-stream",
+        filename=attachment_name,
     )
-    message.attach(MIMEText(body, "plain"))
-
-    with open(filename, "rb") as attachment:
-        part = MIMEBase("application", "octet-stream")
-        part.set_payload(attachment.read())
-
-    encoders.encode_base64(part)
-
-    part.add_header(
-        "Content-Disposition", f"attachment; filename={os.path.split(filename)[1]}"
-    )
-
-    message.attach(part)
-    text = message.as_string()
-
-    with SMTP(SMTP_SERVER, int(PORT), APP_IP) as server:
-        # Local devs use gmail which requires smtp auth and tls.
-        # Central test/prod environment uses ucla smtp: no auth/tls, ip-restricted.
-        if ENV == "dev":
-            server.ehlo()
-            server.starttls(context=create_default_context())
-            server.ehlo()
-            server.login(FROM_ADDRESS, PASSWORD)
-        server.sendmail(FROM_ADDRESS, list(recipients), text)
+    return message
@@ -14,12 +14,41 @@ FROM_ADDRESS = os.environ["DJANGO_EMAIL_FROM_ADDRESS"]
 PASSWORD = os.environ["DJANGO_EMAIL_PASSWORD"]
 # This is used by SMTP call in sender.py
 APP_IP = os.environ["DJANGO_APP_IP"]  # The IP of the machine running this app
+# Times to retry an email after a temporary error; see sender.py
+SMTP_RETRIES = int(os.environ.get("QDB_SMTP_RETRIES", 3))
+# Seconds before the first retry, doubling for each retry after
+SMTP_RETRY_DELAY = int(os.environ.get("QDB_SMTP_RETRY_DELAY", 5))
 
 # QDB server
 DB_SERVER = os.environ["QDB_DB_SERVER"]
 DB_DATABASE = os.environ["QDB_DB_DATABASE"]
 DB_USER = os.environ["QDB_DB_USER"]
 DB_PASSWORD = os.environ.get("QDB_DB_PASSWORD", "")  # not relevant for CI builds
+# Connections kept open for reuse, per process; see pool.py
+QDB_POOL_MAX_SIZE = int(os.environ.get("QDB_POOL_MAX_SIZE", 4))
+# Seconds before an unused connection is closed
+QDB_POOL_IDLE_TIMEOUT = int(os.environ.get("QDB_POOL_IDLE_TIMEOUT", 300))
+# Local cache of QDB results; see cache.py
+# Seconds before cached results are fetched from QDB again
+QDB_CACHE_TTL = int(os.environ.get("QDB_CACHE_TTL", 86400))
+# Maximum cached results, one per account; least recently used are removed first
+QDB_CACHE_MAX_ENTRIES = int(os.environ.get("QDB_CACHE_MAX_ENTRIES", 5000))
+# Report emails waiting to be sent; see outbox.py
+# Times to try sending each email before giving up
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("QDB_OUTBOX_MAX_ATTEMPTS", 5))
+# Seconds before the first retry, doubling for each retry after
+OUTBOX_RETRY_DELAY = int(os.environ.get("QDB_OUTBOX_RETRY_DELAY", 300))
+# Seconds after which an email still being sent is assumed lost
+OUTBOX_SEND_TIMEOUT = int(os.environ.get("QDB_OUTBOX_SEND_TIMEOUT", 600))
+# Local copies of QDB data; see snapshot.py
+SNAPSHOT_DIR = os.environ.get("QDB_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshots"))
+# Most items waiting between stages of a pipelined run; see orchestrator.py
+PIPELINE_QUEUE_SIZE = int(os.environ.get("QDB_PIPELINE_QUEUE_SIZE", 4))
+# Report jobs from the web form; see jobs.py
+# Seconds between checks for new jobs
+REPORT_JOB_POLL_INTERVAL = int(os.environ.get("QDB_REPORT_JOB_POLL_INTERVAL", 5))
+# Seconds after which a running job is assumed lost (e.g., worker restarted)
+REPORT_JOB_TIMEOUT = int(os.environ.get("QDB_REPORT_JOB_TIMEOUT", 3600))
 
 # Folder for reports
 REPORTS_DIR = os.path.join(BASE_DIR, "reports")
@@ -66,6 +95,16 @@ If you have technical questions about the message or the report, please contact:
 {SLDS_CONTACT_EMAIL}"""
 
 
+# QDB columns which hold amounts, returned as Decimal
+AMOUNT_FIELDS = [
+    "ytd_approp",
+    "ytd_expense",
+    "encumbrance",
+    "memo_lien",
+    "operating_bal_am",
+]
+
+
 # Subcodes
 SUBCODES = {
     "00": {
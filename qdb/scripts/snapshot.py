@@ -0,0 +1,136 @@
+from decimal import Decimal
+import os
+import numpy as np
+from .settings import AMOUNT_FIELDS, SNAPSHOT_DIR
+
+# QDB columns which repeat a few values many times, stored once each
+# with a code per row.
+TEXT_FIELDS = [
+    "ledger_year_month",
+    "account_number",
+    "cost_center_code",
+    "fund_number",
+    "sub_code",
+    "account_title",
+    "fund_title",
+]
+
+
+def get_scale(amounts: list[Decimal]) -> int:
+    """Get the most decimal places used by any of the amounts.
+
+    :param amounts: Amounts, as from QDB
+    :return: The number of decimal places which represents all amounts exactly
+    """
+    return max([-amount.as_tuple().exponent for amount in amounts] + [0])
+
+
+def get_snapshot_filename(yyyymm: str) -> str:
+    """Get the default file for a month's snapshot of library QDB data.
+
+    :param yyyymm: The year and month in YYYYMM format
+    :return: The snapshot's filename, in SNAPSHOT_DIR
+    """
+    return os.path.join(SNAPSHOT_DIR, f"qdb_{yyyymm}.npz")
+
+
+class Snapshot:
+    """QDB rows for one or more months, stored by column, so many months of
+    rows can be kept, saved and reused compactly.
+
+    Text columns are stored as each distinct value plus an integer code per row;
+    amounts (AMOUNT_FIELDS) as whole numbers of their smallest unit, usually
+    cents, with the number of decimal places for each column.
+    Rows keep the order they were added in.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        """Initialize the Snapshot; use from_rows() or load() instead.
+
+        :param arrays: The columns, as from from_rows()
+        """
+        self.arrays = arrays
+
+    @classmethod
+    def from_rows(cls, rows: list[dict]) -> "Snapshot":
+        """Build a snapshot from QDB rows.
+
+        :param rows: Rows from QDB, including ledger_year_month
+        :return: The snapshot
+        """
+        arrays = {}
+        for field in TEXT_FIELDS:
+            values, codes = np.unique(
+                np.array([str(row[field]) for row in rows], dtype=str),
+                return_inverse=True,
+            )
+            arrays[f"{field}_values"] = values
+            arrays[f"{field}_codes"] = codes.astype(np.int32)
+        for field in AMOUNT_FIELDS:
+            amounts = [row[field] for row in rows]
+            scale = get_scale(amounts)
+            arrays[f"{field}_scale"] = np.array(scale)
+            arrays[field] = np.array(
+                [int(amount.scaleb(scale)) for amount in amounts], dtype=np.int64
+            )
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, filename: str) -> "Snapshot":
+        """Load a snapshot saved by save().
+
+        :param filename: The snapshot file
+        :return: The snapshot
+        """
+        with np.load(filename, allow_pickle=False) as npz:
+            return cls({name: npz[name] for name in npz.files})
+
+    def save(self, filename: str):
+        """Save the snapshot to a compressed file.
+
+        :param filename: The file to save to; numpy adds .npz if missing
+        """
+        np.savez_compressed(filename, **self.arrays)
+
+    def __len__(self) -> int:
+        return len(self.arrays["ledger_year_month_codes"])
+
+    @property
+    def months(self) -> list[str]:
+        """The months in the snapshot, in YYYYMM format."""
+        return self.arrays["ledger_year_month_values"].tolist()
+
+    def get_rows(self, yyyymm: str) -> list[dict]:
+        """Get the rows for one month, as QDB returns them.
+
+        :param yyyymm: The year and month in YYYYMM format
+        :return: A list of rows, in the order they were added
+        """
+        month_values = self.arrays["ledger_year_month_values"]
+        month_code = np.searchsorted(month_values, yyyymm)
+        if month_code == len(month_values) or month_values[month_code] != yyyymm:
+            return []
+        selected = self.arrays["ledger_year_month_codes"] == month_code
+        columns = {}
+        for field in TEXT_FIELDS[1:]:
+            values = self.arrays[f"{field}_values"]
+            columns[field] = values[self.arrays[f"{field}_codes"][selected]].tolist()
+        for field in AMOUNT_FIELDS:
+            scale = -int(self.arrays[f"{field}_scale"])
+            columns[field] = [
+                Decimal(amount).scaleb(scale)
+                for amount in self.arrays[field][selected].tolist()
+            ]
+        rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        for row in rows:
+            row["ledger_year_month"] = yyyymm
+            row["fau"] = " ".join(
+                [
+                    row["account_number"],
+                    row["cost_center_code"],
+                    row["fund_number"],
+                    row["account_title"],
+                    row["fund_title"],
+                ]
+            )
+        return rows
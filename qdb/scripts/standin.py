@@ -0,0 +1,225 @@
+import random
+import re
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+from itertools import count
+from typing import Any
+import pytds
+from .settings import AMOUNT_FIELDS, SUBCODES
+
+# gl_balances amounts, stored in cents since SQLite has no decimal type.
+LEDGER_AMOUNTS = [
+    "ytd_appropriation",
+    "ytd_financial",
+    "encumbrance",
+    "memo_lien",
+    "bal_operating",
+]
+
+SCHEMA = f"""
+CREATE TABLE account (
+    location_code TEXT,
+    account_number TEXT,
+    cost_center_code TEXT,
+    account_title TEXT
+);
+CREATE TABLE fund (
+    location_code TEXT,
+    fund_number TEXT,
+    fund_title TEXT,
+    fund_closed_flag TEXT
+);
+CREATE TABLE gl_balances (
+    location_code TEXT,
+    account_number TEXT,
+    cost_center_code TEXT,
+    fund_number TEXT,
+    sub_code TEXT,
+    ledger_year_month TEXT,
+    dept_code_account TEXT,
+    fye_proc_ind TEXT,
+    {", ".join(f"{amount} INTEGER" for amount in LEDGER_AMOUNTS)}
+);
+CREATE INDEX gl_balances_month_account
+    ON gl_balances (ledger_year_month, account_number, cost_center_code);
+"""
+
+# Each stand-in gets its own shared in-memory database.
+database_numbers = count(1)
+
+
+def translate_query(query: str) -> str:
+    """Translate a QDB (SQL Server) query, as built by fetcher.py, to SQLite.
+
+    :param query: The QDB query, with %s placeholders
+    :return: The same query for SQLite, with ? placeholders
+    """
+    query = query.replace("qdb.dbo.", "")
+    # String concatenation
+    query = re.sub(r"(?<=\S) \+ (?=\S)", " || ", query)
+    query = query.replace("\n    + ", "\n    || ")
+    query = re.sub(r"RIGHT\(([\w.]+), (\d+)\)", r"substr(\1, -\2)", query)
+    # SQLite can't name the columns of a VALUES table.
+    query = re.sub(
+        r"\(VALUES (.*?)\) AS (\w+) \((\w+), (\w+)\)",
+        r"(SELECT column1 AS \3, column2 AS \4 FROM (VALUES \1)) AS \2",
+        query,
+    )
+    return query.replace("%s", "?").replace("%%", "%")
+
+
+class StandinCursor:
+    """Cursor of a StandinConnection, returning rows as dictionaries with
+    Decimal amounts, like pytds with as_dict=True.
+    """
+
+    def __init__(self, standin: "StandinQDB", conn: sqlite3.Connection):
+        self.standin = standin
+        self.cursor = conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cursor.close()
+
+    def execute(self, query: str, params: Any = None):
+        self.standin.before_query()
+        self.cursor.execute(translate_query(query), params or [])
+
+    def fetchall(self) -> list[dict]:
+        columns = [column[0] for column in self.cursor.description]
+        rows = [dict(zip(columns, values)) for values in self.cursor.fetchall()]
+        for row in rows:
+            for field in AMOUNT_FIELDS:
+                if field in row:
+                    row[field] = Decimal(row[field]).scaleb(-2)
+        return rows
+
+
+class StandinConnection:
+    """Connection to a StandinQDB, with the parts of the pytds
+    connection interface the connection pool uses.
+    """
+
+    def __init__(self, standin: "StandinQDB"):
+        self.standin = standin
+        self.conn = sqlite3.connect(standin.uri, uri=True, check_same_thread=False)
+
+    def cursor(self) -> StandinCursor:
+        return StandinCursor(self.standin, self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class StandinQDB:
+    """A local stand-in for the QDB server, for testing and benchmarking
+    offline. Serves made-up gl_balances, account and fund data for the
+    given accounts to the queries in fetcher.py, from an in-memory SQLite
+    database, optionally with delays and connection failures like the real
+    server's.
+
+    Use connect() as the connection pool's connect function.
+    """
+
+    def __init__(
+        self,
+        accounts: list[tuple[str, list[str]]],
+        months: list[str],
+        funds: int = 10,
+        latency: float = 0,
+        failure_rate: float = 0,
+        seed: int = 1,
+    ):
+        """Initialize the stand-in and fill its database.
+
+        :param accounts: (account, list of cost centers) tuples to add data for
+        :param months: The months to add data for, in YYYYMM format
+        :param funds: The number of funds for each account and cost center
+        :param latency: Seconds each query waits before running
+        :param failure_rate: Chance (0 to 1) that each query fails with a
+        connection error
+        :param seed: Seed for the data and failures, so runs are repeatable
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rand = random.Random(seed)
+        self.uri = f"file:qdb_standin_{next(database_numbers)}?mode=memory&cache=shared"
+        self.stats = {"queries": 0, "failures": 0}
+        self._lock = threading.Lock()
+        # The database lasts as long as this connection is open.
+        self._keeper = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self._keeper.executescript(SCHEMA)
+        self.add_data(accounts, months, funds)
+
+    def add_data(
+        self, accounts: list[tuple[str, list[str]]], months: list[str], funds: int
+    ):
+        """Add made-up data for the accounts. Each subcode of a fund has one
+        to three ledger rows. Each account and cost center also has rows the
+        library filters leave out: another department's, a closed fund's and,
+        in June, final (not preliminary) closeout.
+        """
+        pairs = sorted(
+            {(account, cc) for account, cc_list in accounts for cc in cc_list}
+        )
+        fund_numbers = ["19900"] + [f"{30000 + index}" for index in range(1, funds)]
+        self._keeper.executemany(
+            "INSERT INTO fund VALUES ('4', ?, ?, ?)",
+            [(number, f"Fund {number}", "N") for number in fund_numbers]
+            + [("99999", "Closed fund", "Y")],
+        )
+        self._keeper.executemany(
+            "INSERT INTO account VALUES ('4', ?, ?, ?)",
+            [(account, cc, f"Account {account} {cc}") for account, cc in pairs],
+        )
+        ledger_rows = []
+        for yyyymm in months:
+            proc_inds = ["P", "F"] if yyyymm.endswith("06") else [""]
+            for account, cc in pairs:
+                for fund_number in fund_numbers + ["99999"]:
+                    for sub_code in self.rand.sample(
+                        list(SUBCODES), self.rand.randint(2, 8)
+                    ):
+                        for _ in range(self.rand.randint(1, 3)):
+                            amounts = [
+                                self.rand.randint(-10000, 5000000)
+                                for _ in LEDGER_AMOUNTS
+                            ]
+                            for proc_ind in proc_inds:
+                                ledger_rows.append(
+                                    (account, cc, fund_number, sub_code, yyyymm)
+                                    + ("5400", proc_ind, *amounts)
+                                )
+                    ledger_rows.append(
+                        (account, cc, fund_number, "03", yyyymm, "1234", "P")
+                        + (100,) * len(LEDGER_AMOUNTS)
+                    )
+        self._keeper.executemany(
+            f"INSERT INTO gl_balances VALUES ('4', {', '.join(['?'] * 12)})",
+            ledger_rows,
+        )
+        self._keeper.commit()
+
+    def before_query(self):
+        """Wait, then fail if chosen to, as each query starts."""
+        with self._lock:
+            self.stats["queries"] += 1
+            fail = self.rand.random() < self.failure_rate
+            if fail:
+                self.stats["failures"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise pytds.OperationalError("Stand-in QDB connection lost")
+
+    def connect(self) -> StandinConnection:
+        """Open a new connection to the stand-in."""
+        return StandinConnection(self)
+
+    def close(self):
+        """Close the stand-in, discarding its database."""
+        self._keeper.close()
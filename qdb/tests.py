@@ -1,15 +1,87 @@
 import arrow
+import numpy as np
 import os
+import threading
+import time
+import pytds
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from tempfile import TemporaryDirectory
 from decimal import Decimal
+from email.message import EmailMessage
 from io import StringIO
+from multiprocessing import get_context
+from smtplib import SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+from unittest import mock
+from django.contrib.auth.models import User
+from openpyxl import load_workbook
 from django.core.management import call_command
 from django.test import TestCase
-from qdb.models import CronJob, Staff, Unit, Account, Subcode, Recipient
+from django.utils import timezone
+from qdb.models import (
+    CronJob,
+    Staff,
+    Unit,
+    Account,
+    Subcode,
+    Recipient,
+    LedgerCache,
+    OutboxMessage,
+    ReportJob,
+    ReportRun,
+    UnitCheckpoint,
+)
 from .admin import RecipientAdmin
+from qdb.scripts import cache, checkpoints, outbox
+from qdb.scripts.jobs import enqueue_job, fail_stale_jobs
 from qdb.scripts.settings import DEFAULT_RECIPIENTS, REPORTS_DIR
-from qdb.scripts.formatter import calculate_fiscal_year_remainder
-from qdb.scripts.orchestrator import Orchestrator
+from qdb.scripts.fetcher import (
+    get_qdb_batch_query,
+    get_qdb_data,
+    get_qdb_data_batch,
+    get_qdb_data_snapshot,
+    get_qdb_months_query,
+    get_qdb_snapshot,
+    get_qdb_snapshot_query,
+    partition_qdb_rows,
+)
+from qdb.management.commands.benchmark_formatter import (
+    compare_workbooks,
+    get_sample_data,
+)
+from qdb.scripts.formatter import (
+    calculate_fiscal_year_remainder,
+    generate_comparison_report,
+    generate_report,
+)
+from qdb.scripts.orchestrator import Orchestrator, UnitLog
 from qdb.scripts.parser import Parser
+from qdb.scripts.pool import ConnectionPool, PoolExhaustedError, qdb_pool
+from qdb.scripts.sender import MailSession, get_message, get_message_subject
+from qdb.scripts.snapshot import Snapshot
+from qdb.scripts.standin import StandinQDB
+
+
+def make_qdb_row(
+    yyyymm: str, account: str, cc: str, fund: str, sub_code: str, amount: str
+) -> dict:
+    """Make a QDB row as returned by the multi-month query."""
+    return {
+        "ledger_year_month": yyyymm,
+        "fau": f"{account} {cc} {fund} Fake account Fake fund",
+        "sub_code": sub_code,
+        "account_number": account,
+        "cost_center_code": cc,
+        "fund_number": fund,
+        "account_title": "Fake account",
+        "fund_title": "Fake fund",
+        "ytd_approp": Decimal("1000.00"),
+        "ytd_expense": Decimal("1000.00") - Decimal(amount),
+        "encumbrance": Decimal("0"),
+        "memo_lien": Decimal("0.5"),
+        "operating_bal_am": Decimal(amount),
+    }
 
 
 class AdminTestCase(TestCase):
@@ -84,6 +156,402 @@ class FormatterTest(TestCase):
         self.assertEqual(calculate_fiscal_year_remainder(1), "42%")
         self.assertEqual(calculate_fiscal_year_remainder(6), "0%")
 
+    def test_write_only_report_is_identical(self):
+        data = get_sample_data(accounts=2, funds=3)
+        with TemporaryDirectory() as tmpdir:
+            normal = os.path.join(tmpdir, "normal.xlsx")
+            write_only = os.path.join(tmpdir, "write_only.xlsx")
+            generate_report(data, normal)
+            generate_report(data, write_only, write_only=True)
+            self.assertEqual(compare_workbooks(normal, write_only), [])
+
+    def test_compare_workbooks_finds_differences(self):
+        data = get_sample_data(accounts=1, funds=2)
+        with TemporaryDirectory() as tmpdir:
+            first = os.path.join(tmpdir, "first.xlsx")
+            second = os.path.join(tmpdir, "second.xlsx")
+            generate_report(data, first)
+            data["unit"] = "Another unit"
+            generate_report(data, second, write_only=True)
+            self.assertEqual(
+                compare_workbooks(first, second), ["606000-LM!G1: value differs"]
+            )
+
+    def test_report_builds_in_spawned_process(self):
+        # Orchestrator.run_parallel() builds reports in spawned processes,
+        # which don't set up Django, so the formatter mustn't need it.
+        data = get_sample_data(accounts=1, funds=2)
+        with (
+            TemporaryDirectory() as tmpdir,
+            ProcessPoolExecutor(
+                max_workers=1, mp_context=get_context("spawn")
+            ) as processes,
+        ):
+            filename = os.path.join(tmpdir, "report.xlsx")
+            processes.submit(generate_report, data, filename, True).result()
+            self.assertEqual(load_workbook(filename).sheetnames, ["606000-LM"])
+
+    def test_benchmark_formatter(self):
+        out = StringIO()
+        call_command("benchmark_formatter", accounts=1, funds=2, repeat=1, stdout=out)
+        self.assertIn("Reports are identical", out.getvalue())
+
+
+class FetcherTest(TestCase):
+    def test_batch_query_placeholders(self):
+        query = get_qdb_batch_query(3)
+        self.assertIn("(VALUES (%s, %s), (%s, %s), (%s, %s))", query)
+        # 3 pairs plus ledger_year_month
+        self.assertEqual(query.count("%s"), 7)
+        self.assertNotIn("fye_proc_ind", query)
+        self.assertIn("fye_proc_ind", get_qdb_batch_query(3, is_fye=True))
+
+    def test_months_query_placeholders(self):
+        query = get_qdb_months_query(3, 2)
+        self.assertIn("glb.ledger_year_month IN (%s, %s)", query)
+        # 3 pairs plus 2 months
+        self.assertEqual(query.count("%s"), 8)
+        # Months are returned, grouped and ordered
+        self.assertEqual(query.count("glb.ledger_year_month\n"), 2)
+        self.assertIn("ORDER BY glb.ledger_year_month, fau", query)
+
+    def test_snapshot_query_has_no_account_filter(self):
+        query = get_qdb_snapshot_query(1)
+        self.assertNotIn("INNER JOIN (VALUES", query)
+        self.assertIn("glb.dept_code_account LIKE '54%%'", query)
+        self.assertEqual(query.count("%s"), 1)
+
+    def test_snapshot_without_month_is_an_error(self):
+        snapshot = Snapshot.from_rows(
+            [make_qdb_row("202101", "606000", "AD", "19900", "03", "1")]
+        )
+        with self.assertRaisesRegex(ValueError, "no data for 202102"):
+            get_qdb_data_snapshot(snapshot, "202102", [("606000", ["AD"])])
+
+    def test_partition_rows(self):
+        rows = [
+            {"account_number": acct, "cost_center_code": cc, "fau": f"{acct} {cc}"}
+            for acct, cc in [
+                ("606000", "AD"),
+                ("606000", "LM"),
+                ("606000", "LB"),
+                ("606001", "AD"),
+                ("606002", "ZZ"),
+            ]
+        ]
+        accounts = [("606000", ["AD", "LB"]), ("606000", ["LM"]), ("606001", ["AD"])]
+        partitions = partition_qdb_rows(rows, accounts)
+        self.assertEqual(
+            [row["fau"] for row in partitions[("606000", ("AD", "LB"))]],
+            ["606000 AD", "606000 LB"],
+        )
+        self.assertEqual(len(partitions[("606000", ("LM",))]), 1)
+        self.assertEqual(len(partitions[("606001", ("AD",))]), 1)
+        # Rows for accounts not requested are dropped
+        self.assertEqual(len(partitions), 3)
+
+    def test_partition_rows_empty_account(self):
+        partitions = partition_qdb_rows([], [("606000", ["AD"])])
+        self.assertEqual(partitions, {("606000", ("AD",)): []})
+
+
+class SnapshotTest(TestCase):
+    def setUp(self):
+        self.rows = [
+            make_qdb_row("202101", "606000", "AD", "19900", "03", "12.34"),
+            make_qdb_row("202101", "606000", "AD", "19900", "05", "-7"),
+            make_qdb_row("202102", "606000", "AD", "19900", "03", "1.5"),
+            make_qdb_row("202101", "606001", "LM", "30000", "05", "99.99"),
+        ]
+
+    def test_rows_are_returned_by_month(self):
+        snapshot = Snapshot.from_rows(self.rows)
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.months, ["202101", "202102"])
+        expected = [row for row in self.rows if row["ledger_year_month"] == "202101"]
+        self.assertEqual(snapshot.get_rows("202101"), expected)
+        self.assertEqual(snapshot.get_rows("202103"), [])
+
+    def test_saved_snapshot_is_the_same(self):
+        with TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "snapshot.npz")
+            Snapshot.from_rows(self.rows).save(filename)
+            snapshot = Snapshot.load(filename)
+        self.assertEqual(snapshot.get_rows("202102"), self.rows[2:3])
+        amount = snapshot.get_rows("202101")[0]["operating_bal_am"]
+        self.assertEqual(type(amount), Decimal)
+        self.assertEqual(str(amount), "12.34")
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise pytds.OperationalError("Connection lost")
+        self.conn.queries.append(query)
+
+    def fetchall(self):
+        return [{"conn": self.conn.number}]
+
+
+class FakeConnection:
+    count = 0
+
+    def __init__(self):
+        FakeConnection.count += 1
+        self.number = FakeConnection.count
+        self.broken = False
+        self.closed = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class StandinTest(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        self.accounts = [("606000", ["AD", "LB"]), ("606001", ["LM"])]
+        self.standin = StandinQDB(self.accounts, ["202105", "202106"], funds=3)
+        self.addCleanup(self.standin.close)
+
+    def test_queries_get_the_same_rows(self):
+        with mock.patch(
+            "qdb.scripts.fetcher.qdb_pool", ConnectionPool(self.standin.connect)
+        ):
+            rows = get_qdb_data("202106", "606000", ["AD", "LB"])
+            batch_rows = get_qdb_data_batch("202106", self.accounts)
+            snapshot = get_qdb_snapshot(["202105", "202106"])
+        self.assertEqual(rows, batch_rows[("606000", ("AD", "LB"))])
+        snapshot_rows = get_qdb_data_snapshot(snapshot, "202106", self.accounts)
+        for account_rows in snapshot_rows.values():
+            for row in account_rows:
+                del row["ledger_year_month"]
+        self.assertEqual(snapshot_rows, batch_rows)
+        # Closed funds are left out
+        self.assertEqual(
+            {row["fund_number"] for row in rows}, {"19900", "30001", "30002"}
+        )
+        self.assertEqual(type(rows[0]["operating_bal_am"]), Decimal)
+
+    def test_failures_are_connection_errors(self):
+        self.standin.failure_rate = 1
+        pool = ConnectionPool(self.standin.connect)
+        with self.assertRaises(pytds.OperationalError):
+            pool.fetchall("SELECT 1")
+        self.assertEqual(self.standin.stats, {"queries": 1, "failures": 1})
+
+    def test_benchmark_reporter(self):
+        out = StringIO()
+        call_command("benchmark_qdb_reporter", unit=27, funds=2, latency=0, stdout=out)
+        self.assertIn("1 units", out.getvalue())
+        self.assertIn("1 generated, 0 empty, 0 failed", out.getvalue())
+        self.assertFalse(LedgerCache.objects.exists())
+
+
+class SenderTest(TestCase):
+    def setUp(self):
+        self.message = EmailMessage()
+        self.message["Subject"] = "Test"
+        self.message.set_content("Test")
+        patcher = mock.patch("qdb.scripts.sender.SMTP")
+        self.smtp = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.servers = [mock.MagicMock(), mock.MagicMock()]
+        self.smtp.side_effect = self.servers
+
+    def test_connection_is_reused(self):
+        with MailSession() as session:
+            session.send(self.message, ["a@example.com"])
+            session.send(self.message, ["b@example.com"])
+        self.assertEqual(self.smtp.call_count, 1)
+        self.assertEqual(self.servers[0].send_message.call_count, 2)
+        self.servers[0].quit.assert_called_once()
+
+    def test_reconnects_after_disconnect(self):
+        self.servers[0].send_message.side_effect = SMTPServerDisconnected()
+        with self.assertLogs("qdb.scripts.sender", level="WARNING"):
+            with MailSession(retry_delay=0) as session:
+                session.send(self.message, ["a@example.com"])
+        self.assertEqual(self.smtp.call_count, 2)
+        self.servers[1].send_message.assert_called_once()
+
+    def test_permanent_error_is_not_retried(self):
+        self.servers[0].send_message.side_effect = SMTPRecipientsRefused({})
+        with MailSession(retry_delay=0) as session:
+            with self.assertRaises(SMTPRecipientsRefused):
+                session.send(self.message, ["a@example.com"])
+        self.assertEqual(self.smtp.call_count, 1)
+
+    def test_temporary_error_is_raised_after_retries(self):
+        self.smtp.side_effect = None
+        self.smtp.return_value.send_message.side_effect = SMTPResponseException(
+            451, "Try again later"
+        )
+        with self.assertLogs("qdb.scripts.sender", level="WARNING"):
+            with MailSession(retries=2, retry_delay=0) as session:
+                with self.assertRaises(SMTPResponseException):
+                    session.send(self.message, ["a@example.com"])
+        self.assertEqual(self.smtp.call_count, 3)
+
+    def test_report_is_attached(self):
+        message = get_message(
+            get_message_subject("January", 2021, "Fake unit"),
+            "Report attached",
+            ["a@example.com", "b@example.com"],
+            "Fake_unit_2021_01.xlsx",
+            b"workbook",
+        )
+        self.assertEqual(message["Subject"], "January 2021 Financial Report: Fake unit")
+        self.assertEqual(message["To"], "a@example.com, b@example.com")
+        attachment = next(message.iter_attachments())
+        self.assertEqual(attachment.get_filename(), "Fake_unit_2021_01.xlsx")
+        self.assertEqual(attachment.get_content(), b"workbook")
+
+
+class LedgerCacheTest(TestCase):
+    def setUp(self):
+        self.rows = [
+            {
+                "account_number": "606000",
+                "cost_center_code": "AD",
+                "sub_code": "03",
+                "ytd_approp": Decimal("100.50"),
+                "ytd_expense": Decimal("50.25"),
+                "encumbrance": Decimal("0.00"),
+                "memo_lien": Decimal("0.00"),
+                "operating_bal_am": Decimal("50.25"),
+            }
+        ]
+        self.key = ("606000", ("AD", "LB"))
+        self.accounts = [("606000", ["AD", "LB"])]
+
+    def test_cached_rows_are_returned(self):
+        cache.store_rows("202101", {self.key: self.rows})
+        cached_rows = cache.get_cached_rows("202101", self.accounts)
+        self.assertEqual(cached_rows, {self.key: self.rows})
+        self.assertEqual(type(cached_rows[self.key][0]["ytd_approp"]), Decimal)
+        self.assertEqual(LedgerCache.objects.get().hits, 1)
+
+    def test_other_keys_are_not_returned(self):
+        cache.store_rows("202101", {self.key: self.rows})
+        self.assertEqual(cache.get_cached_rows("202102", self.accounts), {})
+        self.assertEqual(cache.get_cached_rows("202101", [("606000", ["AD"])]), {})
+
+    def test_current_month_is_not_cached(self):
+        yyyymm = arrow.now().format("YYYYMM")
+        cache.store_rows(yyyymm, {self.key: self.rows})
+        self.assertEqual(LedgerCache.objects.count(), 0)
+
+    def test_expired_rows_are_not_returned(self):
+        cache.store_rows("202101", {self.key: self.rows})
+        LedgerCache.objects.update(created=arrow.now().shift(days=-30).datetime)
+        self.assertEqual(cache.get_cached_rows("202101", self.accounts), {})
+        # Removed the next time anything is cached
+        cache.store_rows("202102", {self.key: self.rows})
+        self.assertEqual(LedgerCache.objects.get().yyyymm, "202102")
+
+    def test_least_recently_used_are_evicted(self):
+        with mock.patch.object(cache, "QDB_CACHE_MAX_ENTRIES", 2):
+            for yyyymm in ["202101", "202102", "202103"]:
+                cache.store_rows(yyyymm, {self.key: self.rows})
+        self.assertEqual(
+            sorted(LedgerCache.objects.values_list("yyyymm", flat=True)),
+            ["202102", "202103"],
+        )
+
+
+class ConnectionPoolTest(TestCase):
+    def test_connection_is_reused(self):
+        pool = ConnectionPool(FakeConnection)
+        first = pool.fetchall("SELECT 'first'")
+        second = pool.fetchall("SELECT 'second'")
+        self.assertEqual(first, second)
+        self.assertEqual(pool.stats["misses"], 1)
+        self.assertEqual(pool.stats["hits"], 1)
+
+    def test_idle_connection_is_closed(self):
+        pool = ConnectionPool(FakeConnection, idle_timeout=-1)
+        first = pool.fetchall("SELECT 'first'")
+        second = pool.fetchall("SELECT 'second'")
+        self.assertNotEqual(first, second)
+        self.assertEqual(pool.stats["misses"], 2)
+        self.assertEqual(pool.stats["discarded"], 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        pool = ConnectionPool(FakeConnection, check_after=-1)
+        with pool.connection() as conn:
+            pass
+        conn.broken = True
+        with pool.connection() as new_conn:
+            self.assertIsNot(conn, new_conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats["misses"], 2)
+
+    def test_broken_connection_reconnects(self):
+        pool = ConnectionPool(FakeConnection)
+        with pool.connection() as conn:
+            pass
+        # Not caught by the health check, only when the query runs.
+        conn.broken = True
+        rows = pool.fetchall("SELECT 1")
+        self.assertNotEqual(rows, [{"conn": conn.number}])
+        self.assertEqual(pool.stats["reconnects"], 1)
+
+    def test_new_connection_error_is_raised(self):
+        def broken_connect():
+            conn = FakeConnection()
+            conn.broken = True
+            return conn
+
+        pool = ConnectionPool(broken_connect)
+        with self.assertRaises(pytds.OperationalError):
+            pool.fetchall("SELECT 1")
+        self.assertEqual(pool.stats["reconnects"], 0)
+
+    def test_health_check_error_releases_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, check_after=-1)
+        with pool.connection():
+            pass
+        with mock.patch.object(pool, "_is_healthy", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                pool.fetchall("SELECT 1")
+        # The slot is free again, for a new connection
+        self.assertEqual(pool.stats["discarded"], 1)
+        self.assertEqual(len(pool.fetchall("SELECT 1")), 1)
+
+    def test_stale_connections_are_closed_on_release(self):
+        pool = ConnectionPool(FakeConnection, idle_timeout=60)
+        first, _ = pool._acquire()
+        with pool.connection() as second:
+            pass
+        # When first is returned, second has been idle too long
+        later = time.monotonic() + 61
+        with mock.patch("qdb.scripts.pool.time.monotonic", return_value=later):
+            pool._release(first)
+        self.assertTrue(second.closed)
+        self.assertFalse(first.closed)
+
+    def test_max_size(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, wait_timeout=0)
+        with pool.connection():
+            with self.assertRaises(PoolExhaustedError):
+                pool.fetchall("SELECT 1")
+        # Available again once returned
+        self.assertEqual(len(pool.fetchall("SELECT 1")), 1)
+
 
 class OrchestratorTest(TestCase):
     fixtures = ["sample_data.json"]
@@ -206,6 +674,285 @@ class OrchestratorTest(TestCase):
                     with self.subTest(i=cc):
                         self.assertTrue(len(cc) == 2)
 
+    def test_run_unit_with_fetched_rows(self):
+        unit = Unit.objects.get(id=27)
+        accounts = self.orch.get_accounts_for_unit(unit.id)
+        account, cc_list = accounts[0]
+        rows_by_account = {(acct, tuple(ccs)): [] for acct, ccs in accounts}
+        rows_by_account[(account, tuple(cc_list))] = [
+            {
+                "account_number": account,
+                "cost_center_code": cc_list[0],
+                "fund_number": "12345",
+                "account_title": "Fake account",
+                "fund_title": "Fake fund",
+                "sub_code": "03",
+                "ytd_approp": Decimal("100.00"),
+                "ytd_expense": Decimal("50.00"),
+                "encumbrance": Decimal("0.00"),
+                "memo_lien": Decimal("0.00"),
+                "operating_bal_am": Decimal("50.00"),
+            }
+        ]
+        built = []
+        unit_log = UnitLog()
+        outcome = self.orch.run_unit(
+            "202101",
+            unit,
+            [],
+            accounts,
+            unit_log,
+            rows_by_account=rows_by_account,
+            build_report=lambda data, filename: built.append((data, filename)),
+        )
+        self.assertEqual(outcome, "generated")
+        self.assertEqual(len(built), 1)
+        data, filename = built[0]
+        self.assertEqual(len(data["accounts"]), 1)
+        self.assertEqual(filename, self.orch.generate_filename(unit.name, "202101"))
+        # Messages are held until flushed: one per account, one per account
+        # with no data, plus the final one.
+        self.assertEqual(len(unit_log.records), 2 * len(accounts))
+        with self.assertLogs("qdb.scripts.orchestrator", level="INFO"):
+            unit_log.flush()
+        self.assertEqual(unit_log.records, [])
+
+    def test_run_comparison(self):
+        unit = Unit.objects.get(id=27)
+        account, cc_list = self.orch.get_accounts_for_unit(unit.id)[0]
+        rows = [
+            make_qdb_row(month, account, cc_list[0], "12345", "03", amount)
+            for month, amount in [
+                ("202011", "300"),
+                ("202012", "200"),
+                ("202101", "50"),
+            ]
+        ]
+        with TemporaryDirectory() as tmpdir:
+            orch = Orchestrator(tmpdir, [])
+            snapshot_file = os.path.join(tmpdir, "snapshot.npz")
+            with mock.patch(
+                "qdb.scripts.fetcher.qdb_pool.fetchall", return_value=rows
+            ) as fetchall:
+                filename = orch.run_comparison(
+                    "202101", 3, unit, save_snapshot=snapshot_file
+                )
+            # All months in one query
+            fetchall.assert_called_once()
+            self.assertEqual(
+                fetchall.call_args.args[1][-3:], ["202011", "202012", "202101"]
+            )
+            self.assertEqual(
+                Snapshot.load(snapshot_file).months, ["202011", "202012", "202101"]
+            )
+            ws = load_workbook(filename)["Comparison"]
+            headers = [cell.value for cell in ws[4]]
+            self.assertEqual(
+                headers,
+                [
+                    "FAU",
+                    "Fund title",
+                    "Sub",
+                    "Nov 2020",
+                    "Dec 2020",
+                    "Change",
+                    "Jan 2021",
+                    "Change",
+                ],
+            )
+            self.assertEqual(
+                [cell.value for cell in ws[5]][3:], [300, 200, -100, 50, -150]
+            )
+
+    def test_comparison_with_fau_only_in_first_month(self):
+        months = []
+        for yyyymm, funds in [
+            ("202011", ["19900", "12345"]),
+            ("202012", ["19900"]),
+            ("202101", ["19900"]),
+        ]:
+            parser = Parser(yyyymm, "Fake unit")
+            parser.add_account(
+                1,
+                "606000",
+                ["AD"],
+                [
+                    make_qdb_row(yyyymm, "606000", "AD", fund, "03", "50")
+                    for fund in funds
+                ],
+            )
+            months.append(parser)
+        changes = [
+            later.get_changes(earlier.data)
+            for earlier, later in zip(months, months[1:])
+        ]
+        with TemporaryDirectory() as tmpdir:
+            filename = generate_comparison_report(
+                [parser.data for parser in months],
+                changes,
+                os.path.join(tmpdir, "comparison.xlsx"),
+            )
+            ws = load_workbook(filename)["Comparison"]
+            rows = {
+                (row[0], row[2]): row[3:]
+                for row in ws.iter_rows(min_row=5, values_only=True)
+            }
+        self.assertEqual(rows[("606000-AD-12345", "03")], (50, None, -50, None, None))
+
+    def test_run_from_snapshot(self):
+        unit = Unit.objects.get(id=27)
+        account, cc_list = self.orch.get_accounts_for_unit(unit.id)[0]
+        rows = [
+            make_qdb_row("202101", account, cc_list[0], "12345", "03", "50"),
+            # Not one of this unit's accounts
+            make_qdb_row("202101", "999999", "XX", "12345", "03", "50"),
+        ]
+        with TemporaryDirectory() as tmpdir:
+            with mock.patch("qdb.scripts.fetcher.qdb_pool.fetchall", return_value=rows):
+                call_command(
+                    "snapshot_qdb",
+                    month="202101",
+                    output=os.path.join(tmpdir, "snapshot.npz"),
+                    stdout=StringIO(),
+                )
+            snapshot = Snapshot.load(os.path.join(tmpdir, "snapshot.npz"))
+            self.assertEqual(len(snapshot), 2)
+            orch = Orchestrator(tmpdir, [])
+            with mock.patch("qdb.scripts.fetcher.qdb_pool.fetchall") as fetchall:
+                orch.run("202101", [unit], override_recipients=[], snapshot=snapshot)
+            fetchall.assert_not_called()
+            self.assertTrue(os.path.exists(orch.generate_filename(unit.name, "202101")))
+            self.assertEqual(cache.get_cached_rows("202101", [(account, cc_list)]), {})
+
+    def test_pipeline_overlaps_units(self):
+        units = [Unit.objects.get(id=21), Unit.objects.get(id=27)]
+        unit_plans = [
+            (unit, [], self.orch.get_accounts_for_unit(unit.id)) for unit in units
+        ]
+        fetching_second_unit = threading.Event()
+
+        def get_qdb_data(yyyymm, account, cc_list):
+            if (account, cc_list) in unit_plans[1][2]:
+                fetching_second_unit.set()
+            return [make_qdb_row(yyyymm, account, cc_list[0], "12345", "03", "50")]
+
+        def build_report(data, filename):
+            # Run one after the other, the second unit would not be
+            # fetched until the first unit's report is built.
+            self.assertTrue(fetching_second_unit.wait(timeout=10))
+            built.append(filename)
+
+        built = []
+        done = []
+        with mock.patch("qdb.scripts.fetcher.get_qdb_data", side_effect=get_qdb_data):
+            failures = self.orch.run_pipeline(
+                "202101",
+                unit_plans,
+                False,
+                {},
+                Counter(),
+                on_unit_done=lambda unit, outcome: done.append((unit, outcome)),
+                build_report=build_report,
+            )
+        self.assertEqual(failures, [])
+        self.assertEqual(done, [(unit, "generated") for unit in units])
+        self.assertEqual(
+            built, [self.orch.generate_filename(unit.name, "202101") for unit in units]
+        )
+
+    def test_pipeline_failure_skips_only_its_unit(self):
+        units = [Unit.objects.get(id=21), Unit.objects.get(id=27)]
+        unit_plans = [
+            (unit, [], self.orch.get_accounts_for_unit(unit.id)) for unit in units
+        ]
+        rows = [make_qdb_row("202101", "606000", "AD", "12345", "03", "50")]
+        outcomes = Counter()
+        with (
+            mock.patch(
+                "qdb.scripts.fetcher.get_qdb_data",
+                side_effect=[Exception("QDB down")] + [rows] * 100,
+            ),
+            self.assertLogs("qdb.scripts.orchestrator", level="ERROR"),
+        ):
+            failures = self.orch.run_pipeline(
+                "202101",
+                unit_plans,
+                False,
+                {},
+                outcomes,
+                build_report=lambda data, filename: None,
+            )
+        self.assertEqual([str(failure) for failure in failures], ["QDB down"])
+        self.assertEqual(outcomes, Counter(failed=1, generated=1))
+
+    def test_parallel_run_isolates_failures(self):
+        units = [Unit.objects.get(id=unit_id) for unit_id in (21, 6, 5)]
+        accounts = [
+            account
+            for unit in units
+            for account in self.orch.get_accounts_for_unit(unit.id)
+        ]
+        standin = StandinQDB(accounts, ["202101"], funds=2)
+        self.addCleanup(standin.close)
+        self.addCleanup(qdb_pool.close_all)
+        real_get_qdb_data = get_qdb_data
+
+        def get_unit_6_fails(yyyymm: str, account: str, cc_list: list[str]) -> list:
+            if account == "600300":
+                raise pytds.OperationalError("QDB down")
+            return real_get_qdb_data(yyyymm, account, cc_list)
+
+        done = []
+        max_size = qdb_pool.max_size
+        with (
+            TemporaryDirectory() as tmpdir,
+            mock.patch.object(qdb_pool, "connect", standin.connect),
+            mock.patch(
+                "qdb.scripts.fetcher.get_qdb_data", side_effect=get_unit_6_fails
+            ),
+            self.assertLogs("qdb.scripts.orchestrator", level="INFO") as logs,
+        ):
+            with self.assertRaisesRegex(pytds.OperationalError, "QDB down"):
+                Orchestrator(tmpdir, []).run(
+                    "202101",
+                    units,
+                    override_recipients=[],
+                    workers=max_size + 1,
+                    refresh=True,
+                    on_unit_done=lambda unit, outcome: done.append((unit, outcome)),
+                )
+            # Workbooks are built in spawned processes
+            self.assertEqual(len(os.listdir(tmpdir)), 2)
+        self.assertEqual(
+            done,
+            [(units[0], "generated"), (units[1], "failed"), (units[2], "generated")],
+        )
+        self.assertEqual(qdb_pool.max_size, max_size)
+        # Each unit's messages are logged together, in unit order
+        logged_units = []
+        for message in logs.output:
+            for unit in units:
+                if message.endswith(f"for unit {unit.name}") and (
+                    not logged_units or logged_units[-1] != unit
+                ):
+                    logged_units.append(unit)
+        self.assertEqual(logged_units, units)
+
+    def test_run_reports_each_unit_when_done(self):
+        units = [Unit.objects.get(id=21), Unit.objects.get(id=27)]
+        done = []
+        with mock.patch.object(
+            Orchestrator, "run_unit", side_effect=["generated", Exception("QDB down")]
+        ):
+            with self.assertRaisesRegex(Exception, "QDB down"):
+                self.orch.run(
+                    "202101",
+                    units,
+                    override_recipients=[],
+                    on_unit_done=lambda unit, outcome: done.append((unit, outcome)),
+                )
+        self.assertEqual(done, [(units[0], "generated"), (units[1], "failed")])
+
 
 class ParserTest(TestCase):
     def setUp(self):
@@ -236,38 +983,79 @@ class ParserTest(TestCase):
         self.assertEqual(actual, Decimal(0.00))
 
     def test_calculate_totals(self):
-        subs = {
-            "01": {
-                "Amount": Decimal("496804.04"),
-                "Appropriation": Decimal("1195663.83"),
-                "Encumbrance": Decimal("0"),
-                "Expense": Decimal("698859.79"),
-                "Memo Lien": Decimal("0"),
-                "Percent": Decimal("41.55047828117373091398106439"),
-            },
-            "02": {
-                "Amount": Decimal("-39603.08"),
-                "Appropriation": Decimal("0"),
-                "Encumbrance": Decimal("0"),
-                "Expense": Decimal("39603.08"),
-                "Memo Lien": Decimal("0"),
-                "Percent": Decimal("0"),
-            },
-            "03": {
-                "Amount": Decimal("14474.57"),
-                "Appropriation": Decimal("27105.05"),
-                "Encumbrance": Decimal("44.1"),
-                "Expense": Decimal("12586.38"),
-                "Memo Lien": Decimal("0"),
-                "Percent": Decimal("53.40174616907181503077839738"),
-            },
-        }
-        totals = self.parser.calculate_totals(subs)
-        self.assertAlmostEqual(totals["Amount"], Decimal(471675.53), places=2)
-        self.assertAlmostEqual(totals["Appropriation"], Decimal(1222768.88), places=2)
-        self.assertAlmostEqual(totals["Encumbrance"], Decimal(44.10), places=2)
-        self.assertAlmostEqual(totals["Expense"], Decimal(751049.25), places=2)
-        self.assertAlmostEqual(totals["Memo Lien"], Decimal(0), places=2)
+        # Subcodes 01, 02 and 03, in cents: Appropriation, Expense,
+        # Encumbrance, Memo Lien, Amount
+        amounts = np.array(
+            [
+                [119566383, 69885979, 0, 0, 49680404],
+                [0, 3960308, 0, 0, -3960308],
+                [2710505, 1258638, 4410, 0, 1447457],
+            ],
+            dtype=np.int64,
+        )
+        totals = self.parser.calculate_totals(amounts, [3])
+        self.assertEqual(totals.tolist(), [[122276888, 75104925, 4410, 0, 47167553]])
+        # Subcodes 01 and 02 of one FAU, and 03 of another
+        totals = self.parser.calculate_totals(amounts, [2, 1])
+        self.assertEqual(
+            totals.tolist(),
+            [
+                [119566383, 73846287, 0, 0, 45720096],
+                [2710505, 1258638, 4410, 0, 1447457],
+            ],
+        )
+
+    def test_calculate_percents_left(self):
+        amounts = np.array(
+            [[10000, 0, 0, 0, 5000], [0, 0, 0, 0, 5000], [10000, 0, 0, 0, -5000]]
+        )
+        percents = self.parser.calculate_percents_left(amounts)
+        self.assertEqual(percents.tolist(), [0.5, 0, 0])
+
+    def test_add_account(self):
+        rows = [
+            make_qdb_row("202101", "606000", "AD", "19900", "02", "25"),
+            make_qdb_row("202101", "606000", "AD", "19900", "03", "50"),
+            make_qdb_row("202101", "606000", "AD", "12345", "03", "10"),
+        ]
+        self.assertTrue(self.parser.add_account(1, "606000", ["AD"], rows))
+        funds = self.parser.data["accounts"][0]["funds"]
+        self.assertEqual(
+            [fund.fau for fund in funds], ["606000-AD-19900", "606000-AD-12345"]
+        )
+        self.assertEqual(funds[0].sub_codes, ["02", "03"])
+        self.assertEqual(funds[0].totals.tolist(), [200000, 192500, 0, 100, 7500])
+        self.assertEqual(funds[0].percents.tolist(), [0.025, 0.05])
+        self.assertEqual(self.parser.data["sub02s"], [funds[0]])
+        amounts = funds[1].get_amounts()
+        self.assertEqual(amounts["03"]["Amount"], Decimal("10.00"))
+        self.assertEqual(amounts["totals"]["Expense"], Decimal("990.00"))
+
+    def test_get_changes(self):
+        earlier = Parser("202101", "Fake unit")
+        earlier.add_account(
+            1,
+            "606000",
+            ["AD"],
+            [
+                make_qdb_row("202101", "606000", "AD", "19900", "03", "100"),
+                make_qdb_row("202101", "606000", "AD", "19900", "05", "20"),
+            ],
+        )
+        later = Parser("202102", "Fake unit")
+        later.add_account(
+            1,
+            "606000",
+            ["AD"],
+            [make_qdb_row("202102", "606000", "AD", "19900", "03", "60")],
+        )
+        changes = later.get_changes(earlier.data)
+        fau_changes = changes["606000-AD-19900"]
+        self.assertEqual(fau_changes["03"]["Amount"], Decimal(-40))
+        self.assertEqual(fau_changes["03"]["Expense"], Decimal(40))
+        # Subcode 05 is missing from the later month
+        self.assertEqual(fau_changes["05"]["Amount"], Decimal(-20))
+        self.assertEqual(fau_changes["totals"]["Amount"], Decimal(-60))
 
     def test_omits_all_zeroes(self):
         row = {
@@ -340,6 +1128,314 @@ class ParserTest(TestCase):
         self.assertTrue(self.parser.exclude_ftva_aul_row(unit_id=35, row=row))
 
 
+class OutboxTest(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        self.unit = Unit.objects.get(id=27)
+        self.data = {"month_name": "January", "year": 2021, "unit": self.unit.name}
+        self.data["accounts"] = [{"account": "606000"}]
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.orch = Orchestrator(tmpdir.name, [])
+        self.filename = self.orch.generate_filename(self.unit.name, "202101")
+
+    def enqueue(self, recipients: list[str] | None = None) -> OutboxMessage:
+        with open(self.filename, "wb") as f:
+            f.write(b"workbook")
+        return outbox.enqueue_report(
+            self.unit,
+            "202101",
+            self.data,
+            self.filename,
+            recipients or ["a@example.com"],
+        )
+
+    def test_report_is_stored(self):
+        first = self.enqueue()
+        message = self.enqueue()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertEqual(bytes(message.attachment), b"workbook")
+        self.assertEqual(message.subject, f"January 2021 Financial Report: {self.unit}")
+        # The unsent message is replaced
+        self.assertFalse(OutboxMessage.objects.filter(id=first.id).exists())
+
+    def test_override_run_keeps_production_message(self):
+        production = self.enqueue(["b@example.com", "a@example.com"])
+        preview = self.enqueue(["me@example.com"])
+        self.assertTrue(OutboxMessage.objects.filter(id=production.id).exists())
+        # Rerunning the production email replaces only its own message
+        self.enqueue(["a@example.com", "b@example.com"])
+        self.assertFalse(OutboxMessage.objects.filter(id=production.id).exists())
+        self.assertTrue(OutboxMessage.objects.filter(id=preview.id).exists())
+        self.assertEqual(OutboxMessage.objects.filter(unit=self.unit).count(), 2)
+
+    def test_message_is_sent_once(self):
+        message = self.enqueue()
+        session = mock.Mock()
+        self.assertTrue(outbox.deliver(message, session))
+        self.assertFalse(outbox.deliver(message, session))
+        session.send.assert_called_once()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.SENT)
+        self.assertEqual(bytes(message.attachment), b"")
+
+    def test_failed_message_is_retried_later(self):
+        message = self.enqueue()
+        session = mock.Mock()
+        session.send.side_effect = SMTPServerDisconnected("Relay down")
+        with self.assertLogs("qdb.scripts.outbox", level="WARNING"):
+            self.assertFalse(outbox.deliver(message, session))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.error, "Relay down")
+        # Not due yet
+        self.assertEqual(outbox.deliver_due(session), Counter())
+        with (
+            mock.patch("qdb.scripts.outbox.OUTBOX_MAX_ATTEMPTS", 2),
+            self.assertLogs("qdb.scripts.outbox", level="ERROR"),
+        ):
+            outbox.deliver_due(session, resume=True)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+
+    def test_stale_messages_are_failed(self):
+        message = self.enqueue()
+        outbox.claim_message(message)
+        self.assertEqual(outbox.fail_stale_messages(), 0)
+        OutboxMessage.objects.filter(id=message.id).update(
+            next_attempt=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(outbox.fail_stale_messages(), 1)
+
+    def test_resume_sends_only_unsent_reports(self):
+        rows = [make_qdb_row("202101", "606000", "AD", "19900", "03", "50")]
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data", return_value=rows),
+            mock.patch.object(
+                MailSession, "send", side_effect=SMTPServerDisconnected("Relay down")
+            ),
+            self.assertLogs("qdb.scripts.outbox", level="WARNING"),
+        ):
+            self.orch.run(
+                "202101",
+                [self.unit],
+                send_email=True,
+                override_recipients=["a@example.com"],
+                refresh=True,
+                on_unit_done=lambda unit, outcome: self.assertEqual(outcome, "queued"),
+            )
+        self.assertFalse(os.path.exists(self.filename))
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data") as get_qdb_data,
+            mock.patch.object(MailSession, "send") as send,
+        ):
+            call_command(
+                "run_qdb_reporter", year=2021, month=1, unit=self.unit.id, resume=True
+            )
+        get_qdb_data.assert_not_called()
+        send.assert_called_once()
+        self.assertEqual(
+            OutboxMessage.objects.get(unit=self.unit).status, OutboxMessage.SENT
+        )
+
+
+class CheckpointTest(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        self.units = [Unit.objects.get(id=21), Unit.objects.get(id=27)]
+        self.rows = [make_qdb_row("202101", "606000", "AD", "19900", "03", "50")]
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.orch = Orchestrator(tmpdir.name, [])
+
+    def build_report(self, data: dict, filename: str, write_only: bool = False):
+        if data["unit"] == self.units[1].name:
+            raise OSError("Disk full")
+        with open(filename, "wb") as f:
+            f.write(b"workbook")
+
+    def run_reports(self, report_run: ReportRun):
+        self.orch.run(
+            "202101",
+            self.units,
+            override_recipients=[],
+            refresh=True,
+            report_run=report_run,
+        )
+
+    def test_start_run_continues_unfinished_run(self):
+        report_run = checkpoints.start_run(
+            "202101", self.units, override_recipients=["b", "a"]
+        )
+        self.assertEqual(
+            checkpoints.start_run(
+                "202101", self.units[::-1], override_recipients=["a", "b"]
+            ),
+            report_run,
+        )
+        self.assertNotEqual(checkpoints.start_run("202101", self.units), report_run)
+        restarted = checkpoints.start_run(
+            "202101", self.units, override_recipients=["a", "b"], restart=True
+        )
+        self.assertNotEqual(restarted, report_run)
+        report_run.refresh_from_db()
+        self.assertIsNotNone(report_run.finished)
+
+    def test_run_of_one_unit_leaves_run_of_all(self):
+        report_run = checkpoints.start_run("202101", self.units, override_recipients=[])
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data", return_value=self.rows),
+            mock.patch(
+                "qdb.scripts.formatter.generate_report", side_effect=self.build_report
+            ),
+            self.assertRaisesRegex(OSError, "Disk full"),
+        ):
+            self.run_reports(report_run)
+        one_unit = checkpoints.start_run(
+            "202101", self.units[:1], override_recipients=[]
+        )
+        self.assertNotEqual(one_unit, report_run)
+        with self.assertRaisesRegex(ValueError, "is for other units"):
+            self.orch.run("202101", self.units[:1], report_run=report_run)
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data", return_value=self.rows),
+            mock.patch("qdb.scripts.formatter.generate_report"),
+        ):
+            self.orch.run(
+                "202101",
+                self.units[:1],
+                override_recipients=[],
+                refresh=True,
+                report_run=one_unit,
+            )
+        report_run.refresh_from_db()
+        self.assertIsNone(report_run.finished)
+        self.assertTrue(report_run.account_checkpoints.exists())
+
+    def test_rerun_skips_finished_work(self):
+        report_run = checkpoints.start_run("202101", self.units, override_recipients=[])
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data", return_value=self.rows),
+            mock.patch(
+                "qdb.scripts.formatter.generate_report", side_effect=self.build_report
+            ),
+            self.assertRaisesRegex(OSError, "Disk full"),
+        ):
+            self.run_reports(report_run)
+        stages = dict(report_run.unit_checkpoints.values_list("unit_id", "stage"))
+        self.assertEqual(
+            stages, {21: UnitCheckpoint.RENDERED, 27: UnitCheckpoint.FETCHED}
+        )
+
+        # Unit 21 is skipped, and unit 27 is built from the rows already fetched.
+        self.assertEqual(
+            checkpoints.start_run("202101", self.units, override_recipients=[]),
+            report_run,
+        )
+        with (
+            mock.patch("qdb.scripts.fetcher.get_qdb_data") as get_qdb_data,
+            mock.patch("qdb.scripts.formatter.generate_report") as generate_report,
+        ):
+            self.run_reports(report_run)
+        get_qdb_data.assert_not_called()
+        generate_report.assert_called_once()
+        self.assertEqual(generate_report.call_args.args[0]["unit"], self.units[1].name)
+        report_run.refresh_from_db()
+        self.assertIsNotNone(report_run.finished)
+        self.assertFalse(report_run.account_checkpoints.exists())
+
+
+class ReportJobTest(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("tester"))
+        self.unit = Unit.objects.get(pk=21)
+
+    def run_worker(self, **kwargs):
+        with mock.patch.object(Orchestrator, "run", **kwargs) as run:
+            call_command("run_report_worker", "--once")
+        return run
+
+    def test_report_form_queues_job(self):
+        response = self.client.post(
+            "/qdb/report/",
+            {"unit": self.unit.id, "year": arrow.now().year, "month": 1},
+            headers={"x-requested-with": "XMLHttpRequest"},
+        )
+        job = ReportJob.objects.get()
+        self.assertEqual(response.json()["job_id"], job.id)
+        self.assertEqual(response.json()["status_url"], f"/qdb/report/status/{job.id}/")
+        self.assertEqual(job.status, ReportJob.QUEUED)
+        self.assertEqual((job.year, job.month), (arrow.now().year, 1))
+        self.assertIsNone(job.override_recipients)
+
+    def test_worker_runs_job_with_progress(self):
+        job = enqueue_job(self.unit, 2023, 5, override_recipients=["a@b.edu"])
+
+        def run(yyyymm, units, on_unit_done, **kwargs):
+            for unit in units:
+                on_unit_done(unit, "generated")
+
+        run_mock = self.run_worker(side_effect=run)
+        self.assertEqual(run_mock.call_args.args[0], "202305")
+        self.assertEqual(run_mock.call_args.kwargs["override_recipients"], ["a@b.edu"])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.SUCCEEDED)
+        self.assertEqual(job.total_units, 1)
+        self.assertEqual(job.progress, {self.unit.name: "generated"})
+
+        response = self.client.get(f"/qdb/report/status/{job.id}/")
+        data = response.json()
+        self.assertEqual(data["completed_units"], 1)
+        self.assertEqual(
+            data["messages"][0]["extra_tags"], f"{self.unit.name} alert-success"
+        )
+
+    def test_failed_job_shows_friendly_error(self):
+        job = enqueue_job(self.unit, 2023, 5)
+        with self.assertLogs("qdb.scripts.jobs", "ERROR"):
+            self.run_worker(side_effect=Exception("Login failed for user 'x'"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        data = self.client.get(f"/qdb/report/status/{job.id}/").json()
+        self.assertIn("Remote database not available", data["messages"][0]["message"])
+
+    def test_queued_job_has_no_messages(self):
+        job = enqueue_job(self.unit, 2023, 5)
+        data = self.client.get(f"/qdb/report/status/{job.id}/").json()
+        self.assertEqual(data["status"], ReportJob.QUEUED)
+        self.assertEqual(data["messages"], [])
+
+    def test_stale_jobs_are_failed(self):
+        job = enqueue_job(self.unit, 2023, 5)
+        ReportJob.objects.filter(id=job.id).update(
+            status=ReportJob.RUNNING, started=arrow.now().shift(days=-1).datetime
+        )
+        self.assertEqual(fail_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+
+    def test_failed_stale_job_stays_failed(self):
+        # The worker was only slow, and finishes after the job was failed.
+        job = enqueue_job(self.unit, 2023, 5)
+
+        def run(*args, **kwargs):
+            ReportJob.objects.filter(id=job.id).update(
+                started=arrow.now().shift(days=-1).datetime
+            )
+            fail_stale_jobs()
+
+        with self.assertLogs("qdb.scripts.jobs", "WARNING"):
+            self.run_worker(side_effect=run)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertEqual(job.error, "Report job did not finish in time")
+
+
 class CronTest(TestCase):
     def test_only_one_cron_record_is_created(self):
         # Fields have defaults, no need to specify values
@@ -3,6 +3,11 @@ from . import views
 
 urlpatterns = [
     path("qdb/report/", views.report),
+    path(
+        "qdb/report/status/<int:job_id>/",
+        views.report_status,
+        name="report_status",
+    ),
     path("qdb/logout/", views.logoutandlogin),
     path("qdb/cron/", views.crontab),
     path("", views.report),
@@ -1,16 +1,19 @@
 import json
 import logging
 from django.http import HttpRequest
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from django.http.response import HttpResponse
 from django.core.management import call_command
+from django.contrib.messages.storage.base import Message
 from django.contrib.auth.views import logout_then_login
 from django.contrib.auth.decorators import login_required
 
-from qdb.models import CronJob
+from qdb.models import CronJob, ReportJob
 from qdb.forms import CronForm, ReportForm
 from django.contrib import messages
 from django.utils.html import format_html
+from qdb.scripts.jobs import enqueue_job
 from qdb.scripts.settings import ENV
 
 logger = logging.getLogger(__name__)
@@ -26,8 +29,7 @@ def report(request: HttpRequest) -> HttpResponse:
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         form = ReportForm(request.POST or None)
         if form.is_valid():
-            unit = form.cleaned_data["unit"].id
-            unit_name = form.cleaned_data["unit"].name
+            unit = form.cleaned_data["unit"]
             year = form.cleaned_data["year"]
             month = form.cleaned_data["month"]
             send_email = form.cleaned_data["send_email"]
@@ -39,66 +41,27 @@ def report(request: HttpRequest) -> HttpResponse:
                 # Convert to list by splitting on space between addresses, if present
                 override_recipients = override_recipients.split()
 
-            try:
-                run_qdb_reporter(unit, month, year, send_email, override_recipients)
-                messages.success(
-                    request, "QDB report successfully generated.", extra_tags=unit_name
-                )
-            except Exception as e:
-                # Show the entire error stack for diagnosis.
-                logger.exception(e)
-                # Also capture a friendly representation and check it for specifics.
-                exception_message = str(e)
-                logger.error(exception_message)
-                if "Login failed for user" in exception_message:
-                    messages.error(
-                        request,
-                        format_html(
-                            "Remote database not available: no report could be generated."
-                            "<br>-----"
-                            "<br>Please try again later as this may be due to routine maintenance."
-                            "<br>Note: Middle-of-the-night maintenance can take up to 60 minutes."
-                        ),
-                        extra_tags=unit_name,
-                    )
-                elif "timed out" in exception_message:
-                    # apply escaping to (unsafe) html with format_html
-                    messages.error(
-                        request,
-                        format_html(
-                            (
-                                "Network problem: no report could be generated."
-                                "<br>-----"
-                                "<br>Please use the <a href='https://www.it.ucla.edu/it-support-"
-                                "center/services/virtual-private-network-vpn-clients'>UCLA VPN</a> "
-                                "when off campus."
-                                "<br><a href='https://uclalibrary.github.io/research-tips/"
-                                "get-configured/'>Help with VPN</a> (tutorials on how to connect)."
-                            )
-                        ),
-                        extra_tags=unit_name,
-                    )
-                else:
-                    messages.error(
-                        request,
-                        format_html(
-                            (
-                                "Error: no report could be generated."
-                                "<br>-----"
-                                "<br>Please report this to the DIIT Help Desk:"
-                                "<br><a href='https://uclalibrary.atlassian.net/"
-                                "servicedesk/customer/portals'>"
-                                "UCLA Library Service Portal</a>"
-                            )
-                        ),
-                        extra_tags=unit_name,
-                    )
-        else:
-            messages.error(
-                request,
-                format_html("please ensure valid selections."),
-                extra_tags="Form error",
+            # Reports can take minutes, so the worker runs them;
+            # the page polls report_status for progress.
+            job = enqueue_job(
+                unit,
+                int(year),
+                int(month),
+                send_email,
+                override_recipients,
             )
+            data = {
+                "job_id": job.id,
+                "status_url": reverse("report_status", args=[job.id]),
+                "messages": [],
+            }
+            return HttpResponse(json.dumps(data), content_type="application/json")
+
+        messages.error(
+            request,
+            format_html("please ensure valid selections."),
+            extra_tags="Form error",
+        )
 
         # assemble and return any messages
         django_messages = []
@@ -120,26 +83,80 @@ def report(request: HttpRequest) -> HttpResponse:
         return render(request, "form.html", {"form": form, "ENV": ENV})
 
 
-def run_qdb_reporter(
-    unit_from_form, month_from_form, year_from_form, send_email, override_recipients
-):
-    # Suppress unit debugging list in non-dev environment.
-    # list_recipients is useful, leave it on.
-    if ENV != "dev":
-        list_units = False
+@login_required(login_url="/login/")
+def report_status(request: HttpRequest, job_id: int) -> HttpResponse:
+    """Return the progress of a report job, with messages once it's finished."""
+    job = get_object_or_404(ReportJob, id=job_id)
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "total_units": job.total_units,
+        "completed_units": len(job.progress),
+        "progress": job.progress,
+        "messages": get_job_messages(job),
+    }
+    return HttpResponse(json.dumps(data), content_type="application/json")
+
+
+def get_job_messages(job: ReportJob) -> list[dict]:
+    """Get messages for the form about a finished job, in the same format
+    as Django messages; unfinished jobs have none.
+    """
+    if job.status == ReportJob.SUCCEEDED:
+        job_messages = [
+            Message(
+                messages.SUCCESS,
+                "QDB report successfully generated.",
+                extra_tags=job.unit.name,
+            )
+        ]
+    elif job.status == ReportJob.FAILED:
+        job_messages = [
+            Message(
+                messages.ERROR, get_error_message(job.error), extra_tags=job.unit.name
+            )
+        ]
     else:
-        list_units = True
-    # Run the report, send it by email if appropriate
-    call_command(
-        "run_qdb_reporter",
-        list_units=list_units,
-        year=int(year_from_form),
-        month=int(month_from_form),
-        unit=unit_from_form,
-        email=send_email,
-        list_recipients=True,
-        override_recipients=override_recipients,
-    )
+        job_messages = []
+    return [
+        {"level": message.level, "message": message.message, "extra_tags": message.tags}
+        for message in job_messages
+    ]
+
+
+def get_error_message(exception_message: str) -> str:
+    """Get a friendly message for an error from a report run."""
+    if "Login failed for user" in exception_message:
+        return format_html(
+            "Remote database not available: no report could be generated."
+            "<br>-----"
+            "<br>Please try again later as this may be due to routine maintenance."
+            "<br>Note: Middle-of-the-night maintenance can take up to 60 minutes."
+        )
+    elif "timed out" in exception_message:
+        # apply escaping to (unsafe) html with format_html
+        return format_html(
+            (
+                "Network problem: no report could be generated."
+                "<br>-----"
+                "<br>Please use the <a href='https://www.it.ucla.edu/it-support-"
+                "center/services/virtual-private-network-vpn-clients'>UCLA VPN</a> "
+                "when off campus."
+                "<br><a href='https://uclalibrary.github.io/research-tips/"
+                "get-configured/'>Help with VPN</a> (tutorials on how to connect)."
+            )
+        )
+    else:
+        return format_html(
+            (
+                "Error: no report could be generated."
+                "<br>-----"
+                "<br>Please report this to the DIIT Help Desk:"
+                "<br><a href='https://uclalibrary.atlassian.net/"
+                "servicedesk/customer/portals'>"
+                "UCLA Library Service Portal</a>"
+            )
+        )
 
 
 @login_required(login_url="/login/")
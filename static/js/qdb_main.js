@@ -2,6 +2,8 @@
 
 const spinnerBox = document.getElementById('spinner-box')
 const longBox = document.getElementById('long-box')
+const progressBox = document.getElementById('progress-box')
+const progressText = document.getElementById('progress-text')
 var message_box = document.getElementById("error_message");
 
 const form = document.getElementById('p-form')
@@ -14,6 +16,8 @@ const override_recipients = document.getElementById('id_override_recipients')
 const csrf = document.getElementsByName('csrfmiddlewaretoken')
 
 const url = ""
+// milliseconds between checks on a queued report
+const pollInterval = 2000
 
 $(function () {
     form.addEventListener('submit', e=>{
@@ -46,27 +50,19 @@ $(function () {
             url: url,
             data: formData,
             success: function(data){
-                success = data.success;
-
-                // turn off spinner and any "long wait" warning
-                spinnerBox.classList.add("not-visible");
-                var unit_selected = $("#id_unit option:selected").text();
-                if (unit_selected == 'All units'){
-                    longBox.classList.add("not-visible");
+                // the report is queued: check on it until it's finished
+                if (data.job_id) {
+                    poll_report(data.status_url);
+                    return;
                 }
+                stop_waiting();
 
                 // pass any messages to js in form.html
                 update_messages(data.messages);
             },
             error: function(data) {
-                // turn off spinner and any "long wait" warning
-                spinnerBox.classList.add("not-visible");
-                var unit_selected = $("#id_unit option:selected").text();
-                if (unit_selected == 'All units'){
-                    longBox.classList.add("not-visible");
-                }
-                // display ajax error
-                $("#ajax-box").append("<div class='alert alert-danger alert-dismissible fade show' role='alert'><button type='button' class='close' data-dismiss='alert' aria-label='Close'><span aria-hidden='true'>&times;</span></button><center>AJAX Error: no report could be generated.<br>-----<br>Please report this to the DIIT Help Desk:<br><a href='https://jira.library.ucla.edu/servicedesk/customer/portals'>UCLA Library Service Portal</a></center></div>");
+                stop_waiting();
+                show_ajax_error();
             },
             cache: false,
             contentType: false,
@@ -75,6 +71,44 @@ $(function () {
     });
 });
 
+// check a queued report's progress until it's finished
+function poll_report(status_url) {
+    $.ajax({
+        type: 'GET',
+        url: status_url,
+        success: function(data){
+            if (data.status == 'queued' || data.status == 'running') {
+                if (data.total_units > 0) {
+                    progressText.textContent = 'Finished ' + data.completed_units + ' of ' + data.total_units + ' units';
+                } else {
+                    progressText.textContent = 'Waiting for report to start';
+                }
+                progressBox.classList.remove("not-visible");
+                setTimeout(function () { poll_report(status_url); }, pollInterval);
+                return;
+            }
+            stop_waiting();
+            update_messages(data.messages);
+        },
+        error: function(data) {
+            stop_waiting();
+            show_ajax_error();
+        },
+        cache: false
+    })
+}
+
+// turn off spinner, progress and any "long wait" warning
+function stop_waiting() {
+    spinnerBox.classList.add("not-visible");
+    progressBox.classList.add("not-visible");
+    longBox.classList.add("not-visible");
+}
+
+function show_ajax_error() {
+    $("#ajax-box").append("<div class='alert alert-danger alert-dismissible fade show' role='alert'><button type='button' class='close' data-dismiss='alert' aria-label='Close'><span aria-hidden='true'>&times;</span></button><center>AJAX Error: no report could be generated.<br>-----<br>Please report this to the DIIT Help Desk:<br><a href='https://jira.library.ucla.edu/servicedesk/customer/portals'>UCLA Library Service Portal</a></center></div>");
+}
+
 // move the "All units" option to the top of the select
 $(document).ready( function () {
     const optionText = 'All units';